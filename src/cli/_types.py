@@ -151,6 +151,21 @@ def Codon(val: str) -> str:
     return val
 
 
+def DecoyPrefix(val: str) -> str:
+    """Receive a str val and raise an :exc:`ArgumentError` if the value is not
+    a valid decoy prefix, else return the str untouched.
+
+    A valid decoy prefix is any word (letters, digits and '_') containing
+    'decoy', which is how the postms steps tell decoy proteins apart.
+    """
+    if val is None:
+        return val
+
+    if re.fullmatch(r'\w*decoy\w*', val) is None:
+        raise TypeError
+    return val
+
+
 def PositiveInt(val: str) -> int:
     n = int(val)
     if n < 1:
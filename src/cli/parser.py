@@ -144,10 +144,29 @@ _database_parser.add_argument(
 )
 _database_parser.add_argument(
     "--genome", "-g",
-    help="Genome fasta file to be translated to the six reading frames",
-    required=True,
+    help="Genome fasta file to be translated to the six reading frames. "
+    "Required, unless --batch is given.",
+    type=_types.FilePath
+)
+_database_parser.add_argument(
+    "--batch",
+    help="Tab-separated manifest of a panel of genomes to build databases "
+    "for, instead of --genome. Its header names the columns: 'name' and "
+    "'genome', and optionally 'gff', 'transcriptome' and 'gtf' (an external "
+    "transcriptome assembly of the genome). Each genome gets a directory "
+    "named after it in the output directory, which can be given to ms mode. "
+    "The proteome is processed once for the whole panel and --threads are "
+    "split among the genomes.",
     type=_types.FilePath
 )
+_database_parser.add_argument(
+    "--pan_database",
+    action=_types.YesOrNoBooleanAction,
+    help="With --batch, also merge the ORFs of all genomes into "
+    "pan_database.fasta, with their entries prefixed by the genome name and "
+    "each distinct protein sequence written once. The entries removed are "
+    "listed in pan_duplicates.tsv. A YES or NO action. Default: NO."
+)
 _database_parser.add_argument(
     "--proteome", "-p",
     help="Proteome fasta file, i.e. 'Uniprot.fasta'",
@@ -203,6 +222,121 @@ _database_parser.add_argument(
     "transcriptome assembly",
     type=_types.FilePath
 )
+_database_parser.add_argument(
+    "--gff",
+    help="Path to a RefSeq GFF file. Its features are added to the "
+    "coordinate index of the genome ORF database (genome.db), next to the "
+    "predicted ORFs.",
+    type=_types.FilePath
+)
+_database_parser.add_argument(
+    "--short_ids",
+    action=_types.YesOrNoBooleanAction,
+    help="Name the ORFs of the databases with short numeric IDs (e.g. "
+    "g1842) instead of entries with their coordinates, which makes the "
+    "search and Percolator files smaller. Their coordinates are kept in "
+    "genome.db (and transcriptome.db) and restored by postms. A YES or NO "
+    "action. Default: NO."
+)
+_database_parser.add_argument(
+    "--longest_orfs",
+    action=_types.YesOrNoBooleanAction,
+    help="Keep only the longest ORF of each stop codon in the databases, "
+    "which shrinks the search space of the peptide search. The other start "
+    "codons are listed in genome_alternative_starts.tsv (and "
+    "transcriptome_alternative_starts.tsv) and restored by postms. A YES "
+    "or NO action. Default: NO."
+)
+_database_parser.add_argument(
+    "--deduplicate",
+    action=_types.YesOrNoBooleanAction,
+    help="Write each distinct protein sequence only once to the databases. "
+    "The entries removed are listed in genome_duplicates.tsv (and "
+    "transcriptome_duplicates.tsv) and restored by postms. A YES or NO "
+    "action. Default: NO."
+)
+_database_parser.add_argument(
+    "--drop_annotated",
+    action=_types.YesOrNoBooleanAction,
+    help="Remove the predicted ORFs whose protein is identical to, or a "
+    "suffix of, an annotated protein from the databases, as the annotated "
+    "entry is already searched. The ORFs removed are listed in "
+    "genome_annotated_orfs.txt (and transcriptome_annotated_orfs.txt). A "
+    "YES or NO action. Default: NO."
+)
+_database_parser.add_argument(
+    "--prune",
+    action=_types.YesOrNoBooleanAction,
+    help="Remove the predicted ORFs that do not yield any peptide the ms "
+    "mode could search, given --e, --ntt, --minLength, --maxLength and "
+    "--maxMissedCleavages, which should match the ones used in ms mode. "
+    "They are moved to genome_ORFs_unsearchable.fasta (and "
+    "transcriptome_ORFs_unsearchable.fasta) and the share of the search "
+    "space removed is written to genome_pruning_report.txt. A YES or NO "
+    "action. Default: NO."
+)
+_database_parser.add_argument(
+    "--e",
+    help="The enzyme used for protein digestion when pruning. Same IDs as "
+    "in ms mode. Default: 1 (Trypsin)",
+    type=int,
+    choices=range(10),
+    default=1
+)
+_database_parser.add_argument(
+    "--ntt",
+    help="Number of tolerable termini when pruning, as in ms mode. "
+    "Default: 2",
+    type=int,
+    choices=range(3),
+    default=2
+)
+_database_parser.add_argument(
+    "--minLength",
+    help="Minimum peptide length when pruning, as in ms mode. Default: 6",
+    type=_types.PositiveInt,
+    default=6
+)
+_database_parser.add_argument(
+    "--maxLength",
+    help="Maximum peptide length when pruning, as in ms mode. Default: 40",
+    type=_types.PositiveInt,
+    default=40
+)
+_database_parser.add_argument(
+    "--maxMissedCleavages",
+    help="Maximum number of missed cleavages when pruning, as in ms mode. "
+    "Default: -1 (no limit)",
+    type=int,
+    default=-1
+)
+_database_parser.add_argument(
+    "--threads",
+    help="Number of processes used to predict the ORFs. Contigs, transcripts "
+    "and the genome and transcriptome subsets are split among them.",
+    type=_types.PositiveInt,
+    default=1
+)
+_database_parser.add_argument(
+    "--no-cache",
+    dest='no_cache',
+    action="store_true",
+    help="Always generate the ORF databases, instead of linking them from "
+    "the cache when the same files and parameters were used before."
+)
+_database_parser.add_argument(
+    "--cache_dir",
+    help="Directory of the cache of generated databases. Default: "
+    "$UPROTEINS_CACHE or ~/.cache/uproteins",
+    type=_types.DirectoryName
+)
+_database_parser.add_argument(
+    "--cache_size",
+    help="Maximum size of the cache of generated databases, in GB. The "
+    "least recently used databases are removed above it.",
+    type=float,
+    default=20
+)
 
 # =======
 # MS MODE
@@ -340,6 +474,115 @@ _ms_parser.add_argument(
     help="Maximum number of dynamic (variable) modifications per peptide; "
     "Default: 3"
 )
+_ms_parser.add_argument(
+    "--jobs",
+    help="Number of MSGF+ searches run at the same time. The spectrum files "
+    "of all databases are searched from the largest one, and the cores are "
+    "split among the searches, unless --thread is given. Default: 1",
+    type=_types.PositiveInt,
+    default=1
+)
+_ms_parser.add_argument(
+    "--max-memory",
+    dest='max_memory',
+    help="Memory available to the MSGF+ searches run at the same time, in "
+    "GB. Fewer than --jobs searches run if their heaps do not fit in it. "
+    "Default: no limit",
+    type=_types.PositiveInt
+)
+_ms_parser.add_argument(
+    "--job_memory",
+    help="Java heap of each MSGF+ search, in GB. Default: 48, or 48 divided "
+    "by --shards (at least 8)",
+    type=_types.PositiveInt
+)
+_ms_parser.add_argument(
+    "--shards",
+    help="Split each database into this many shards of about the same "
+    "number of residues, and search every spectrum file against each of "
+    "them with a smaller heap. The results of the shards are merged into "
+    "one mzid file per spectrum file, keeping the best matches of each "
+    "spectrum. Takes precedence over --batched_search. Default: 1",
+    type=_types.PositiveInt,
+    default=1
+)
+_ms_parser.add_argument(
+    "--no-resume",
+    dest='no_resume',
+    action="store_true",
+    help="Search every spectrum file again, instead of skipping the "
+    "searches recorded as finished in search_manifest.json by a previous "
+    "run with the same database, spectrum file and parameters."
+)
+_ms_parser.add_argument(
+    "--batched_search",
+    action=_types.YesOrNoBooleanAction,
+    help="Search the spectrum files with one MSGF+ run per database (or per "
+    "group of files, with --jobs), instead of one run per file, so the JVM "
+    "is started and the database loaded once. The database is indexed "
+    "before its searches start. A YES or NO action. Default: NO."
+)
+_ms_parser.add_argument(
+    "--decoy_method",
+    help="How the decoy proteins are generated from the target ones: "
+    "'reverse' (Default) or 'shuffle'.",
+    choices=('reverse', 'shuffle'),
+    default='reverse'
+)
+_ms_parser.add_argument(
+    "--decoy_search",
+    help="How the decoy proteins are searched: 'separate' (Default) runs a "
+    "search against the target database and another against the decoy "
+    "one, while 'concatenated' searches each spectrum file once against a "
+    "single target-decoy database (about half the search time), and "
+    "postms tells the decoy PSMs apart by --decoy_prefix. It must be "
+    "given to postms as well.",
+    choices=('separate', 'concatenated'),
+    default='separate'
+)
+_ms_parser.add_argument(
+    "--decoy_prefix",
+    help="Prefix of the decoy protein entries. It must contain 'decoy' and "
+    "be given to postms as well. Default: decoy_",
+    type=_types.DecoyPrefix,
+    default='decoy_'
+)
+_ms_parser.add_argument(
+    "--decoy_seed",
+    help="Seed of the shuffled decoy proteins. Default: 0",
+    type=int,
+    default=0
+)
+_ms_parser.add_argument(
+    "--no-cache",
+    dest='no_cache',
+    action="store_true",
+    help="Always generate the decoy databases, instead of linking them "
+    "from the cache when the same database was used before."
+)
+_ms_parser.add_argument(
+    "--cache_dir",
+    help="Directory of the cache of generated databases. Default: "
+    "$UPROTEINS_CACHE or ~/.cache/uproteins",
+    type=_types.DirectoryName
+)
+_ms_parser.add_argument(
+    "--cache_size",
+    help="Maximum size of the cache of generated databases, in GB. The "
+    "least recently used databases are removed above it.",
+    type=float,
+    default=20
+)
+_ms_parser.add_argument(
+    "--index_cache_size",
+    help="Maximum size of the cache of MSGF+ database indexes, in GB. The "
+    "databases are searched from this cache (in the msgf directory of "
+    "--cache_dir), so their indexes are built once and reused by later "
+    "runs. The least recently used ones are removed above it. Disabled by "
+    "--no-cache.",
+    type=float,
+    default=50
+)
 
 # ===========
 # POSTMS MODE
@@ -427,6 +670,20 @@ _postms_parser.add_argument(
     type=int,
     default=300
 )
+_postms_parser.add_argument(
+    "--decoy_prefix",
+    help="Prefix of the decoy protein entries, as given to ms mode. "
+    "Default: decoy_",
+    type=_types.DecoyPrefix,
+    default='decoy_'
+)
+_postms_parser.add_argument(
+    "--decoy_search",
+    help="How the decoy proteins were searched, as given to ms mode: "
+    "'separate' (Default) or 'concatenated'.",
+    choices=('separate', 'concatenated'),
+    default='separate'
+)
 
 # =============
 # VALIDATE MODE
@@ -445,6 +702,13 @@ _validate_parser.add_argument(
     help="Whether transcriptome database was generated or not. If the "
     "transcriptome database was not generated, ignore this."
 )
+_validate_parser.add_argument(
+    "--decoy_prefix",
+    help="Prefix of the decoy protein entries, as given to ms mode. "
+    "Default: decoy_",
+    type=_types.DecoyPrefix,
+    default='decoy_'
+)
 
 # ============
 # TESTING MODE
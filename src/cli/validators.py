@@ -79,6 +79,10 @@ def validate_database(
     This function exists the cli with an error message a codons appears as
     both a start codon and an end codon.
 
+    This function exists the cli with an error message if not exactly one of
+    --genome or --batch is given, or if --batch is given with the arguments
+    that belong to a single genome, which go in the manifest instead.
+
     Arguments
     ---------
     args : Namespace
@@ -102,6 +106,19 @@ def validate_database(
             f"--stops: '{','.join(shared)}'"
         )
 
+    batch = getattr(args, 'batch', None)
+    if (args.genome is None) == (batch is None):
+        parser.error('exactly one of --genome and --batch must be given')
+    if batch is not None:
+        single = ('gff', 'external_gtf', 'external_transcriptome')
+        if given := [a for a in single if getattr(args, a) is not None]:
+            parser.error(
+                f"argument --batch: not allowed with --{', --'.join(given)}, "
+                "which are columns of the manifest"
+            )
+    elif getattr(args, 'pan_database', False):
+        parser.error('argument --pan_database: requires --batch')
+
 
 def validate_postms(
     args: argparse.Namespace,
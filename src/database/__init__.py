@@ -1 +1,3 @@
-from .database import Database
\ No newline at end of file
+from .database import Database
+from .cache import DatabaseCache
+from .batch import BatchDatabase, build_database
\ No newline at end of file
@@ -0,0 +1,169 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import copy
+import csv
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from ..sequtils import Digester
+from ..sequtils.fasta import iter_fasta, entry_id, FastaWriter
+from ..sequtils.__helpers import ExternalAssemblyError, ManifestError
+from . import database_generator as dg
+from .database import Database
+
+
+# Columns of the manifest of --batch. Only 'name' and 'genome' are required
+MANIFEST_COLUMNS = ('name', 'genome', 'gff', 'transcriptome', 'gtf')
+
+
+def build_database(args, annotated=None):
+    """ Generates the genome database (and the transcriptome one, if requested) in the working directory. 'annotated'
+    is a database_generator.AnnotatedProteome shared with other databases, if any. """
+    if args.external_gtf is not None and args.external_transcriptome is not None:
+        shutil.copyfile(args.external_gtf, f'{args.outdir}/assembled.gtf')
+        os.makedirs(f'{args.outdir}/HISAT', exist_ok=True)
+        shutil.copyfile(args.external_transcriptome, f'{args.outdir}/HISAT/transcripts.fasta')
+    elif args.external_gtf is not None or args.external_transcriptome is not None:
+        raise ExternalAssemblyError
+    print("Generating the genome database.")
+    db = Database(args)
+    db.translate()
+    digester = Digester(enzyme=args.e, ntt=args.ntt, min_length=args.minLength, max_length=args.maxLength,
+                        max_missed_cleavages=args.maxMissedCleavages)
+    genome_db = dg.Database("genome_ORFs.fasta", args.proteome, "genome", annotated=annotated)
+    genome_db.build(args, digester, cache=db.cache)
+    print("Genome database generated.")
+    if args.transcriptome:
+        print("Generating the transcriptome database.")
+        transcriptome_db = dg.Database("transcriptome_ORFs.fasta", args.proteome, "transcriptome",
+                                       annotated=annotated)
+        transcriptome_db.build(args, digester, cache=db.cache)
+        print("Transcriptome database generated.")
+
+
+def _build_genome(args, annotated):
+    """ Builds the databases of a genome of the batch in its directory. It is kept at module level so it can be sent
+    to the worker processes of BatchDatabase. """
+    cwd = os.getcwd()
+    os.chdir(args.outdir)
+    try:
+        build_database(args, annotated)
+    finally:
+        os.chdir(cwd)
+    return args.outdir
+
+
+class BatchDatabase(object):
+    """ Builds the databases of a panel of genomes listed in a tab-separated manifest (--batch), with a header naming
+    its columns: 'name' and 'genome', and optionally the 'gff' of the genome and an external 'transcriptome' along with
+    its 'gtf'. Relative paths are read from the directory of the manifest. Each genome gets a directory named after it
+    in the output directory, with the same files database mode writes for a single genome, so it can be given to ms
+    mode as is. The annotated proteome is tagged (and indexed for --drop_annotated) once for the whole panel, and
+    genomes are built in parallel, with the --threads split among them. With --pan_database, the ORFs of all genomes are
+    also merged into pan_database.fasta, with the entries prefixed by their genome ('name|gORF__12_100-400_forward')
+    and each distinct sequence written once, as in --deduplicate. """
+    def __init__(self, args):
+        self.args = args
+        self.threads = getattr(args, 'threads', None) or 1
+        self.genomes = self.read_manifest(args.batch)
+        self.annotated = dg.AnnotatedProteome(args.proteome)
+
+    @staticmethod
+    def read_manifest(manifest):
+        """ :returns the genomes of a manifest as dictionaries with all of its columns, with absolute paths. Missing
+        optional columns are None. """
+        directory = os.path.dirname(os.path.abspath(manifest))
+        genomes = []
+        with open(manifest, newline='') as handle:
+            rows = csv.DictReader((line for line in handle if line.strip() and not line.startswith('#')),
+                                  delimiter='\t')
+            missing = {'name', 'genome'}.difference(rows.fieldnames or [])
+            if missing:
+                raise ManifestError(f'The manifest {manifest} has no {", ".join(sorted(missing))} column.')
+            for row in rows:
+                genome = {column: (row.get(column) or '').strip() or None for column in MANIFEST_COLUMNS}
+                if genome['name'] is None or genome['genome'] is None:
+                    raise ManifestError(f'Every genome of the manifest {manifest} needs a name and a genome.')
+                if os.sep in genome['name'] or genome['name'] in ('.', '..'):
+                    raise ManifestError(f'Invalid genome name in the manifest {manifest}: {genome["name"]}')
+                if (genome['transcriptome'] is None) != (genome['gtf'] is None):
+                    raise ExternalAssemblyError
+                for column in ('genome', 'gff', 'transcriptome', 'gtf'):
+                    if genome[column] is not None:
+                        genome[column] = os.path.join(directory, genome[column])
+                        if not os.path.isfile(genome[column]):
+                            raise ManifestError(f'{genome[column]} ({column} of {genome["name"]}) does not exist.')
+                genomes.append(genome)
+        names = [genome['name'] for genome in genomes]
+        if not genomes:
+            raise ManifestError(f'The manifest {manifest} has no genomes.')
+        if len(set(names)) < len(names):
+            raise ManifestError(f'The genome names of the manifest {manifest} are not unique.')
+        return genomes
+
+    def genome_args(self, genome, threads=1):
+        """ :returns the arguments of a single genome database mode run for a genome of the manifest. """
+        args = copy.copy(self.args)
+        args.outdir = os.path.abspath(genome['name'])
+        args.genome = genome['genome']
+        args.gff = genome['gff']
+        args.external_transcriptome = genome['transcriptome']
+        args.external_gtf = genome['gtf']
+        args.transcriptome = genome['transcriptome'] is not None
+        args.threads = threads
+        args.batch = None
+        return args
+
+    def build(self):
+        self.annotated.write()
+        if self.args.drop_annotated:
+            # indexed once here, instead of once per database
+            self.annotated.tails()
+        workers = max(1, min(self.threads, len(self.genomes)))
+        runs = [self.genome_args(genome, threads=max(1, self.threads // workers)) for genome in self.genomes]
+        for args in runs:
+            os.makedirs(args.outdir, exist_ok=True)
+        if workers == 1:
+            for args in runs:
+                _build_genome(args, self.annotated)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for outdir in pool.map(_build_genome, runs, [self.annotated] * len(runs)):
+                    print(f'Databases of {os.path.basename(outdir)} generated.')
+        if getattr(self.args, 'pan_database', False):
+            self.pan_database()
+        return self
+
+    def pan_database(self):
+        """ Merges the ORFs of the databases of all genomes into pan_database.fasta, along with the annotated
+        proteome, and lists the entries removed as duplicates in pan_duplicates.tsv. """
+        with FastaWriter('pan_ORFs.fasta') as fa:
+            for genome in self.genomes:
+                for subset in ('genome', 'transcriptome'):
+                    database = os.path.join(genome['name'], f'{subset}_database.fasta')
+                    if not os.path.exists(database):
+                        continue
+                    fa.write_entries((f'{genome["name"]}|{header}', seq) for header, seq in iter_fasta(database)
+                                     if not entry_id(header).endswith('_ANNO'))
+        pan_db = dg.Database('pan_ORFs.fasta', self.args.proteome, 'pan', annotated=self.annotated)
+        pan_db.mark_annotated()
+        pan_db.deduplicate()
+        return self
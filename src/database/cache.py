@@ -0,0 +1,134 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import hashlib
+import os
+import shutil
+
+
+# Files are hashed in chunks of this size, in bytes
+HASH_CHUNK = 1 << 20
+
+# Subdirectories of the cache directory kept by other caches (search.IndexCache), which are never evicted as entries
+RESERVED = ('msgf',)
+
+
+class DatabaseCache(object):
+    """ Content-addressed cache of the files generated by database mode. Each entry is a directory named after the
+    hash of the input files and parameters that produced it ('key'), and its files are hard linked into the output
+    directory (or copied, across file systems). Entries are evicted from the least recently used one until the cache
+    is under 'max_size' bytes. Files that may be linked to an entry must be removed with clear() before being written
+    again, so the cached copy is never modified. """
+    def __init__(self, directory=None, max_size=20 * 1024 ** 3):
+        if directory is None:
+            directory = self.default_directory()
+        self.directory = os.path.abspath(directory)
+        self.maxSize = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def default_directory():
+        return os.environ.get('UPROTEINS_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'uproteins'))
+
+    @classmethod
+    def from_args(cls, args):
+        """ :returns the cache set by the command line arguments, or None if --no-cache was given. """
+        if getattr(args, 'no_cache', False):
+            return None
+        return cls(directory=getattr(args, 'cache_dir', None),
+                   max_size=int(getattr(args, 'cache_size', 20) * 1024 ** 3))
+
+    @staticmethod
+    def key(files, **params):
+        """ :returns the hash of the contents of 'files' and of the parameters that generate an entry. """
+        digest = hashlib.sha256()
+        for file in files:
+            with open(file, 'rb') as handle:
+                for chunk in iter(lambda: handle.read(HASH_CHUNK), b''):
+                    digest.update(chunk)
+            digest.update(b'\0')
+        for param in sorted(params):
+            digest.update(f'{param}={params[param]!r}\0'.encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def clear(outputs):
+        """ Removes the files that are about to be generated, as they may be links to a cached entry. """
+        for output in outputs:
+            if os.path.exists(output):
+                os.remove(output)
+
+    @staticmethod
+    def link(source, destination):
+        """ Hard links 'source' to 'destination', or copies it across file systems. """
+        if os.path.dirname(destination):
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+
+    def fetch(self, key, outputs):
+        """ Links the files of a cached entry to the paths in 'outputs'. Entries store their files by name, so
+        outputs must have distinct names. :returns True if the entry had all of them. """
+        entry = os.path.join(self.directory, key)
+        cached = [os.path.join(entry, os.path.basename(output)) for output in outputs]
+        if not all(os.path.exists(file) for file in cached):
+            return False
+        for file, output in zip(cached, outputs):
+            self.link(file, output)
+        os.utime(entry)
+        return True
+
+    def store(self, key, outputs, evict=True):
+        """ Adds the files in 'outputs' to the cache as a new entry and, unless 'evict' is False, evicts the oldest
+        entries if needed. The entry is filled in a temporary directory first, so an interrupted run never leaves an
+        incomplete entry. """
+        entry = os.path.join(self.directory, key)
+        partial = f'{entry}.{os.getpid()}.partial'
+        os.makedirs(partial, exist_ok=True)
+        for output in outputs:
+            self.link(output, os.path.join(partial, os.path.basename(output)))
+        if os.path.exists(entry):
+            shutil.rmtree(entry)
+        os.rename(partial, entry)
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """ Removes the least recently used entries until the cache is no larger than its maximum size. """
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.partial') or name in RESERVED or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path))
+                entries.append((os.path.getmtime(path), size, path))
+            except FileNotFoundError:
+                # evicted by another run sharing the cache
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.maxSize:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
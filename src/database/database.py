@@ -17,7 +17,12 @@
 # uProteInS. If not, see <https://www.gnu.org/licenses/>.
 
 
-from ..sequtils import TranscriptomeTranslator, GenomeTranslator, ORFCollection, DatabaseGenerator
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from ..sequtils import (TranscriptomeTranslator, GenomeTranslator, ORFCollection, DatabaseGenerator, LocusIndex,
+                        StopCollapser)
+from .cache import DatabaseCache
 from Bio import SeqIO
 
 
@@ -25,23 +30,92 @@ class Database(object):
     def __init__(self, args):
         self.args = args
         self.genome = args.genome
+        self.threads = getattr(args, 'threads', None) or 1
+        self.longestORFs = getattr(args, 'longest_orfs', False)
+        self.shortIds = getattr(args, 'short_ids', False)
+        self.cache = DatabaseCache.from_args(args)
 
     def translate(self):
-        if self.args.transcriptome:
-            rna = TranscriptomeTranslator(sequence="HISAT/transcripts.fasta", form='fasta',
-                                                 minsize=int(self.args.minsize), maxsize=int(self.args.maxsize))
-            # records = SeqIO.parse("HISAT/transcripts.fasta", 'fasta')
-            # for record in records:
-            #     print(record.seq)
-            rna_orfs = rna.parse_frames(starts=self.args.starts, stops=self.args.stops, seqtype='aa', entry='full')
-
-            db = DatabaseGenerator(name="transcriptome", db_type="sql")
-            db.add_orfs(rna_orfs)
-            db.to_fasta(filename="transcriptome_ORFs.fasta", identifier='t')
+        """ Predicts the transcriptome (if requested) and genome ORFs. With more than one thread, the contigs of both
+        subsets are scanned by a shared process pool, and both subsets are processed at the same time. """
+        if self.threads == 1:
+            if self.args.transcriptome:
+                self.translate_transcriptome()
+            self.translate_genome()
+            return self
+        with ProcessPoolExecutor(max_workers=self.threads) as pool, ThreadPoolExecutor(max_workers=2) as subsets:
+            jobs = []
+            if self.args.transcriptome:
+                jobs.append(subsets.submit(self.translate_transcriptome, pool))
+            jobs.append(subsets.submit(self.translate_genome, pool))
+            for job in jobs:
+                job.result()
+        return self
+
+    def __collapse(self, orfs, alternatives):
+        """ With --longest_orfs, keeps only the longest ORF of each stop codon and lists all of their starts in the
+        'alternatives' table, which postms uses to restore them. Otherwise, removes the table left by a previous run,
+        so it is not applied to a database that was not collapsed. """
+        if self.longestORFs:
+            return StopCollapser(alternatives).collapse(orfs)
+        if os.path.exists(alternatives):
+            os.remove(alternatives)
+        return orfs
+
+    def __generate(self, subset, inputs, predict, executor):
+        """ Links the ORF fasta, database and alternative starts of a subset from the cache if they were generated
+        before from the same 'inputs' and parameters. Otherwise, predicts them and adds them to the cache. """
+        outputs = [f'{subset}_ORFs.fasta', f'{subset}.db']
+        if self.longestORFs:
+            outputs.append(f'{subset}_alternative_starts.tsv')
+        else:
+            DatabaseCache.clear([f'{subset}_alternative_starts.tsv'])
+        # an SQLite journal left by a previous run would be applied to the new (or cached) database
+        DatabaseCache.clear([f'{subset}.db-wal', f'{subset}.db-shm'])
+        if self.cache is None:
+            DatabaseCache.clear(outputs)
+            predict(executor)
+            return
+        key = self.cache.key(inputs, subset=subset, starts=self.args.starts, stops=self.args.stops,
+                             minsize=int(self.args.minsize), maxsize=int(self.args.maxsize),
+                             longest_orfs=self.longestORFs, short_ids=self.shortIds)
+        if self.cache.fetch(key, outputs):
+            print(f'Using the cached {subset} ORFs.')
+            return
+        DatabaseCache.clear(outputs)
+        predict(executor)
+        self.cache.store(key, outputs)
+
+    def translate_transcriptome(self, executor=None):
+        self.__generate('transcriptome', ["HISAT/transcripts.fasta"], self.__predict_transcriptome, executor)
+
+    def translate_genome(self, executor=None):
+        inputs = [self.args.genome]
+        if getattr(self.args, 'gff', None) is not None:
+            inputs.append(self.args.gff)
+        self.__generate('genome', inputs, self.__predict_genome, executor)
+
+    def __predict_transcriptome(self, executor=None):
+        rna = TranscriptomeTranslator(sequence="HISAT/transcripts.fasta", form='fasta',
+                                             minsize=int(self.args.minsize), maxsize=int(self.args.maxsize))
+        # records = SeqIO.parse("HISAT/transcripts.fasta", 'fasta')
+        # for record in records:
+        #     print(record.seq)
+        rna_orfs = rna.iter_orfs(starts=self.args.starts, stops=self.args.stops, seqtype='aa', entry='full',
+                                 executor=executor, workers=self.threads)
+
+        rna_orfs = self.__collapse(rna_orfs, "transcriptome_alternative_starts.tsv")
+        db = DatabaseGenerator(name="transcriptome", db_type="sql")
+        db.write_orfs(rna_orfs, filename="transcriptome_ORFs.fasta", identifier='t', short_ids=self.shortIds)
+
+    def __predict_genome(self, executor=None):
         dna = GenomeTranslator(sequence=self.args.genome, form='fasta', minsize=int(self.args.minsize),
                                       maxsize=int(self.args.maxsize))
-        dna_orfs = dna.parse_frames(starts=self.args.starts, stops=self.args.stops,
-                                    seqtype='aa')
+        dna_orfs = dna.iter_orfs(starts=self.args.starts, stops=self.args.stops,
+                                 seqtype='aa', executor=executor, workers=self.threads)
+        dna_orfs = self.__collapse(dna_orfs, "genome_alternative_starts.tsv")
         genome_db = DatabaseGenerator(name="genome", db_type="sql")
-        genome_db.add_orfs(dna_orfs)
-        genome_db.to_fasta(filename="genome_ORFs.fasta", identifier='g')
+        genome_db.write_orfs(dna_orfs, filename="genome_ORFs.fasta", identifier='g', short_ids=self.shortIds)
+        if getattr(self.args, 'gff', None) is not None:
+            # annotated features share the coordinate index of the genome ORFs
+            LocusIndex("genome").defer('annotation', gff=self.args.gff)
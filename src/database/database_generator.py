@@ -18,13 +18,15 @@
 # uProteInS. If not, see <https://www.gnu.org/licenses/>.
 
 
+import hashlib
 import os
 import sys
 
-from Bio import SeqIO
 from Bio.Blast import NCBIXML
 
 from ..translate import GenomeReader as tr
+from ..sequtils.fasta import iter_fasta, entry_id, FastaWriter
+from .cache import DatabaseCache
 
 
 path = sys.path[0]
@@ -75,17 +77,9 @@ class OrfPrediction(object):
 
     def fix_genome_entry(self):
         genome = self.args.genome
-        fix_genome = []
-        records = SeqIO.parse(genome, 'fasta')
-        i = 0
-        for record in records:
-            if i > 0:
-                fix_genome.append(f">NC_{self.args.organism}_{i}\n{record.seq}\n")
-            else:
-                fix_genome.append(f">NC_{self.args.organism}\n{record.seq}\n")
-            i += 1
-        with open('fixed_genome.fasta', 'w') as fa:
-            fa.writelines(fix_genome)
+        with FastaWriter('fixed_genome.fasta') as fa:
+            for i, (_, seq) in enumerate(iter_fasta(genome)):
+                fa.write(f'NC_{self.args.organism}_{i}' if i > 0 else f'NC_{self.args.organism}', seq)
         self.args.genome = os.path.abspath('fixed_genome.fasta')
 
     def identify_orfs(self):
@@ -133,29 +127,169 @@ class OrfPrediction(object):
     #         replaced.writelines(new + "\n")
 
 
+class AnnotatedProteome(object):
+    """ The proteome with its entries tagged as annotated ('_ANNO'), which every database built from it includes. It
+    is written once and may be shared by the databases of several genomes (see BatchDatabase), along with the index of
+    its protein tails used by filter_annotated. """
+    def __init__(self, proteome, fasta='annotated.fasta'):
+        self.proteome = proteome
+        self.fasta = os.path.abspath(fasta)
+        self.written = False
+        self.__tails = {}
+
+    def write(self):
+        """ Writes the tagged proteome, unless it was already written by this instance. """
+        if self.written:
+            return self
+        with FastaWriter(self.fasta) as fa:
+            for header, seq in iter_fasta(self.proteome):
+                # >name_ANNO name extra-info, as written by Biopython before
+                fields = header.split(maxsplit=1)
+                fa.write(f'{fields[0]}_ANNO {header}' if fields else '_ANNO', seq)
+        self.written = True
+        return self
+
+    def tails(self, k=8):
+        """ :returns the annotated proteins (without the stop) keyed by their last 'k' residues. """
+        if k not in self.__tails:
+            tails = {}
+            for _, seq in iter_fasta(self.proteome):
+                seq = seq.rstrip('*')
+                tails.setdefault(seq[-k:], []).append(seq)
+            self.__tails[k] = tails
+        return self.__tails[k]
+
+
 class Database(object):
-    def __init__(self, ob, p, filetype):
+    def __init__(self, ob, p, filetype, annotated=None):
         self.orf_to_blast = ob
         self.proteome = p
         self.filetype = filetype
+        self.annotatedProteome = annotated if annotated is not None else AnnotatedProteome(p)
         self.blast_dir = f'{path}/dependencies/blast_for_uproteins/bin'
 
+    def build(self, args, digester, cache=None):
+        """ Generates {filetype}_database.fasta from the ORFs and the proteome with the steps requested in the
+        command line, or links it (and the tables of those steps) from 'cache', if it was generated before from the
+        same files and parameters. """
+        steps = {f'{self.filetype}_annotated_orfs.txt': args.drop_annotated,
+                 f'{self.filetype}_ORFs_unsearchable.fasta': args.prune,
+                 f'{self.filetype}_pruning_report.txt': args.prune,
+                 f'{self.filetype}_duplicates.tsv': args.deduplicate}
+        outputs = [f'{self.filetype}_database.fasta'] + [output for output, requested in steps.items() if requested]
+        # tables of steps that were not requested this time must not be applied to this database
+        DatabaseCache.clear([output for output, requested in steps.items() if not requested])
+        if cache is not None:
+            params = dict(drop_annotated=args.drop_annotated, deduplicate=args.deduplicate, prune=args.prune)
+            if args.prune:
+                params.update(e=args.e, ntt=args.ntt, min_length=args.minLength, max_length=args.maxLength,
+                              max_missed_cleavages=args.maxMissedCleavages)
+            key = cache.key([self.orf_to_blast, self.proteome], filetype=self.filetype, **params)
+            if cache.fetch(key, outputs):
+                print(f'Using the cached {self.filetype} database.')
+                return self
+        DatabaseCache.clear(outputs)
+        self.mark_annotated()
+        if args.drop_annotated:
+            self.filter_annotated()
+        if args.prune:
+            self.prune_unsearchable(digester)
+        if args.deduplicate:
+            self.deduplicate()
+        else:
+            self.unify()
+        if cache is not None:
+            cache.store(key, outputs)
+        return self
+
     def mark_annotated(self):
-        with open('annotated.fasta', 'w') as handle:
-            for record in SeqIO.parse(self.proteome, 'fasta'):
-                record.id += '_ANNO'
-                # Stopping the sequences from being written
-                # >name name extra-info
-                old_desc = record.description
-                if old_desc.split()[0] == record.id:
-                    # Old desc starts with id
-                    record.description = ' '.join(old_desc.split()[1:])
-                SeqIO.write(record, handle, 'fasta')
-        self.annotated = 'annotated.fasta'
+        self.annotated = self.annotatedProteome.write().fasta
+
+    def filter_annotated(self, k=8):
+        """ Removes the ORFs whose protein is identical to, or an in-frame suffix of, an annotated protein, without
+        aligning them. As both end at the same stop codon, the candidates of an ORF are the annotated proteins that
+        share its last 'k' residues. The first residue is ignored, as alternative start codons are translated as
+        methionine in the annotations. The remaining ORFs are written to {filetype}_ORFs_no_anno.fasta, which is used
+        from then on, and the removed entries to {filetype}_annotated_orfs.txt. """
+        tails = self.annotatedProteome.tails(k)
+        removed = []
+        no_anno = f'{self.filetype}_ORFs_no_anno.fasta'
+        with FastaWriter(no_anno) as fa:
+            for header, seq in iter_fasta(self.orf_to_blast):
+                if any(len(seq) <= len(anno) and anno.endswith(seq[1:]) for anno in tails.get(seq[-k:], [])):
+                    removed.append(f'{entry_id(header)}\n')
+                else:
+                    fa.write(header, seq)
+        with open(f'{self.filetype}_annotated_orfs.txt', 'w') as entries:
+            entries.writelines(removed)
+        print(f'{len(removed)} ORFs matching annotated proteins removed from the {self.filetype} database.')
+        self.orf_to_blast = no_anno
+
+    def prune_unsearchable(self, digester):
+        """ Moves the ORFs that do not yield any peptide searchable with the settings of a sequtils.Digester to
+        {filetype}_ORFs_unsearchable.fasta. The remaining ORFs are written to {filetype}_ORFs_searchable.fasta, which
+        is used from then on, and the share of the search space removed to {filetype}_pruning_report.txt. """
+        orfs = [0, 0]
+        residues = [0, 0]
+        searchable = f'{self.filetype}_ORFs_searchable.fasta'
+        with FastaWriter(searchable) as kept, FastaWriter(f'{self.filetype}_ORFs_unsearchable.fasta') as removed:
+            for header, seq in iter_fasta(self.orf_to_blast):
+                pruned = not digester.searchable(seq)
+                orfs[pruned] += 1
+                residues[pruned] += len(seq)
+                (removed if pruned else kept).write(header, seq)
+        total_orfs = max(sum(orfs), 1)
+        total_residues = max(sum(residues), 1)
+        report = [f'ORFs\t{sum(orfs)}\n',
+                  f'Unsearchable ORFs\t{orfs[1]}\t{100 * orfs[1] / total_orfs:.2f}%\n',
+                  f'Residues\t{sum(residues)}\n',
+                  f'Unsearchable residues\t{residues[1]}\t{100 * residues[1] / total_residues:.2f}%\n']
+        with open(f'{self.filetype}_pruning_report.txt', 'w') as out:
+            out.writelines(report)
+        print(f'{orfs[1]} ORFs without searchable peptides removed from the {self.filetype} database '
+              f'({100 * residues[1] / total_residues:.2f}% of its ORF residues).')
+        self.orf_to_blast = searchable
 
     def unify(self):
         cmd_cat = f'cat {self.orf_to_blast} {self.annotated} > {self.filetype}_database.fasta'
         os.system(cmd_cat)
+        # a table left by a deduplicated database must not be applied to this one
+        if os.path.exists(f'{self.filetype}_duplicates.tsv'):
+            os.remove(f'{self.filetype}_duplicates.tsv')
+
+    def deduplicate(self):
+        """ Same as unify, but each distinct protein sequence is written only once. Sequences are compared by their
+        hash, and the entry kept is the first one of its sequence, except that annotated proteins are always kept over
+        identical ORFs, so their peptides are still filtered as annotated. Every entry that was removed is listed in
+        {filetype}_duplicates.tsv next to the entry kept in its place. """
+        kept = {}
+        duplicates = []
+        for header, seq in iter_fasta(self.annotated):
+            kept.setdefault(self.__hash(seq), entry_id(header))
+        with FastaWriter(f'{self.filetype}_database.fasta') as fa:
+            for header, seq in iter_fasta(self.orf_to_blast):
+                digest = self.__hash(seq)
+                if digest in kept:
+                    duplicates.append(f'{kept[digest]}\t{entry_id(header)}\n')
+                else:
+                    kept[digest] = entry_id(header)
+                    fa.write(header, seq)
+            written = set()
+            for header, seq in iter_fasta(self.annotated):
+                digest = self.__hash(seq)
+                if digest in written:
+                    duplicates.append(f'{kept[digest]}\t{entry_id(header)}\n')
+                else:
+                    written.add(digest)
+                    fa.write(header, seq)
+        with open(f'{self.filetype}_duplicates.tsv', 'w') as table:
+            table.write('Representative\tEntry\n')
+            table.writelines(duplicates)
+        print(f'{len(duplicates)} duplicated sequences removed from the {self.filetype} database.')
+
+    @staticmethod
+    def __hash(seq):
+        return hashlib.blake2b(seq.encode(), digest_size=16).digest()
 
     def blast_to_Proteome(self):
         """ Aligns the ORFs to the annotated proteome with Blastp in order to identify annotated entries. """
@@ -207,13 +341,10 @@ class Database(object):
         for l in lines:
             l = l.strip()
             entries.add(str(l).replace('>', ""))
-        with open("%s" % self.orf_to_blast, 'r') as original, open('%s_database_no_anno.fasta' % self.filetype, 'w') \
-                as removed:
-            records = SeqIO.parse(original, 'fasta')
+        with FastaWriter('%s_database_no_anno.fasta' % self.filetype) as removed:
             print("Removing database entries that are already annotated.")
-            for record in records:
-                if record.id not in entries:
-                    SeqIO.write(record, removed, 'fasta')
+            removed.write_entries((header, seq) for header, seq in iter_fasta(self.orf_to_blast)
+                                  if entry_id(header) not in entries)
 
     def create_custom(self):
         """ Merges both predicted DB (composed by unannotated smORFs) and RefSeq DB into a single, custom database. """
@@ -28,17 +28,54 @@ from src import peptide_search as ps
 from src.percolator import Decoy
 from src.assembly import TranscriptAssembly, CompareTranscripts, ReadMapper
 from src.master import Archives
-from src.database import Database
+from src.database import DatabaseCache, BatchDatabase, build_database
 from src.postprocess import ResultsSummarizer
 from src.testing import PipelineTesting
 from src.pipelines import PostMSPipeline, ValidatePipeline
-from src.sequtils.__helpers import ExternalAssemblyError
 from src.metrics import Metrics
+from src.search import SearchScheduler, IndexCache
 
 
 pypath = sys.path[0]
 
 
+def generate_decoy(db, db_type, cache, args):
+    """ Writes the decoy database of 'db', unless the one in the output directory was written from the same
+    database and settings, or links it from 'cache' if it was generated before. """
+    decoy = Decoy(db=db, db_type=db_type, method=args.decoy_method, seed=args.decoy_seed, prefix=args.decoy_prefix,
+                  concatenated=args.decoy_search == 'concatenated')
+    key = decoy.checksum()
+    if decoy.is_current(key):
+        print(f'The {db_type} decoy database is up to date.')
+        return decoy
+    if cache is not None and cache.fetch(key, decoy.outputs()):
+        print(f'Using the cached {db_type} decoy database.')
+        decoy.save_checksum(key)
+        return decoy
+    decoy.to_fasta(checksum=key)
+    if cache is not None:
+        cache.store(key, decoy.outputs())
+    return decoy
+
+
+def queue_searches(db, db_type, scheduler, cache, args):
+    """ Queues the searches of 'db' and of its decoy database in 'scheduler': a target and a decoy search, or, with
+    --decoy_search concatenated, a single search of the concatenated target-decoy database. """
+    if args.decoy_search == 'concatenated':
+        decoy = generate_decoy(db, db_type, cache, args)
+        search = ps.PeptideSearch(db_type, args.mass_spec, decoy.concatenated, args)
+        # decoy mzid files of a previous separate search would be read along with the new ones
+        search.clear_decoy_outputs()
+        search.peptide_identification(scheduler)
+        return
+    target = ps.PeptideSearch(db_type, args.mass_spec, db, args)
+    target.peptide_identification(scheduler)
+    generate_decoy(db, db_type, cache, args)
+    decoy_search = ps.PeptideSearch(db_type, args.mass_spec, f"{db_type}/Percolator/{db_type}_decoy.fasta", args,
+                                    decoy=True)
+    decoy_search.peptide_identification(scheduler)
+
+
 def run_workflow(
     args,
     subparser: argparse.ArgumentParser
@@ -85,46 +122,25 @@ def run_workflow(
     elif mode == "database":
         validators.validate_database(args, subparser)
 
-        if args.external_gtf is not None and args.external_transcriptome is not None:
-            os.system(f'cp {args.external_gtf} {args.outdir}/assembled.gtf')
-            if not os.path.exists(f'{args.outdir}/HISAT'):
-                os.system(f'mkdir {args.outdir}/HISAT')
-            os.system(f'cp {args.external_transcriptome} {args.outdir}/HISAT/transcripts.fasta')
-        elif args.external_gtf is not None and args.external_transcriptome is None:
-            raise ExternalAssemblyError
-        elif args.external_transcriptome is not None and args.external_gtf is None:
-            raise ExternalAssemblyError
         # genome = dg.OrfPrediction(args)
         # genome.identify_orfs()
-        print("Generating the genome database.")
-        db = Database(args)
-        db.translate()
-        # print("\nORFs identified \nNow performing steps to generate the GENOME database\n")
-        genome_db = dg.Database("genome_ORFs.fasta", args.proteome, "genome")
-        genome_db.mark_annotated()
-        genome_db.unify()
-        print("Genome database generated.")
-        if args.transcriptome:
-            print("Generating the transcriptome database.")
-            transcriptome_db = dg.Database("transcriptome_ORFs.fasta", args.proteome, "transcriptome")
-            transcriptome_db.mark_annotated()
-            transcriptome_db.unify()
-            print("Transcriptome database generated.")
+        if args.batch is not None:
+            BatchDatabase(args).build()
+        else:
+            build_database(args)
 
     elif mode == "ms":
-        genome = ps.PeptideSearch("Genome", args.mass_spec, "genome_database.fasta", args)
-        genome.peptide_identification()
-        genome_decoy = Decoy(db="genome_database.fasta", db_type="Genome")
-        genome_decoy.reverse_sequences().to_fasta()
-        genome_decoy_search = ps.PeptideSearch("Genome", args.mass_spec, "Genome/Percolator/Genome_decoy.fasta", args, decoy=True)
-        genome_decoy_search.peptide_identification()
+        # the searches of all databases are queued and run together
+        scheduler = SearchScheduler.from_args(args)
+        cache = DatabaseCache.from_args(args)
+        queue_searches("genome_database.fasta", "Genome", scheduler, cache, args)
         if args.transcriptome:
-            transcriptome = ps.PeptideSearch("Transcriptome", args.mass_spec, "transcriptome_database.fasta", args)
-            transcriptome.peptide_identification()
-            transcriptome_decoy = Decoy(db="transcriptome_database.fasta", db_type="Transcriptome")
-            transcriptome_decoy.reverse_sequences().to_fasta()
-            transcriptome_decoy_search = ps.PeptideSearch("Transcriptome", args.mass_spec, "Transcriptome/Percolator/Transcriptome_decoy.fasta", args, decoy=True)
-            transcriptome_decoy_search.peptide_identification()
+            queue_searches("transcriptome_database.fasta", "Transcriptome", scheduler, cache, args)
+        scheduler.run()
+        index_cache = IndexCache.from_args(args)
+        if index_cache is not None:
+            # entries are only evicted once the searches that use them finished
+            index_cache.evict()
 
     elif mode == "postms":
         """ newest method """
@@ -18,7 +18,18 @@
 
 
 import os
+import shutil
 import sys
+from functools import partial
+from xml.etree.ElementTree import ParseError
+
+from .database import DatabaseCache
+from .search import SearchJob, SearchScheduler, IndexCache, SearchManifest, split_fasta, merge_mzid
+
+
+# Options of ms mode that change the mzid files besides the MSGF+ ones: how the decoy database is generated and
+# searched, and whether the database is searched from the index cache, which is the path recorded in the mzid files
+SEARCH_OPTIONS = ('decoy_search', 'decoy_method', 'decoy_seed', 'decoy_prefix', 'no_cache')
 
 
 class PeptideSearch(object):
@@ -29,15 +40,20 @@ class PeptideSearch(object):
         self.args = args
         self.path = sys.path[0]
         self.decoy = decoy
+        self.database = None
+        self.shardDatabases = None
+        self.manifest = SearchManifest()
 
-    def peptide_identification(self):
+    def peptide_identification(self, scheduler=None):
+        """ Searches the spectrum files against the database. The MSGF+ jobs are queued in 'scheduler', which runs
+        them along with the other searches of ms mode, or run right away if no scheduler is given. The mzid files are
+        written to the folder of the database type. """
         print("\nPerforming peptide search using %s database\n" % self.database_type)
-        cmd_dir_ms = 'mkdir %s' % self.database_type
-        os.system(cmd_dir_ms)
-        cmd_copy_orf = 'cp %s %s/' % (self.orf_file, self.database_type)
-        os.system(cmd_copy_orf)
-        cmd_copy_db = f'cp {self.orf_file} {os.path.abspath(self.ms_files_folder)}/.'
-        os.system(cmd_copy_db)
+        os.makedirs(self.database_type, exist_ok=True)
+        # linked instead of copied, as MSGF+ searches the database from the index cache
+        copy = os.path.join(self.database_type, os.path.basename(self.orf_file))
+        if os.path.abspath(copy) != os.path.abspath(self.orf_file):
+            DatabaseCache.link(self.orf_file, copy)
 
         # list of arguments passed by argparser
         # arg_list = []
@@ -52,32 +68,247 @@ class PeptideSearch(object):
         # cmd_pep_search = 'Rscript %s/mzid_workflow.R %s--database %s --folder %s'\
         #                  % (sys.path[0], arg_string, os.path.abspath(self.orf_file), self.ms_files_folder)
         # os.system(cmd_pep_search)
-        self.loop_search()
-        cmd_move = 'mv %s/*.mzid %s/' % (self.ms_files_folder, self.database_type)
-        os.system(cmd_move)
+        if scheduler is None:
+            self.loop_search(SearchScheduler.from_args(self.args)).run()
+        else:
+            self.loop_search(scheduler)
 
-    def loop_search(self):
-        files = [i for i in os.listdir(os.path.abspath(self.ms_files_folder)) if i.endswith('mzML')]
-        for file in files:
-            self.run_msgf(file)
-        return self
+    def loop_search(self, scheduler):
+        """ Queues the MSGF+ jobs of the spectrum files in 'scheduler' and :returns it. There is a job for each file,
+        or, with --batched_search, a job that indexes the database (unless it is indexed) followed by a job for each
+        group of files (up to --jobs groups, with about the same amount of spectra), so the JVM is started and the
+        database loaded once per group instead of once per file. With --shards, each file is searched against each shard
+        of the database instead, and the results merged. Files whose search is recorded as finished in the manifest are
+        skipped, unless --no-resume was given, and the outputs of the others are removed until their search is done. """
+        self._check_folder()
+        files = sorted(i for i in os.listdir(os.path.abspath(self.ms_files_folder)) if i.endswith('mzML'))
+        if not getattr(self.args, 'no_resume', False):
+            finished = [file for file in files if self.is_searched(file)]
+            if finished:
+                print(f'Skipping {len(finished)} of {len(files)} {self.database_type} searches finished by a previous '
+                      f'run.')
+            files = [file for file in files if file not in finished]
+        DatabaseCache.clear([self.__output(file) for file in files])
+        if self.__shards() > 1 and files:
+            for file in files:
+                for job in self.msgf_shard_jobs(file):
+                    scheduler.add(job)
+        elif getattr(self.args, 'batched_search', False) and files:
+            if not IndexCache.is_indexed(self.search_database()):
+                scheduler.add(self.index_job())
+            for number, group in enumerate(self.__split(files)):
+                scheduler.add(self.msgf_batch_job(group, number))
+        else:
+            for file in files:
+                scheduler.add(self.msgf_job(file))
+        return scheduler
+
+    def __split(self, files):
+        """ :returns the spectrum files split into --jobs groups of similar size, from the largest file. """
+        groups = [[] for _ in range(min(getattr(self.args, 'jobs', None) or 1, len(files)))]
+        sizes = [0] * len(groups)
+        for file in sorted(files, key=self.__spectra_size, reverse=True):
+            lightest = sizes.index(min(sizes))
+            groups[lightest].append(file)
+            sizes[lightest] += self.__spectra_size(file)
+        return groups
+
+    def __spectra(self, file):
+        return os.path.join(os.path.abspath(self.ms_files_folder), file)
+
+    def __spectra_size(self, file):
+        return os.path.getsize(self.__spectra(file))
 
     def run_msgf(self, file):
         self._check_folder()
-        output = ""
-        if self.decoy:
-            output = f" -o {self.args.mass_spec}/{file}_decoy.mzid"
-        ms_args = ""
+        SearchScheduler(report=None).add(self.msgf_job(file)).run()
+        return self
+
+    def search_database(self, fasta=None):
+        """ :returns the path MSGF+ searches the database (or another 'fasta' file) from: its link in the index cache,
+        so its index is kept for later runs, or the database itself with --no-cache. """
+        if fasta is not None:
+            cache = IndexCache.from_args(self.args)
+            return cache.database(fasta) if cache is not None else os.path.abspath(fasta)
+        if self.database is None:
+            self.database = self.search_database(self.orf_file)
+        return self.database
+
+    def shards(self):
+        """ :returns the paths MSGF+ searches the shards of the database from, with --shards. The database is split
+        into shards of about the same number of residues in {database_type}/shards the first time. """
+        if self.shardDatabases is None:
+            shards = split_fasta(self.orf_file, self.__shards(),
+                                 os.path.join(os.path.abspath(self.database_type), 'shards'))
+            self.shardDatabases = [self.search_database(shard) for shard in shards]
+        return self.shardDatabases
+
+    def __shards(self):
+        return getattr(self.args, 'shards', None) or 1
+
+    @staticmethod
+    def __group(database):
+        """ :returns the group of the jobs that search 'database', which wait for the first one of them to index it,
+        or None if it is already indexed. """
+        return None if IndexCache.is_indexed(database) else database
+
+    def __output(self, file):
+        """ :returns where the mzid of a spectrum file is written: {database_type}/<file>.mzid for targets and
+        {database_type}/<file>.mzML_decoy.mzid for decoys, as MSGF+ names them by default. """
+        name = f'{file}_decoy' if self.decoy else os.path.splitext(file)[0]
+        return os.path.join(os.path.abspath(self.database_type), f'{name}.mzid')
+
+    def is_searched(self, file):
+        """ Whether the mzid of a spectrum file was written by the same search, according to the manifest. """
+        return self.manifest.is_complete(self.__output(file), self.orf_file, self.__spectra(file), self.__params())
+
+    def clear_decoy_outputs(self):
+        """ Removes the decoy mzid files of the spectrum files from the folder of the database type. """
+        for file in os.listdir(os.path.abspath(self.ms_files_folder)):
+            if file.endswith('mzML'):
+                DatabaseCache.clear([os.path.join(os.path.abspath(self.database_type), f'{file}_decoy.mzid')])
+        return self
+
+    def __log(self, name):
+        return os.path.join(os.path.abspath(self.database_type), 'logs', f'{name}.log')
+
+    def __memory(self):
+        """ :returns the heap of the MSGF+ jobs, in GB. It is 48 unless --job_memory was given, and smaller with
+        --shards, as the memory used by MSGF+ grows with the size of the database. """
+        return getattr(self.args, 'job_memory', None) or max(8, 48 // self.__shards())
+
+    def __msgf_cmd(self, spectra, output=None, database=None):
+        cmd = ['java', f'-Xmx{self.__memory()}G', '-jar', f'{self.path}/dependencies/MSGF/MSGFPlus.jar', '-d',
+               database or self.search_database()]
+        if output is not None:
+            cmd += ['-o', output]
+        return cmd + ['-tda', '0', '-s', spectra, '-addFeatures', '1'] + self.__msgf_args()
+
+    def __staging(self, name):
+        """ :returns an empty staging directory for the outputs of a job, which are moved in place once it finishes,
+        so an interrupted search never leaves an incomplete mzid file among the finished ones. """
+        staging = os.path.join(os.path.abspath(self.database_type), 'staging', name)
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+        os.makedirs(staging)
+        return staging
+
+    def msgf_job(self, file):
+        """ :returns the MSGF+ job that searches a spectrum file against the database. The mzid file is written to a
+        staging directory and moved to its path in the folder of the database type once the search finishes. """
+        output = self.__output(file)
+        name = os.path.splitext(os.path.basename(output))[0]
+        staging = self.__staging(name)
+        mzid = os.path.join(staging, os.path.basename(output))
+        return SearchJob(f'{self.database_type} {name}', self.__msgf_cmd(self.__spectra(file), mzid),
+                         log=self.__log(name), memory=self.__memory(), size=self.__spectra_size(file),
+                         group=self.__group(self.search_database()),
+                         on_success=partial(self.__collect, staging, {file: [mzid]}))
+
+    def msgf_shard_jobs(self, file):
+        """ :returns the MSGF+ jobs that search a spectrum file against each shard of the database. Their mzid files
+        are merged into the one msgf_job writes once the last of them finishes. """
+        output = self.__output(file)
+        name = os.path.splitext(os.path.basename(output))[0]
+        staging = self.__staging(name)
+        mzids = [os.path.join(staging, f'shard_{number + 1}.mzid') for number in range(len(self.shards()))]
+        remaining = set(mzids)
+        return [SearchJob(f'{self.database_type} {name} shard {number + 1}',
+                          self.__msgf_cmd(self.__spectra(file), mzid, database),
+                          log=self.__log(f'{name}_shard_{number + 1}'), memory=self.__memory(),
+                          size=self.__spectra_size(file), group=self.__group(database),
+                          on_success=partial(self.__merge_shards, staging, file, mzids, remaining, mzid))
+                for number, (database, mzid) in enumerate(zip(self.shards(), mzids))]
+
+    def __merge_shards(self, staging, file, mzids, remaining, mzid, job):
+        """ Merges the mzid files of the shards of a spectrum file, once the search of the last one ('mzid')
+        finishes, and collects the merged file. """
+        remaining.discard(mzid)
+        if remaining:
+            return
+        merged = os.path.join(staging, os.path.basename(self.__output(file)))
+        try:
+            merge_mzid(mzids, merged, database=self.orf_file, matches=int(getattr(self.args, 'n', None) or 1))
+        except ParseError as error:
+            raise OSError(f'Could not merge the shards of {file}: {error}')
+        self.__collect(staging, {file: [merged]}, job)
+
+    def index_job(self):
+        """ :returns the job that builds the MSGF+ index of the database, which the searches of the database wait
+        for. """
+        db = self.search_database()
+        name = f'index_{os.path.basename(db)}'
+        cmd = ['java', f'-Xmx{self.__memory()}G', '-cp', f'{self.path}/dependencies/MSGF/MSGFPlus.jar',
+               'edu.ucsd.msjava.msdbsearch.BuildSA', '-d', db, '-tda', '0']
+        return SearchJob(f'{self.database_type} {name}', cmd, log=self.__log(name), memory=self.__memory(),
+                         size=float('inf'), group=db)
+
+    def msgf_batch_job(self, files, number):
+        """ :returns the MSGF+ job that searches a group of spectrum files against the database in a single run. The
+        files are linked into a staging directory given to MSGF+ as the spectra, and their mzid files are moved to
+        the same paths msgf_job writes them to once the run finishes. """
+        kind = 'decoy' if self.decoy else 'target'
+        staging = self.__staging(f'{kind}_{number + 1}')
+        spectra = os.path.join(staging, 'spectra')
+        os.makedirs(spectra)
+        for file in files:
+            os.symlink(self.__spectra(file), os.path.join(spectra, file))
+        # MSGF+ writes the mzid files next to the spectra or to its working directory
+        outputs = {file: [os.path.join(directory, f'{os.path.splitext(file)[0]}.mzid')
+                          for directory in (spectra, staging)] for file in files}
+        return SearchJob(f'{self.database_type} {kind} batch {number + 1}', self.__msgf_cmd(spectra),
+                         log=self.__log(f'{kind}_batch_{number + 1}'), memory=self.__memory(),
+                         size=sum(self.__spectra_size(file) for file in files),
+                         group=self.__group(self.search_database()),
+                         cwd=staging, on_success=partial(self.__collect, staging, outputs))
+
+    def __collect(self, staging, outputs, job):
+        """ Moves the mzid file of each spectrum file in 'outputs' from the first of its paths in the staging directory
+        of a job to its final path, and records it in the manifest. """
+        for file, paths in outputs.items():
+            for mzid in paths:
+                if os.path.exists(mzid):
+                    os.replace(mzid, self.__output(file))
+                    break
+            else:
+                raise FileNotFoundError(f'MSGF+ wrote no {os.path.basename(paths[0])} (see {job.log})')
+            self.manifest.complete(self.__output(file), self.orf_file, self.__spectra(file), self.__params())
+        shutil.rmtree(staging)
+        if not os.listdir(os.path.dirname(staging)):
+            os.rmdir(os.path.dirname(staging))
+
+    def __params(self):
+        """ :returns the options that change the results of a search, which are part of its key in the manifest: the
+        MSGF+ options (all but -thread), the SEARCH_OPTIONS, and how the files are searched (--shards or
+        --batched_search). """
+        params = ['-tda', '0', '-addFeatures', '1'] + self.__msgf_args(threads=False)
+        for option in SEARCH_OPTIONS:
+            value = getattr(self.args, option, None)
+            if value is not None and value is not False:
+                params += [f'-{option}', str(value)]
+        if self.__shards() > 1:
+            params += ['-shards', str(self.__shards())]
+        elif getattr(self.args, 'batched_search', False):
+            params += ['-batched_search', 'True']
+        return params
+
+    def __msgf_args(self, threads=True):
+        """ :returns the MSGF+ options given in the command line. Concurrent jobs split the cores, unless -thread
+        was given. Without 'threads', -thread is left out. """
+        ms_args = []
         item_list = [None, "mass_spec", "outdir", "transcriptome", "mode", 'skip_assembly', 'skip_db', 'skip_ms',
                      'skip_postms', 'skip_validation', 'gtf', 'single', 'reads1', 'reads2', 'strandness', 'gffcompare_path',
-                     'gffread_path', 'genome', 'proteome', 'minsize', 'maxsize', 'starts', 'stops', 'threads']
+                     'gffread_path', 'genome', 'proteome', 'minsize', 'maxsize', 'starts', 'stops', 'threads',
+                     'no_cache', 'cache_dir', 'cache_size', 'decoy_method', 'decoy_seed', 'jobs', 'max_memory',
+                     'job_memory', 'batched_search', 'index_cache_size',
+                     'decoy_search', 'decoy_prefix', 'no_resume', 'shards']
         for arg in vars(self.args).items():
-            if arg[0] not in item_list and arg[1] is not None:
-                ms_args += f" -{arg[0]} {arg[1]}"
-        db = os.path.abspath(self.orf_file)
-        cmd = f'java -Xmx48G -jar {self.path}/dependencies/MSGF/MSGFPlus.jar -d {db}{output} -tda 0 -s {self.args.mass_spec}/{file} -addFeatures 1{ms_args}'
-        os.system(cmd)
-        return self
+            if arg[0] not in item_list and arg[1] is not None and (threads or arg[0] != 'thread'):
+                ms_args += [f'-{arg[0]}', str(arg[1])]
+        jobs = getattr(self.args, 'jobs', None) or 1
+        if threads and jobs > 1 and getattr(self.args, 'thread', None) is None:
+            ms_args += ['-thread', str(max(1, (os.cpu_count() or 1) // jobs))]
+        return ms_args
 
     def _check_folder(self):
         if not os.path.exists('mzid'):
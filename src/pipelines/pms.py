@@ -17,8 +17,12 @@
 # uProteInS. If not, see <https://www.gnu.org/licenses/>.
 
 
+import glob
+import os
+
 from ..postprocess import PostPercolator, ExtendedInformation, PercolatorProcessing, AllSub, TSVConverter, ResultsWrapper
 from ..sequtils.orflib import AltCodons
+from ..sequtils.orfids import ORFIdentifiers
 from ..upstream import SDInspection
 from ..sequtils.__helpers import FiletypeError
 
@@ -38,13 +42,16 @@ class PostMSPipeline(object):
         self._reformat_results()
 
     def _run_percolator(self):
-        perc = PercolatorProcessing(folder=self.folder, filetype=self.filetype)
+        perc = PercolatorProcessing(folder=self.folder, filetype=self.filetype,
+                                    prefix=getattr(self.args, 'decoy_prefix', None) or 'decoy_',
+                                    decoy_search=getattr(self.args, 'decoy_search', None) or 'separate')
         perc.create_metafiles().convert_to_pin()
         perc.percolate()
 
     def _process_percolator(self):
         tsv = TSVConverter(self.folder)
         tsv.convert_files()
+        self._expand_identifiers()
 
         data_filter = PostPercolator(self.args, folder=self.folder, filetype=self.filetype)
         data_filter.convert_output()
@@ -60,15 +67,28 @@ class PostMSPipeline(object):
         data_filter.protein_seqs()
         data_filter.add_coordinates(qvalue=self.qValue)
 
+    def _expand_identifiers(self):
+        """ Replaces the short ORF IDs of a database built with --short_ids by the full entries in the Percolator
+        results and in the MSGF+ tables, which are the inputs of the next steps. """
+        identifiers = ORFIdentifiers(self.filetype, decoy_prefix=getattr(self.args, 'decoy_prefix', None) or 'decoy_')
+        if not identifiers.enabled:
+            return
+        files = glob.glob(f'{self.folder}/Percolator/*results*') + glob.glob(f'{self.folder}/tsv_msgf/*.tsv')
+        for file in files:
+            if os.path.isfile(file):
+                identifiers.expand_file(file)
+
     def _select_codons(self):
         if self.filetype == 'genome':
             alts_pre_rf = AltCodons(file='Genome/post_perc/genome_results_02.txt', genome=self.args.genome,
-                                    maxsize=self.args.maxsize, testing=self.testing)
+                                    maxsize=self.args.maxsize, testing=self.testing,
+                                    alternative_starts=self._alternative_starts('genome'))
         elif self.filetype == 'transcriptome':
             alts_pre_rf = AltCodons(file='Transcriptome/post_perc/transcriptome_results_02.txt',
                                     genome=self.args.genome, maxsize=self.args.maxsize,
                                     transcriptome_gff='assembled.gtf', assembly="HISAT/transcripts.fasta",
-                                    subset="Transcriptome", testing=self.testing)
+                                    subset="Transcriptome", testing=self.testing,
+                                    alternative_starts=self._alternative_starts('transcriptome'))
         else:
             raise FiletypeError
         alts_pre_rf.extend_orfs(args=self.args)
@@ -95,6 +115,13 @@ class PostMSPipeline(object):
         ext.filter_alternatives(priorities)
         ext.extract_spectra()
 
+    @staticmethod
+    def _alternative_starts(filetype):
+        """ Returns the table of collapsed start codons written by database mode with --longest_orfs, if any. """
+        table = f'{filetype}_alternative_starts.tsv'
+        if os.path.exists(table):
+            return table
+
     def _reformat_results(self):
         results = ResultsWrapper(df=f'{self.folder}/post_perc/{self.filetype}_results_04.txt', folder=self.folder,
                                  filetype=self.filetype)
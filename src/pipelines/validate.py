@@ -22,6 +22,7 @@ import sys
 
 from ..forest import ProteinFixer, PreFiltering, FeatureFishing, SpectralForest, SpectrumMiner
 from ..postprocess import ResultsWrapper
+from ..sequtils.orfids import ORFIdentifiers
 
 
 class ValidatePipeline(object):
@@ -30,12 +31,21 @@ class ValidatePipeline(object):
         self.pypath = sys.path[0]
         self.testing = testing
 
+    def __expand_identifiers(self, filetype, folder):
+        """ Replaces the short ORF IDs in the pin files by the full entries found in the postms results. """
+        identifiers = ORFIdentifiers(filetype, decoy_prefix=getattr(self.args, 'decoy_prefix', None) or 'decoy_')
+        if identifiers.enabled:
+            for file in os.listdir(folder):
+                if file.startswith('fixed_'):
+                    identifiers.expand_file(f'{folder}/{file}')
+
     def validate_genome(self):
         if not os.path.exists("Genome/Percolator/for_predicting"):
             os.mkdir('Genome/Percolator/for_predicting')
 
         genome_pin = ProteinFixer(pin_folder='Genome/Percolator')
         genome_pin.fix_files(outdir='Genome/Percolator')
+        self.__expand_identifiers('genome', 'Genome/Percolator/for_predicting')
         genome_prefiltering = PreFiltering(pin_folder='Genome/Percolator',
                                            results_04='Genome/post_perc/genome_results_04.txt', testing=self.testing)
         genome_prefiltering.filter_proteins()
@@ -65,6 +75,7 @@ class ValidatePipeline(object):
                 os.system('mkdir Transcriptome/Percolator/for_predicting')
             transcriptome_pin = ProteinFixer(pin_folder='Transcriptome/Percolator')
             transcriptome_pin.fix_files(outdir='Transcriptome/Percolator')
+            self.__expand_identifiers('transcriptome', 'Transcriptome/Percolator/for_predicting')
             transcriptome_prefiltering = PreFiltering(pin_folder='Transcriptome/Percolator',
                                                       results_04='Transcriptome/post_perc/transcriptome_results_04.txt',
                                                       testing=self.testing)
@@ -19,7 +19,8 @@
 
 import os
 import pandas as pd
-from Bio import SeqIO
+
+from ..sequtils.fasta import iter_fasta, FastaWriter
 
 
 class AllSub(object):
@@ -82,14 +83,11 @@ class AllSub(object):
 
     def modify_decoy(self):
         """ Removes from the decoy the sequences of annotated proteins """
-        records = SeqIO.parse(f'{self.folder}/Percolator/{self.folder}_decoy.fasta', 'fasta')
-        fasta = []
-        for record in records:
-            if 'ANNO' not in str(record.description):
-                fasta.append(f'>{str(record.description)}\n{str(record.seq)}\n')
         self._rename_decoy()
-        with open(f'{self.folder}/Percolator/{self.folder}_decoy.fasta', 'w') as out:
-            out.writelines(fasta)
+        with FastaWriter(f'{self.folder}/Percolator/{self.folder}_decoy.fasta') as out:
+            out.write_entries((header, seq) for header, seq in
+                              iter_fasta(f'{self.folder}/Percolator/{self.folder}_decoy_all.fasta')
+                              if 'ANNO' not in header)
 
     def _rename_decoy(self):
         cmd_mv = f'mv {self.folder}/Percolator/{self.folder}_decoy.fasta {self.folder}/Percolator/{self.folder}_decoy_all.fasta'
@@ -18,76 +18,125 @@
 
 
 import os
+import random
 import sys
-from Bio import SeqIO
+from functools import lru_cache
+
+from ..sequtils.__helpers import DecoySearchError
+from ..sequtils.fasta import iter_fasta, entry_id, FastaWriter
+from ..database.cache import DatabaseCache
+
+
+# Residues removed from the contaminant entries
+AMBIGUOUS = str.maketrans('', '', 'BXZ')
+
+
+@lru_cache(maxsize=None)
+def read_contaminants(contaminants):
+    """ :returns the entries of the contaminants file, read once per run. B, X and Z are removed from the whole
+    entry. """
+    return tuple((entry_id(header).translate(AMBIGUOUS), seq.translate(AMBIGUOUS))
+                 for header, seq in iter_fasta(contaminants))
 
 
 class Decoy(object):
-    def __init__(self, db, db_type):
+    """ Writes the decoy database of a target database in a single pass over it, followed by the contaminants. The
+    decoy of each protein is its sequence without the last residue, either reversed or shuffled ('method') with a
+    fixed 'seed', and its entry is the target one after 'prefix'. With 'concatenated', the target entries, the decoys and
+    the contaminants are also written to a single database ({type}_target_decoy.fasta) for a concatenated search. The
+    checksum of the target, the contaminants and these settings is saved next to the decoy database, so it is only
+    written again when one of them changes. """
+    def __init__(self, db, db_type, method='reverse', seed=0, prefix='decoy_', concatenated=False):
         self.df = db
-        self.seqs, self.entries = self.__get_seqs()
-        self.reversed = []
         self.type = db_type
-        self.__create_dir()
+        self.method = method
+        self.seed = seed
+        self.prefix = prefix
         self.path = sys.path[0]
+        self.contaminants = f'{self.path}/seqlib/contaminants.txt'
+        self.fasta = f"{self.type}/Percolator/{self.type}_decoy.fasta"
+        self.concatenated = f"{self.type}/Percolator/{self.type}_target_decoy.fasta" if concatenated else None
+        self.checksumFile = f'{self.fasta}.sha256'
+        self.__create_dir()
 
     def __create_dir(self):
-        if not os.path.exists(f"{self.type}/Percolator"):
-            cmd_dir = f'mkdir {self.type}/Percolator'
-            os.system(cmd_dir)
+        os.makedirs(f"{self.type}/Percolator", exist_ok=True)
 
-    def __get_seqs(self):
-        seqs = []
-        entries = []
-        records = SeqIO.parse(self.df, 'fasta')
-        for record in records:
-            seqs.append(record.seq)
-            entries.append(str(record.description))
-        return seqs, entries
-
-    def reverse_sequences(self):
-        """ Reverses the amino acid sequence of a protein, except for the aa in the c-terminal. """
-        for seq in self.seqs:
-            # cterminus = seq[len(seq)-1]
-            to_reverse = seq[:-1]
-            reversed = to_reverse[::-1]
-            # reversed += cterminus
-            self.reversed.append(reversed)
-        return self
+    def checksum(self):
+        """ :returns the hash of the target database, the contaminants and the decoy settings. It is also the key of
+        the decoy database in the DatabaseCache. """
+        return DatabaseCache.key([self.df, self.contaminants], decoy=self.type, method=self.method, seed=self.seed,
+                                 prefix=self.prefix, concatenated=self.concatenated is not None)
+
+    def outputs(self):
+        """ :returns the databases written by to_fasta. """
+        return [self.fasta] if self.concatenated is None else [self.fasta, self.concatenated]
+
+    def is_current(self, checksum):
+        """ Whether the decoy database was written from the target database and settings with this checksum. """
+        if not all(os.path.exists(output) for output in self.outputs()) or not os.path.exists(self.checksumFile):
+            return False
+        with open(self.checksumFile) as saved:
+            return saved.read().strip() == checksum
+
+    def save_checksum(self, checksum):
+        with open(self.checksumFile, 'w') as out:
+            out.write(f'{checksum}\n')
+
+    def __decoys(self, target=None):
+        """ :returns the decoy entries of the target database. If 'target' is a FastaWriter, the target entries are
+        written to it in the same pass. """
+        shuffler = random.Random(self.seed)
+        for header, seq in iter_fasta(self.df):
+            if target is not None:
+                target.write(header, seq)
+            # the last residue is left out of the decoy
+            decoy = seq[:-1]
+            if self.method == 'shuffle':
+                residues = list(decoy)
+                shuffler.shuffle(residues)
+                decoy = ''.join(residues)
+            else:
+                decoy = decoy[::-1]
+            yield f'{self.prefix}{header}', decoy
 
-    def add_contaminants(self):
-        seqs = []
-        records = SeqIO.parse(f'{self.path}/seqlib/contaminants.txt', 'fasta')
-        for record in records:
-            seqs.append(f">{record.id}\n{record.seq}\n")
-        return seqs
-
-    def to_fasta(self):
-        out = []
-        for i in range(len(self.reversed)):
-            string = f">decoy_{self.entries[i]}\n{self.reversed[i]}\n"
-            out.append(string)
-        seqs = self.add_contaminants()
-        for seq in seqs:
-            to_add = seq.replace("B", "")
-            to_add = to_add.replace("X", "")
-            to_add = to_add.replace("Z", "")
-            out.append(to_add)
-        with open(f"{self.type}/Percolator/{self.type}_decoy.fasta", 'w') as fa:
-            fa.writelines(out)
+    def to_fasta(self, target=None, checksum=None):
+        """ Writes the decoy database and the contaminants, and the concatenated database if requested. If a 'target'
+        path is given, the target entries are copied to it in the same pass. """
+        DatabaseCache.clear(self.outputs() + [self.checksumFile])
+        with FastaWriter(self.fasta) as fa:
+            if self.concatenated is not None:
+                with FastaWriter(self.concatenated) as both:
+                    for header, seq in self.__decoys(both):
+                        fa.write(header, seq)
+                        both.write(header, seq)
+                    both.write_entries(read_contaminants(self.contaminants))
+            elif target is None:
+                fa.write_entries(self.__decoys())
+            else:
+                with FastaWriter(target) as target_fa:
+                    fa.write_entries(self.__decoys(target_fa))
+            fa.write_entries(read_contaminants(self.contaminants))
+        self.save_checksum(checksum if checksum is not None else self.checksum())
         return self
 
 
 class PercolatorProcessing(object):
-    def __init__(self, folder, filetype, args=None):
+    """ Runs Percolator on the mzid files of a database type. 'decoy_search' is the --decoy_search mode of ms mode:
+    a 'separate' search leaves a decoy mzid file next to each target one, while a 'concatenated' one leaves target
+    mzid files only, whose decoy PSMs are told apart by 'prefix'. """
+    def __init__(self, folder, filetype, args=None, prefix='decoy_', decoy_search='separate'):
         self.folder = folder
         self.args = args
         self.target = None
         self.decoy = None
         self.filetype = filetype
+        self.prefix = prefix
+        self.concatenated = decoy_search == 'concatenated'
 
     def create_metafiles(self):
-        """ Creates a metafile containing the paths to the mzid files, created during the peptide search step. """
+        """ Creates a metafile containing the paths to the mzid files, created during the peptide search step. Raises
+        DecoySearchError if there are decoy mzid files after a concatenated search, or none after a separate one. """
         files = os.listdir(self.folder)
         real = []
         decoy = []
@@ -103,6 +152,12 @@ class PercolatorProcessing(object):
             decoy_out.writelines(decoy)
         self.target = f"{self.folder}/{self.folder}_target_metafile.txt"
         self.decoy = f"{self.folder}/{self.folder}_decoy_metafile.txt"
+        if self.concatenated and decoy:
+            raise DecoySearchError(f'Found decoy mzid files in {self.folder}, which a concatenated target-decoy '
+                                   f'search does not write. Please give postms the --decoy_search given to ms.')
+        if not self.concatenated and real and not decoy:
+            raise DecoySearchError(f'Found no decoy mzid files in {self.folder}, which a separate decoy search '
+                                   f'writes. Please give postms the --decoy_search given to ms.')
         return self
 
     def convert_to_pin(self):
@@ -115,7 +170,9 @@ class PercolatorProcessing(object):
         if not os.path.exists(f"{self.folder}/Percolator"):
             cmd_dir = f'mkdir {self.folder}/Percolator'
             os.system(cmd_dir)
-        cmd_pin = f'{msgf2pin_path} {self.target} {self.decoy} -o {self.folder}/Percolator/{self.folder}_pin.txt' \
+        # the decoy PSMs of a concatenated search are told apart by the prefix of their proteins
+        inputs = f'{self.target} -P {self.prefix}' if self.concatenated else f'{self.target} {self.decoy}'
+        cmd_pin = f'{msgf2pin_path} {inputs} -o {self.folder}/Percolator/{self.folder}_pin.txt' \
                   f' -F {self.filetype}_database.fasta,{self.folder}/Percolator/{self.folder}_decoy.fasta -c 2'
         os.system(cmd_pin)
         return self
@@ -130,11 +187,12 @@ class PercolatorProcessing(object):
                 enz = self.args.enzyme
             if self.args.percolator_path is not None:
                 perc_path = self.args.percolator_path
+        search_input = 'concatenated' if self.concatenated else 'separate'
         cmd_perc = f'{perc_path} -X {self.folder}/Percolator/{self.filetype}_percolator_out.xml --tab-out ' \
                    f'{folder}/comp_features.txt -w {folder}/feature_weights.txt -v 3 -r {folder}/{self.filetype}_pep_results.txt -m ' \
-                   f'{folder}/{self.filetype}_results_psm.txt --search-input separate --results-proteins {folder}/{self.filetype}_protein_results.txt' \
+                   f'{folder}/{self.filetype}_results_psm.txt --search-input {search_input} --results-proteins {folder}/{self.filetype}_protein_results.txt' \
                    f' --protein-enzyme {enz} --protein-report-duplicates --protein-report-fragments ' \
-                   f'--spectral-counting-fdr 0.01 -Y -P decoy_ --picked-protein auto {folder}/{self.folder}_pin.txt'
+                   f'--spectral-counting-fdr 0.01 -Y -P {self.prefix} --picked-protein auto {folder}/{self.folder}_pin.txt'
         os.system(cmd_perc)
         return self
 
@@ -19,12 +19,14 @@
 
 import os
 import pandas as pd
-from Bio import SeqIO
 import numpy as np
 
 from ..sequtils.postsearch import SequenceFinder, LinkData, TSVChunks
 from ..sequtils.utilities import PercolatorConverter
+from ..sequtils.fasta import FastaIndex
+from ..sequtils.orfids import ORFIdentifiers
 from ..sequtils import StringTieGFF, GenomeCoordinates, RefSeqGFF, GenomeCoordinatesRNA, PercolatorUTP, StillCounting, Enrichment
+from ..sequtils import LocusIndex
 
 
 class PostPercolator(object):
@@ -33,18 +35,49 @@ class PostPercolator(object):
         self.folder = folder
         self.percDir = f'{self.folder}/post_perc'
         self.filetype = filetype
+        self.identifiers = ORFIdentifiers(filetype, decoy_prefix=getattr(args, 'decoy_prefix', None) or 'decoy_')
+        self.duplicates = self.__read_duplicates()
         self.__check_dir()
 
     def __check_dir(self):
         if not os.path.exists(f'{self.folder}/post_perc'):
             os.system(f'mkdir {self.folder}/post_perc')
 
+    def __read_duplicates(self):
+        """ Returns the entries removed from a deduplicated database (see database_generator.Database.deduplicate),
+        keyed by the entry that was kept in their place. Empty if the database was not deduplicated. Short ORF IDs are
+        replaced by the full entries, as in the results. """
+        duplicates = {}
+        table = f'{self.filetype}_duplicates.tsv'
+        if os.path.exists(table):
+            df = pd.read_csv(table, sep='\t')
+            for representative, entry in zip(df["Representative"].tolist(), df["Entry"].tolist()):
+                duplicates.setdefault(self.identifiers.expand(representative), []).append(
+                    self.identifiers.expand(entry))
+        return duplicates
+
+    def __expand_duplicates(self, psm):
+        """ Adds the entries removed from a deduplicated database to the proteins of each PSM, so the coordinates of
+        every locus and annotation of a sequence are looked up as if it had been searched once per entry. """
+        df = pd.read_csv(psm, sep='\t')
+        expanded = []
+        for proteins in df["proteinIds"].tolist():
+            entries = []
+            for protein in str(proteins).split(","):
+                entries.append(protein)
+                entries.extend(self.duplicates.get(protein, []))
+            expanded.append(",".join(entries))
+        df["proteinIds"] = expanded
+        df.to_csv(psm, sep='\t', index=False)
+
     def convert_output(self):
         """ Fix some inconsistencies. Pre-processing step. """
         print('Converting output\n')
         pout = PercolatorConverter(pout=f'{self.folder}/Percolator/{self.filetype}_results_psm.txt', conversion_file='.',
                                    handle='psm', gff=self.args.gff)
         pout.convert_entries(pattern='WP', output=f"{self.percDir}/{self.filetype}_converted_psm")
+        if self.duplicates:
+            self.__expand_duplicates(f"{self.percDir}/{self.filetype}_converted_psm.txt")
 
     def get_coordinates_rna(self):
         """ Finds the genome coordinates of each transcript. Must be used on transcriptome database exclusively. """
@@ -59,11 +92,13 @@ class PostPercolator(object):
         return self
 
     def get_coordinates_genome(self):
-        """ Finds the genome coordinates of each ORF from the genome database. """
+        """ Finds the genome coordinates of each ORF from the genome database, looking them up in its LocusIndex
+        (genome.db) when there is one. """
         print('Getting coordinates\n')
         ref_gff = RefSeqGFF(gff=self.args.gff)
         ref_dict = ref_gff.get_dict()
-        coordinates = GenomeCoordinates(f'{self.percDir}/{self.filetype}_converted_psm.txt', ref_dict)
+        loci = LocusIndex('genome') if os.path.exists('genome.db') else None
+        coordinates = GenomeCoordinates(f'{self.percDir}/{self.filetype}_converted_psm.txt', ref_dict, loci=loci)
         coordinates.get_coords().save_table(output=f'{self.percDir}/{self.filetype}_psm_coords')
         return self
 
@@ -99,7 +134,9 @@ class PostPercolator(object):
         Adds protein seqs to the output.
         """
         print('Adding protein sequences\n')
-        seq = SequenceFinder(f'{self.percDir}/{self.filetype}_linked.tsv', f'{self.filetype}_database.fasta')
+        seq = SequenceFinder(f'{self.percDir}/{self.filetype}_linked.tsv', f'{self.filetype}_database.fasta',
+                             identifiers=self.identifiers,
+                             decoy_prefix=getattr(self.args, 'decoy_prefix', None) or 'decoy_')
         seq.df_proteins().save(f'{self.percDir}/{self.filetype}_proteined')
 
     def protein_threshold(self):
@@ -114,7 +151,9 @@ class PostPercolator(object):
         protein.add_proteins(f'{self.percDir}/{self.filetype}_results_02.txt')
 
     def add_coordinates(self, qvalue=0.01):
-        coords = Coordinator(proteined=f'{self.percDir}/{self.filetype}_proteined.tsv', utps=f'{self.percDir}/{self.filetype}_utps.txt', qvalue=qvalue)
+        representatives = {entry: rep for rep, entries in self.duplicates.items() for entry in entries}
+        coords = Coordinator(proteined=f'{self.percDir}/{self.filetype}_proteined.tsv', utps=f'{self.percDir}/{self.filetype}_utps.txt', qvalue=qvalue,
+                             representatives=representatives)
         coords.add_information(f'{self.percDir}/{self.filetype}_results_02.txt')
 
 
@@ -128,7 +167,10 @@ class AnnoFilter(object):
 
 
 class Coordinator(object):
-    def __init__(self, utps, proteined, qvalue=0.01):
+    def __init__(self, utps, proteined, qvalue=0.01, representatives=None):
+        """ 'representatives' maps the entries removed from a deduplicated database to the entry searched in their
+        place, which is the one found in 'proteined'. """
+        self.representatives = representatives if representatives is not None else {}
         self.UTPs = pd.read_csv(utps, sep='\t')
         # print(self.UTPs)
         self.UTPs = self.UTPs[self.UTPs["q-value"] != "q-value"]
@@ -163,7 +205,8 @@ class Coordinator(object):
         ndf = pd.DataFrame(columns=self.proteined.columns)
 
         for protein in self.coordinates:
-            df = self.proteined[self.proteined["Protein"].str.contains(protein)]
+            searched = self.representatives.get(protein, protein)
+            df = self.proteined[self.proteined["Protein"].str.contains(searched)]
             proteins = df["Protein"].tolist()
             new_proteins = []
             coordinates = []
@@ -186,6 +229,7 @@ class ProteinFDR(object):
         self.fdr = fdr
         self.percDir = f'{self.folder}/post_perc'
         self.filteredProtein = None
+        self.identifiers = ORFIdentifiers(filetype)
         self.__cat_protein_results()
 
     def __cat_protein_results(self):
@@ -273,22 +317,17 @@ class ProteinFDR(object):
         return self
 
     def __read_db(self):
-        protein_dict = {}
-        db = f'{self.filetype}_database.fasta'
-        records = SeqIO.parse(db, 'fasta')
-        for record in records:
-            if str(record.description) not in protein_dict:
-                protein_dict[str(record.description)] = str(record.seq)
-        return protein_dict
+        return FastaIndex(f'{self.filetype}_database.fasta', key='header')
 
     def add_proteins(self, output):
-        db_proteins = self.__read_db()
         results = pd.read_csv(f"{self.percDir}/{self.filetype}_results_01.txt", sep='\t')
         results = results.drop(columns="ORF Sequence")
         fixed_seqs = []
         entries = results["Protein"].tolist()
-        for entry in entries:
-            fixed_seqs.append(db_proteins[entry])
+        short_ids = self.identifiers.short_ids(entries)
+        with self.__read_db() as db_proteins:
+            for entry in entries:
+                fixed_seqs.append(db_proteins[short_ids[entry]])
         results.insert(9, "db entry", fixed_seqs)
         results.to_csv(output, sep='\t', index=False)
         return self
@@ -0,0 +1,4 @@
+from .scheduler import SearchJob, SearchScheduler
+from .index import IndexCache
+from .manifest import SearchManifest
+from .shards import split_fasta, merge_mzid
\ No newline at end of file
@@ -0,0 +1,62 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+
+from ..database.cache import DatabaseCache
+
+
+# Files of the index MSGF+ writes next to a database
+INDEX_SUFFIXES = ('.canno', '.cnlcp', '.csarr', '.cseq')
+
+
+class IndexCache(DatabaseCache):
+    """ Cache of the MSGF+ indexes of the searched databases. MSGF+ writes the index of a database (.canno, .cnlcp,
+    .csarr and .cseq) next to the fasta file it searches, so each database is linked into an entry named after the hash
+    of its contents, and searched from there. Its index is built the first time it is searched and kept for later runs
+    and other projects with the same database. Entries are evicted from the least recently used one, as in
+    DatabaseCache, but only by an explicit call to evict once the searches finished, so the entries of the queued
+    searches are never removed before they run. It is kept in the 'msgf' directory of the database cache. """
+    def __init__(self, directory=None, max_size=50 * 1024 ** 3):
+        if directory is None:
+            directory = self.default_directory()
+        super().__init__(os.path.join(directory, 'msgf'), max_size=max_size)
+
+    @classmethod
+    def from_args(cls, args):
+        """ :returns the index cache set by the command line arguments, or None if --no-cache was given. """
+        if getattr(args, 'no_cache', False):
+            return None
+        return cls(directory=getattr(args, 'cache_dir', None),
+                   max_size=int((getattr(args, 'index_cache_size', None) or 50) * 1024 ** 3))
+
+    def database(self, fasta):
+        """ :returns the path of the cached link to a database, which is where it should be searched from. """
+        key = self.key([fasta], tda=0)
+        cached = os.path.join(self.directory, key, os.path.basename(fasta))
+        if os.path.exists(cached):
+            os.utime(os.path.dirname(cached))
+        else:
+            self.store(key, [fasta], evict=False)
+        return cached
+
+    @staticmethod
+    def is_indexed(database):
+        """ Whether MSGF+ already built the index of a database, which is then only read by its searches. """
+        return all(os.path.exists(os.path.splitext(database)[0] + suffix) for suffix in INDEX_SUFFIXES)
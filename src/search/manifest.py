@@ -0,0 +1,92 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import json
+import os
+
+from ..database.cache import DatabaseCache
+
+
+class SearchManifest(object):
+    """ Record of the finished searches of ms mode, kept in 'path' (search_manifest.json in the output directory).
+    Each mzid file is recorded with the key of the search that wrote it, the hash of the database, the spectrum file
+    and the MSGF+ parameters, along with its size and modification time. A search whose output is recorded with the
+    same key and was not modified since is skipped by later runs. The hashes of the inputs are kept with their size
+    and modification time as well, so unchanged files are not read again, and they are only computed for outputs that
+    were recorded. Each record is merged into the manifest on disk, which is written to a temporary file and renamed
+    over the previous one, so an interrupted run never leaves it incomplete. """
+    def __init__(self, path='search_manifest.json'):
+        self.path = os.path.abspath(path)
+        self.outputs, self.hashes = self.__load()
+
+    def __load(self):
+        if not os.path.exists(self.path):
+            return {}, {}
+        try:
+            with open(self.path) as handle:
+                manifest = json.load(handle)
+        except ValueError:
+            # written by a version without atomic writes
+            return {}, {}
+        return manifest.get('outputs', {}), manifest.get('hashes', {})
+
+    def checksum(self, file):
+        """ :returns the hash of the contents of a file, which is only computed again if its size or modification
+        time changed. """
+        path = os.path.abspath(file)
+        stat = os.stat(path)
+        saved = self.hashes.get(path)
+        if saved is not None and saved['size'] == stat.st_size and saved['mtime'] == stat.st_mtime_ns:
+            return saved['sha256']
+        checksum = DatabaseCache.key([path])
+        self.hashes[path] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': checksum}
+        return checksum
+
+    def key(self, database, spectra, params):
+        """ :returns the key of the search of the 'spectra' file against 'database' with the MSGF+ 'params'. """
+        return DatabaseCache.key([], database=self.checksum(database), spectra=self.checksum(spectra),
+                                 params=list(params))
+
+    def is_complete(self, output, database, spectra, params):
+        """ Whether 'output' was written by the same search and left untouched since. """
+        record = self.outputs.get(os.path.abspath(output))
+        if record is None or not os.path.exists(output):
+            return False
+        stat = os.stat(output)
+        if record['size'] != stat.st_size or record['mtime'] != stat.st_mtime_ns:
+            return False
+        return record['key'] == self.key(database, spectra, params)
+
+    def complete(self, output, database, spectra, params):
+        """ Records 'output' as written by the search of 'spectra' against 'database'. """
+        stat = os.stat(output)
+        key = self.key(database, spectra, params)
+        # other searches of the run record their outputs in the same manifest
+        self.outputs, hashes = self.__load()
+        self.hashes = {**hashes, **self.hashes}
+        self.outputs[os.path.abspath(output)] = {'key': key, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        self.save()
+        return self
+
+    def save(self):
+        partial = f'{self.path}.{os.getpid()}.partial'
+        with open(partial, 'w') as out:
+            json.dump({'outputs': self.outputs, 'hashes': self.hashes}, out, indent=1, sort_keys=True)
+        os.replace(partial, self.path)
+        return self
@@ -0,0 +1,166 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import subprocess
+import time
+
+from ..sequtils.__helpers import SearchError
+
+
+# Seconds between checks of the running jobs
+POLL_INTERVAL = 0.5
+
+
+class SearchJob(object):
+    """ A command of the peptide search, such as an MSGF+ run on a spectrum file. Its output is written to 'log'.
+    'memory' is the heap it reserves from the memory budget of the scheduler, in GB, and 'size' orders the jobs, from
+    the largest one. Jobs of the same 'group' search the same database that is not indexed yet, which MSGF+ indexes
+    next to the database file the first time it is searched, so only one of them runs until one of the group succeeds.
+    Jobs without a group never wait for others. The command runs in 'cwd', and 'on_success' is called with the job
+    once it exits without errors, e.g. to move its outputs in place; the job fails if it raises OSError. """
+    def __init__(self, name, cmd, log, memory=1, size=0, group=None, cwd=None, on_success=None):
+        self.name = name
+        self.cmd = cmd
+        self.log = log
+        self.memory = memory
+        self.size = size
+        self.group = group
+        self.cwd = cwd
+        self.onSuccess = on_success
+        self.returncode = None
+        self.error = None
+        self.elapsed = None
+        self.__process = None
+        self.__started = None
+
+    def start(self):
+        if os.path.dirname(self.log):
+            os.makedirs(os.path.dirname(self.log), exist_ok=True)
+        with open(self.log, 'w') as log:
+            self.__process = subprocess.Popen(self.cmd, stdout=log, stderr=subprocess.STDOUT, cwd=self.cwd)
+        self.__started = time.monotonic()
+        return self
+
+    def poll(self):
+        """ :returns the exit status of the job, or None if it is still running. """
+        if self.returncode is None and self.__process is not None:
+            self.returncode = self.__process.poll()
+            if self.returncode is not None:
+                self.elapsed = time.monotonic() - self.__started
+                self.__finish()
+        return self.returncode
+
+    def __finish(self):
+        if self.returncode == 0 and self.onSuccess is not None:
+            try:
+                self.onSuccess(self)
+            except OSError as error:
+                self.error = str(error)
+
+    def terminate(self):
+        if self.__process is not None and self.poll() is None:
+            self.__process.terminate()
+            self.__process.wait()
+
+    @property
+    def failed(self):
+        return self.returncode != 0 or self.error is not None
+
+
+class SearchScheduler(object):
+    """ Runs the jobs of the peptide search at the same time, up to 'jobs' of them and within 'max_memory' GB of
+    reserved heap (no limit if None). Jobs start from the largest one that fits, and a job larger than the budget
+    still runs alone. The exit status of every job is reported when it finishes and written to 'report', and
+    SearchError is raised after all jobs finished if any of them failed. """
+    def __init__(self, jobs=1, max_memory=None, report='search_jobs.tsv'):
+        self.jobs = jobs
+        self.maxMemory = max_memory
+        self.report = report
+        self.queue = []
+
+    @classmethod
+    def from_args(cls, args):
+        """ :returns the scheduler set by the command line arguments (--jobs and --max-memory). """
+        return cls(jobs=getattr(args, 'jobs', None) or 1, max_memory=getattr(args, 'max_memory', None))
+
+    def add(self, job):
+        self.queue.append(job)
+        return self
+
+    def __fits(self, job, running):
+        if not running:
+            return True
+        if len(running) >= self.jobs:
+            return False
+        return self.maxMemory is None or sum(other.memory for other in running) + job.memory <= self.maxMemory
+
+    def run(self):
+        """ Runs the queued jobs and :returns them, with their exit status. """
+        pending = sorted(self.queue, key=lambda job: job.size, reverse=True)
+        self.queue = []
+        running = []
+        done = []
+        # groups with a job indexing their database, and groups whose database was indexed by a job that succeeded
+        indexing, indexed = set(), set()
+        try:
+            while pending or running:
+                for job in list(pending):
+                    if not self.__fits(job, running):
+                        continue
+                    if job.group is not None and job.group not in indexed:
+                        if job.group in indexing:
+                            continue
+                        indexing.add(job.group)
+                    pending.remove(job)
+                    running.append(job.start())
+                finished = [job for job in running if job.poll() is not None]
+                for job in finished:
+                    running.remove(job)
+                    done.append(job)
+                    if not job.failed:
+                        indexed.add(job.group)
+                    else:
+                        # the index may be incomplete, so the next job of the group builds it again alone
+                        indexing.discard(job.group)
+                    if job.error is not None:
+                        print(f'{job.name} failed: {job.error}')
+                    elif job.failed:
+                        print(f'{job.name} failed with exit status {job.returncode}. See {job.log}')
+                    else:
+                        print(f'{job.name} finished in {job.elapsed:.0f} s.')
+                if not finished:
+                    time.sleep(POLL_INTERVAL)
+        finally:
+            for job in running:
+                job.terminate()
+        self.__write_report(done)
+        failed = [job.name for job in done if job.failed]
+        if failed:
+            raise SearchError(f'{len(failed)} of {len(done)} peptide search jobs failed: {", ".join(failed)}. '
+                              f'Their exit status is listed in {self.report}.')
+        return done
+
+    def __write_report(self, jobs):
+        if self.report is None:
+            return
+        with open(self.report, 'w') as report:
+            report.write('Job\tExit status\tSeconds\tLog\tError\n')
+            report.writelines(f'{job.name}\t{job.returncode}\t{job.elapsed:.1f}\t{job.log}\t{job.error or ""}\n'
+                              for job in jobs)
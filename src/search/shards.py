@@ -0,0 +1,193 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import heapq
+import os
+import statistics
+import xml.etree.ElementTree as ET
+from contextlib import ExitStack
+
+from ..database.cache import DatabaseCache
+from ..sequtils.fasta import FastaWriter, iter_fasta
+
+
+# Accessions of the scores MSGF+ reports for each PSM
+SPEC_EVALUE = 'MS:1002052'
+EVALUE = 'MS:1002053'
+
+# Elements of the SequenceCollection of an mzid file, in the order of the schema
+SEQUENCES = ('DBSequence', 'Peptide', 'PeptideEvidence')
+
+
+def split_fasta(fasta, shards, directory):
+    """ Splits a fasta file into up to 'shards' files with about the same number of residues, written to 'directory'
+    as <name>_1.fasta, <name>_2.fasta... Each entry goes to the shard with the fewest residues so far, in a single
+    pass, so shards differ by at most the length of a protein. Shards left empty are removed. :returns the paths of
+    the shards. """
+    name = os.path.splitext(os.path.basename(fasta))[0]
+    paths = [os.path.join(directory, f'{name}_{i + 1}.fasta') for i in range(shards)]
+    os.makedirs(directory, exist_ok=True)
+    # shards are linked into the index cache
+    DatabaseCache.clear(paths)
+    residues = [(0, i) for i in range(shards)]
+    with ExitStack() as stack:
+        writers = [stack.enter_context(FastaWriter(path)) for path in paths]
+        for header, seq in iter_fasta(fasta):
+            size, i = heapq.heappop(residues)
+            writers[i].write(header, seq)
+            heapq.heappush(residues, (size + len(seq), i))
+    empty = [paths[i] for size, i in residues if not size]
+    DatabaseCache.clear(empty)
+    return [path for path in paths if path not in empty]
+
+
+class _Shard(object):
+    """ The PSMs of an mzid file of a search against a shard, with the IDs of its sequences prefixed by 'prefix', so
+    they are unique among the shards. """
+    def __init__(self, path, prefix):
+        self.tree = ET.parse(path)
+        self.ns = self.tree.getroot().tag[1:].split('}')[0] if self.tree.getroot().tag.startswith('{') else ''
+        self.sequences = {tag: self.findall(f'.//{{ns}}SequenceCollection/{{ns}}{tag}') for tag in SEQUENCES}
+        for element in self.iter_sequences():
+            element.set('id', prefix + element.get('id'))
+            for ref in ('dBSequence_ref', 'peptide_ref'):
+                if element.get(ref) is not None:
+                    element.set(ref, prefix + element.get(ref))
+        self.peptides = {peptide.get('id'): peptide_key(peptide, self.ns) for peptide in self.sequences['Peptide']}
+        self.results = self.findall('.//{ns}SpectrumIdentificationList/{ns}SpectrumIdentificationResult')
+        for item in self.findall('.//{ns}SpectrumIdentificationItem'):
+            item.set('peptide_ref', prefix + item.get('peptide_ref'))
+            for evidence in item.findall(self.tag('PeptideEvidenceRef')):
+                evidence.set('peptideEvidence_ref', prefix + evidence.get('peptideEvidence_ref'))
+        ratios = [ratio for result in self.results for ratio in [self.evalue_ratio(result)] if ratio is not None]
+        # used for the spectra this shard has no match for
+        self.ratio = statistics.median(ratios) if ratios else None
+
+    def tag(self, name):
+        return f'{{{self.ns}}}{name}' if self.ns else name
+
+    def findall(self, path):
+        return self.tree.getroot().findall(path.format(ns=f'{{{self.ns}}}' if self.ns else ''))
+
+    def iter_sequences(self):
+        for tag in SEQUENCES:
+            yield from self.sequences[tag]
+
+    def score(self, item, accession):
+        for param in item.findall(self.tag('cvParam')):
+            if param.get('accession') == accession:
+                return float(param.get('value'))
+        return None
+
+    def evalue_ratio(self, result):
+        """ :returns the ratio of the EValue to the SpecEValue of the matches of a spectrum, which is the number of
+        peptides of the shard MSGF+ scored it against. """
+        for item in result.findall(self.tag('SpectrumIdentificationItem')):
+            spec_evalue, evalue = self.score(item, SPEC_EVALUE), self.score(item, EVALUE)
+            if spec_evalue and evalue is not None:
+                return evalue / spec_evalue
+        return None
+
+
+def peptide_key(peptide, ns):
+    """ :returns what tells apart the peptides of an mzid file: their sequence and modifications. """
+    prefix = f'{{{ns}}}' if ns else ''
+    sequence = peptide.findtext(f'{prefix}PeptideSequence')
+    modifications = tuple(sorted((mod.get('location'), mod.get('monoisotopicMassDelta'))
+                                 for mod in peptide.findall(f'{prefix}Modification')))
+    return sequence, modifications
+
+
+def merge_mzid(shards, output, database=None, matches=1):
+    """ Merges the mzid files of the searches of a spectrum file against the shards of a database into 'output', as
+    if the whole database had been searched. The matches of each spectrum are pooled and the best 'matches' ranks
+    (by SpecEValue, as MSGF+ -n) are kept. A peptide matched in several shards is kept once, with the proteins of all
+    of them. The EValue of the matches is scaled to the peptides of all the shards, and the searched database is
+    'database' if given. The other elements are those of the first shard. """
+    shards = [_Shard(path, f'S{i + 1}_' if i else '') for i, path in enumerate(shards)]
+    base = shards[0]
+    ET.register_namespace('', base.ns)
+    collection = base.findall('.//{ns}SequenceCollection')[0]
+    for element in list(collection):
+        collection.remove(element)
+    for tag in SEQUENCES:
+        collection.extend(element for shard in shards for element in shard.sequences[tag])
+
+    results = {}
+    for shard in shards:
+        for result in shard.results:
+            results.setdefault((result.get('spectraData_ref'), result.get('spectrumID')), []).append((shard, result))
+    merged = [_merge_results(shards, pooled, matches) for pooled in results.values()]
+
+    identifications = base.findall('.//{ns}SpectrumIdentificationList')[0]
+    for result in base.results:
+        identifications.remove(result)
+    identifications.extend(merged)
+    total = [shard.findall('.//{ns}SpectrumIdentificationList')[0].get('numSequencesSearched') for shard in shards]
+    if all(number is not None for number in total):
+        identifications.set('numSequencesSearched', str(sum(int(number) for number in total)))
+    for db in base.findall('.//{ns}SearchDatabase'):
+        sizes = [shard.findall('.//{ns}SearchDatabase')[0].get('numDatabaseSequences') for shard in shards]
+        if all(size is not None for size in sizes):
+            db.set('numDatabaseSequences', str(sum(int(size) for size in sizes)))
+        if database is not None:
+            db.set('location', os.path.abspath(database))
+    base.tree.write(output, encoding='UTF-8', xml_declaration=True)
+    return output
+
+
+def _merge_results(shards, pooled, matches):
+    """ :returns the SpectrumIdentificationResult of a spectrum with the best matches of its results in the shards
+    ('pooled', as (shard, result) tuples). """
+    base, result = pooled[0]
+    ratios = {id(shard): shard.evalue_ratio(found) for shard, found in pooled}
+    ratio = sum(ratios.get(id(shard)) or shard.ratio or 0 for shard in shards)
+    items = {}
+    for shard, found in pooled:
+        for item in found.findall(shard.tag('SpectrumIdentificationItem')):
+            key = (shard.peptides.get(item.get('peptide_ref')), item.get('chargeState'))
+            if key in items:
+                # the same peptide in proteins of other shards
+                items[key][1].extend(item.findall(shard.tag('PeptideEvidenceRef')))
+            else:
+                score = shard.score(item, SPEC_EVALUE)
+                items[key] = (float('inf') if score is None else score,
+                              item.findall(shard.tag('PeptideEvidenceRef')), item, shard)
+    ranked = sorted(items.values(), key=lambda found: found[0])
+    for element in result.findall(base.tag('SpectrumIdentificationItem')):
+        result.remove(element)
+    scores = sorted({score for score, *_ in ranked})
+    kept = []
+    for spec_evalue, evidences, item, shard in ranked:
+        rank = scores.index(spec_evalue) + 1
+        if rank > matches:
+            break
+        for evidence in item.findall(shard.tag('PeptideEvidenceRef')):
+            item.remove(evidence)
+        for position, evidence in enumerate(evidences):
+            item.insert(position, evidence)
+        item.set('rank', str(rank))
+        item.set('id', f'{result.get("id").replace("SIR", "SII", 1)}_{len(kept) + 1}')
+        for param in item.findall(shard.tag('cvParam')):
+            if param.get('accession') == EVALUE and ratio and spec_evalue != float('inf'):
+                param.set('value', repr(spec_evalue * ratio))
+        kept.append(item)
+    for position, item in enumerate(kept):
+        result.insert(position, item)
+    return result
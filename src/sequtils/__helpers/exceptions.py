@@ -65,6 +65,13 @@ class EngineError(Error):
         super().__init__(self.message)
 
 
+class ScanEngineError(Error):
+    """ Raised when the ORF scanning engine is incorrect. """
+    def __init__(self, message="Unsupported ORF scanning engine. Current supported engines are: stops, regex."):
+        self.message = message
+        super().__init__(self.message)
+
+
 class PercolatorProteinsError(Error):
     """ Raised when the file containing proteins from percolator output is missing or incorret."""
     def __init__(self, message="Provide a valid percolator output file containing protein information."):
@@ -82,4 +89,31 @@ class UProteinsError(Error):
     """ Raised when a file is missing for uProteInS method for identifying unique peptides. """
     def __init__(self, message="Provide both a valid Genbankd and a fasta file containing the predicted ORFs."):
         self.message = message
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+class ManifestError(Error):
+    """ Raised when the manifest of a batch of genomes is incorrect. """
+    def __init__(self, message="Invalid manifest. Please inform a tab-separated file with a name and a genome column."):
+        self.message = message
+        super().__init__(self.message)
+
+
+class SearchError(Error):
+    """ Raised when jobs of the peptide search fail. """
+    def __init__(self, message="Peptide search jobs failed. Check their logs."):
+        self.message = message
+        super().__init__(self.message)
+
+
+class ContigError(Error):
+    """ Raised when a fasta file has more than one sequence with the same name. """
+    def __init__(self, message="Duplicate sequence names. Please give each sequence of the fasta file a unique name."):
+        self.message = message
+        super().__init__(self.message)
+
+
+class DecoySearchError(Error):
+    """ Raised when the mzid files of the peptide search do not match the way the decoys were searched. """
+    def __init__(self, message="The mzid files do not match --decoy_search. Please give postms the mode given to ms."):
+        self.message = message
+        super().__init__(self.message)
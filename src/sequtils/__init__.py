@@ -4,9 +4,14 @@ import sqlite3
 
 
 from .conversion import complement, translate
-from .orflib import ORF, ORFCollection
+from .orflib import ORF, ORFCollection, ORFTable, StopCollapser
 from .frame_translation import GenomeTranslator, TranscriptomeTranslator, FrameTranslator
 from .database import DatabaseGenerator
+from .locusindex import LocusIndex, Locus
+from .digestion import Digester
+from .genomestore import GenomeStore
+from .fasta import iter_fasta, read_fasta, write_fasta, FastaWriter, FastaIndex
+from .orfids import ORFIdentifiers
 from .spectra import SpectralCounting
 from .locus import StringTieGFF, GenomeCoordinates, RefSeqGFF, GenomeCoordinatesRNA
 from .unique import PercolatorUTP
@@ -1,2 +1,2 @@
 from .complement import StrandConverter
-from .translate import Translator
+from .translate import Translator, FrameTranslation
@@ -18,19 +18,18 @@
 
 
 
+# Complement of each base, IUPAC ambiguity codes included. Anything else is left as it is
+COMPLEMENT_TABLE = str.maketrans('ACGTUNRYKMSWBDHVacgtunrykmswbdhv', 'TGCAANYRMKSWVHDBtgcaanyrmkswvhdb')
+
+
 class StrandConverter(object):
     def __init__(self, sequence):
         self.sequence = sequence
         self.complementary = []
 
     def complement(self):
-        nuc_table = {
-            'A': 'T',  'T': 'A', 'G': 'C', 'C': 'G'
-        }
         for chromosome in self.sequence:
-            nuc_seq = ""
-            for nuc in chromosome:
-                nuc_seq += nuc_table[nuc]
+            nuc_seq = chromosome.translate(COMPLEMENT_TABLE)
             if "*" not in nuc_seq:
                 self.complementary.append(nuc_seq)
         return self
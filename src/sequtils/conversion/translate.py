@@ -17,32 +17,38 @@
 # uProteInS. If not, see <https://www.gnu.org/licenses/>.
 
 
+import numpy as np
 from Bio import SeqIO
 
+from .complement import COMPLEMENT_TABLE
+
+
+CODON_TABLE = {
+    'ATA': 'I', 'ATC': 'I', 'ATT': 'I', 'ATG': 'M',
+    'ACA': 'T', 'ACC': 'T', 'ACG': 'T', 'ACT': 'T',
+    'AAC': 'N', 'AAT': 'N', 'AAA': 'K', 'AAG': 'K',
+    'AGC': 'S', 'AGT': 'S', 'AGA': 'R', 'AGG': 'R',
+    'CTA': 'L', 'CTC': 'L', 'CTG': 'L', 'CTT': 'L',
+    'CCA': 'P', 'CCC': 'P', 'CCG': 'P', 'CCT': 'P',
+    'CAC': 'H', 'CAT': 'H', 'CAA': 'Q', 'CAG': 'Q',
+    'CGA': 'R', 'CGC': 'R', 'CGG': 'R', 'CGT': 'R',
+    'GTA': 'V', 'GTC': 'V', 'GTG': 'V', 'GTT': 'V',
+    'GCA': 'A', 'GCC': 'A', 'GCG': 'A', 'GCT': 'A',
+    'GAC': 'D', 'GAT': 'D', 'GAA': 'E', 'GAG': 'E',
+    'GGA': 'G', 'GGC': 'G', 'GGG': 'G', 'GGT': 'G',
+    'TCA': 'S', 'TCC': 'S', 'TCG': 'S', 'TCT': 'S',
+    'TTC': 'F', 'TTT': 'F', 'TTA': 'L', 'TTG': 'L',
+    'TAC': 'Y', 'TAT': 'Y', 'TAA': '*', 'TAG': '*',
+    'TGC': 'C', 'TGT': 'C', 'TGA': '*', 'TGG': 'W',
+}
+
 
 class Translator(object):
     def __init__(self, genome):
         self.genome = genome
 
     def translate(self):
-        table = {
-            'ATA': 'I', 'ATC': 'I', 'ATT': 'I', 'ATG': 'M',
-            'ACA': 'T', 'ACC': 'T', 'ACG': 'T', 'ACT': 'T',
-            'AAC': 'N', 'AAT': 'N', 'AAA': 'K', 'AAG': 'K',
-            'AGC': 'S', 'AGT': 'S', 'AGA': 'R', 'AGG': 'R',
-            'CTA': 'L', 'CTC': 'L', 'CTG': 'L', 'CTT': 'L',
-            'CCA': 'P', 'CCC': 'P', 'CCG': 'P', 'CCT': 'P',
-            'CAC': 'H', 'CAT': 'H', 'CAA': 'Q', 'CAG': 'Q',
-            'CGA': 'R', 'CGC': 'R', 'CGG': 'R', 'CGT': 'R',
-            'GTA': 'V', 'GTC': 'V', 'GTG': 'V', 'GTT': 'V',
-            'GCA': 'A', 'GCC': 'A', 'GCG': 'A', 'GCT': 'A',
-            'GAC': 'D', 'GAT': 'D', 'GAA': 'E', 'GAG': 'E',
-            'GGA': 'G', 'GGC': 'G', 'GGG': 'G', 'GGT': 'G',
-            'TCA': 'S', 'TCC': 'S', 'TCG': 'S', 'TCT': 'S',
-            'TTC': 'F', 'TTT': 'F', 'TTA': 'L', 'TTG': 'L',
-            'TAC': 'Y', 'TAT': 'Y', 'TAA': '*', 'TAG': '*',
-            'TGC': 'C', 'TGT': 'C', 'TGA': '*', 'TGG': 'W',
-        }
+        table = CODON_TABLE
         protein = ""
         for i in range(0, len(self.genome), 3):
             codon = self.genome[i:i + 3]
@@ -54,10 +60,41 @@ class Translator(object):
         return protein
 
     def complement(self):
-        nuc_table = {
-            'A': 'T',  'T': 'A', 'G': 'C', 'C': 'G'
-        }
-        nuc_seq = ""
-        for i in self.genome:
-            nuc_seq += nuc_table[i]
-        return nuc_seq
+        return self.genome.translate(COMPLEMENT_TABLE)
+
+
+def _codon_lookup():
+    """ Builds the arrays used by FrameTranslation: one maps each byte to a base index (A, C, G, T or 4 for anything
+    else), and the other maps the base-5 index of a codon to its amino acid. """
+    bases = np.full(256, 4, dtype=np.uint8)
+    for i, nuc in enumerate(b'ACGT'):
+        bases[nuc] = i
+    amino_acids = np.full(125, ord('X'), dtype=np.uint8)
+    for codon, aa in CODON_TABLE.items():
+        first, second, third = bases[np.frombuffer(codon.encode(), dtype=np.uint8)]
+        amino_acids[first * 25 + second * 5 + third] = ord(aa)
+    return bases, amino_acids
+
+
+_BASES, _AMINO_ACIDS = _codon_lookup()
+
+
+class FrameTranslation(object):
+    """ Translates the three reading frames of a nucleotide sequence once, so that the proteins of all ORFs found in it
+    can be taken as slices instead of translating the same codons again for every overlapping ORF. Codons with bases
+    other than A, C, G or T are translated as 'X'. Keep one instance per scanning window, so memory is bounded by the
+    size of the window instead of the largest contig. """
+    def __init__(self, sequence):
+        bases = _BASES[np.frombuffer(str(sequence).encode('ascii'), dtype=np.uint8)]
+        self.frames = [self.__translate_frame(bases[frame:]) for frame in range(3)]
+
+    @staticmethod
+    def __translate_frame(bases):
+        codons = bases[:len(bases) // 3 * 3].reshape(-1, 3).astype(np.uint16)
+        indexes = codons[:, 0] * 25 + codons[:, 1] * 5 + codons[:, 2]
+        return _AMINO_ACIDS[indexes].tobytes().decode('ascii')
+
+    def protein(self, start, end):
+        """ Returns the protein encoded by sequence[start:end], with the first residue translated as 'M', like
+        Translator.translate does for the start codon. """
+        return "M" + self.frames[start % 3][start // 3 + 1:end // 3]
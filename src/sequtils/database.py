@@ -20,10 +20,11 @@
 import sqlite3
 import os
 
-from Bio import SeqIO
 from .orflib import ORFCollection
 from .conversion import *
 from .frame_translation import *
+from .locusindex import LocusIndex
+from .fasta import FastaWriter
 
 
 class DatabaseGenerator(object):
@@ -54,10 +55,29 @@ class DatabaseGenerator(object):
 
     def to_fasta(self, filename="db_orfs.fasta", identifier='g'):
         """ Writes and entries and sequences inside the database to a fasta file. """
-        data = self.retrieve()
-        to_write = [f">{identifier}{orf[1]}_{orf[4]}-{orf[5]}_{orf[6]}\n{orf[2]}\n" for orf in data]
-        with open(filename, 'w') as fa:
-            fa.writelines(to_write)
+        data = self.db.iter_rows()
+        with FastaWriter(filename) as fa:
+            fa.write_entries((f'{identifier}{orf[1]}_{orf[4]}-{orf[5]}_{orf[6]}', orf[2]) for orf in data)
+
+    def write_orfs(self, orfs, filename="db_orfs.fasta", identifier='g', short_ids=False):
+        """ Streams ORFs from an iterable (i.e. FrameTranslator.iter_orfs) to the database, if there is one, and to a
+        fasta file in a single pass, without keeping them in memory. The fasta file is the same as the one written by
+        add_orfs followed by to_fasta. With 'short_ids', the entries are only the identifier and the ID of each ORF in
+        the database (see ORFIdentifiers), which are only recorded if all the ORFs were inserted. """
+        if self.db is not None:
+            orfs = self.db.stream_orfs(orfs)
+        with FastaWriter(filename) as fa:
+            if short_ids:
+                # the IDs of the ORFs follow the order they are inserted in
+                fa.write_entries((f'{identifier}{i}', orf.seq) for i, orf in enumerate(orfs, start=1))
+            else:
+                fa.write_entries((f'{identifier}{orf.name}_{orf.start}-{orf.end}_{orf.strand}', orf.seq)
+                                 for orf in orfs)
+        if self.db is not None:
+            if short_ids and not self.db.loaded:
+                print("The ORFs were not all inserted into the database, so their short IDs cannot be expanded.")
+            self.db.set_identifier(identifier if short_ids and self.db.loaded else None)
+        return self
 
 
 class FastaDatabase(object):
@@ -66,47 +86,116 @@ class FastaDatabase(object):
 
 
 class SQLDatabase(object):
-    def __init__(self, name):
+    """ SQLite store of the predicted ORFs. The ORFOME table is recreated each time an instance is created, so reruns
+    never mix entries with a previous database. ORFs are inserted in batches of 'batch_size' rows, and the indexes are
+    only built after the bulk load. The ORF coordinates are added to the LocusIndex by its first query of ORF loci. """
+    def __init__(self, name, batch_size=50_000):
+        self.prefix = name
         self.name = f'{name}.db'
+        self.batchSize = batch_size
+        # whether stream_orfs inserted all the ORFs
+        self.loaded = False
         self.__create_database()
 
     def __connect(self):
         conn = sqlite3.connect(self.name)
         return conn
 
+    def __connect_bulk(self):
+        """ Connection tuned for bulk loading. WAL with synchronous=OFF skips the fsync of every commit; in the worst
+        case, a crash leaves an incomplete database that is rebuilt on the next run anyway. """
+        conn = self.__connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-65536')
+        return conn
+
     def __create_database(self):
         conn = self.__connect()
         try:
-            conn.execute('''CREATE TABLE ORFOME(ID INT PRIMARY KEY     NOT NULL,
-                                                NAME    TEXT    NOT NULL,
-                                                SEQ     TEXT    NOT NULL,
-                                                LENGTH  INT     NOT NULL,
-                                                START   INT     NOT NULL,
-                                                END     INT     NOT NULL,
-                                                STRAND  TEXT    NOT NULL);''')
-        except:
-            pass
+            with conn:
+                conn.execute('DROP TABLE IF EXISTS ORFOME')
+                conn.execute('DROP TABLE IF EXISTS ORF_IDENTIFIERS')
+                conn.execute('CREATE TABLE ORF_IDENTIFIERS(IDENTIFIER TEXT NOT NULL)')
+                conn.execute('''CREATE TABLE ORFOME(ID          INT PRIMARY KEY NOT NULL,
+                                                    NAME        TEXT    NOT NULL,
+                                                    SEQ         TEXT    NOT NULL,
+                                                    LENGTH      INT     NOT NULL,
+                                                    START       INT     NOT NULL,
+                                                    END         INT     NOT NULL,
+                                                    STRAND      TEXT    NOT NULL,
+                                                    CONTIG      TEXT,
+                                                    FRAME       INT,
+                                                    START_CODON TEXT,
+                                                    ORIGIN      TEXT);''')
+        finally:
+            conn.close()
+        return self
 
+    def set_identifier(self, identifier):
+        """ Records that the fasta entries of the ORFs are 'identifier' followed by their ID, or that they are the
+        full entries if 'identifier' is None. """
+        conn = self.__connect()
+        try:
+            with conn:
+                conn.execute('DELETE FROM ORF_IDENTIFIERS')
+                if identifier is not None:
+                    conn.execute('INSERT INTO ORF_IDENTIFIERS(IDENTIFIER) VALUES (?)', (identifier,))
+        finally:
+            conn.close()
         return self
 
+    @staticmethod
+    def __create_indexes(conn):
+        with conn:
+            conn.execute('CREATE INDEX IF NOT EXISTS ORFOME_NAME ON ORFOME(NAME)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ORFOME_COORDINATES ON ORFOME(CONTIG, STRAND, START, END)')
+
     def add_orfs(self, orfs):
         """ This method is only to be called within DatabaseGenerator class. """
+        for _ in self.stream_orfs(orfs):
+            pass
+
+    def stream_orfs(self, orfs):
+        """ Inserts the ORFs while they are consumed and yields each one back, so that another sink can process them
+        in the same pass. If an insertion fails, the remaining ORFs are still yielded. This method is only to be called
+        within DatabaseGenerator class. """
+        insert_query = """INSERT INTO ORFOME(ID, NAME, SEQ, LENGTH, START, END, STRAND, CONTIG, FRAME, START_CODON,
+                                             ORIGIN) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+        self.loaded = False
+        conn = self.__connect_bulk()
+        failed = False
+        rows = []
+
+        def insert():
+            nonlocal failed
+            try:
+                with conn:
+                    conn.executemany(insert_query, rows)
+            except sqlite3.Error as error:
+                print("Failed to insert entries into db. Error: ", error)
+                failed = True
+            rows.clear()
+
         try:
-            conn = self.__connect()
-            cursor = conn.cursor()
-            i = 1
-            for orf in orfs:
-                insert_query = f"""INSERT INTO ORFOME(ID, NAME, SEQ, LENGTH, START, END, STRAND)
-                VALUES({i}, '{orf.name}', '{orf.seq}', {orf.__len__()}, {orf.start}, {orf.end}, '{orf.strand}')"""
-                i += 1
-                cursor.execute(insert_query)
-            conn.commit()
-            cursor.close()
-        except sqlite3.Error as error:
-            print("Failed to insert entries into db. Error: ", error)
+            for i, orf in enumerate(orfs, start=1):
+                if not failed:
+                    rows.append((i, orf.name, str(orf.seq), len(orf), orf.start, orf.end, orf.strand,
+                                 getattr(orf, 'contig', None), getattr(orf, 'frame', None),
+                                 getattr(orf, 'start_codon', None), orf.origin))
+                    if len(rows) >= self.batchSize:
+                        insert()
+                yield orf
+            if rows and not failed:
+                insert()
+            if not failed:
+                self.__create_indexes(conn)
         finally:
-            if conn:
-                conn.close()
+            conn.close()
+        if not failed:
+            self.loaded = True
+            LocusIndex(self.prefix).defer('orf')
 
     def retrieve(self):
         conn = self.__connect()
@@ -115,6 +204,14 @@ class SQLDatabase(object):
         rows = cursor.fetchall()
         return rows
 
+    def iter_rows(self):
+        """ Yields the rows of the database one at a time, instead of fetching them all. """
+        conn = self.__connect()
+        try:
+            yield from conn.execute("SELECT * FROM ORFOME")
+        finally:
+            conn.close()
+
 # seq = "ATGAGATGCGGC"
 # tr = translate(seq)
 # print(tr)
@@ -0,0 +1,73 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+# Cleavage rules of the MSGF+ enzyme IDs (-e): the residues cut and whether the cut is after (C-terminal) or before
+# (N-terminal) them. Unspecific cleavage (0) and no cleavage (9) have no rule.
+ENZYMES = {
+    1: ('KR', 'after'),     # Trypsin
+    2: ('FYWL', 'after'),   # Chymotrypsin
+    3: ('K', 'after'),      # Lys-C
+    4: ('K', 'before'),     # Lys-N
+    5: ('E', 'after'),      # glutamyl endopeptidase
+    6: ('R', 'after'),      # Arg-C
+    7: ('D', 'before'),     # Asp-N
+    8: ('TASV', 'after'),   # alphaLP
+}
+
+
+class Digester(object):
+    """ In silico digestion of proteins with the enzyme and peptide settings of the MSGF+ search (-e, -ntt,
+    -minLength, -maxLength and -maxMissedCleavages, with the same defaults). It only tells whether a protein yields
+    any peptide the search could match. Cleavage is never blocked by proline, and the protein N-terminus is a valid
+    peptide start with or without its methionine, so no protein MSGF+ could match is ever reported as unsearchable. """
+    def __init__(self, enzyme=1, ntt=2, min_length=6, max_length=40, max_missed_cleavages=-1):
+        self.rule = ENZYMES.get(int(enzyme))
+        self.ntt = int(ntt)
+        self.minLength = int(min_length)
+        self.maxLength = int(max_length)
+        self.maxMissed = int(max_missed_cleavages)
+
+    def __sites(self, seq):
+        """ :returns the positions between residues where the enzyme cuts a sequence. """
+        residues, side = self.rule
+        if side == 'after':
+            return [i + 1 for i, aa in enumerate(seq[:-1]) if aa in residues]
+        return [i for i, aa in enumerate(seq) if aa in residues and i > 0]
+
+    def searchable(self, seq):
+        """ Whether a protein sequence yields at least one peptide within the length and missed cleavage limits. """
+        seq = seq.rstrip('*')
+        if len(seq) < self.minLength:
+            return False
+        if self.rule is None or self.ntt < 2:
+            # any peptide only needs one specific terminus (or none), so its other end can be placed anywhere
+            return True
+        sites = self.__sites(seq)
+        ends = sites + [len(seq)]
+        starts = [(0, 0), (1, 0)] if seq[0] == 'M' else [(0, 0)]
+        starts += [(site, i + 1) for i, site in enumerate(sites)]
+        for start, first_end in starts:
+            # the ends are sites, except the last one, so each end passed is a missed cleavage of the next ones
+            ends_after = [end for end in ends[first_end:] if end > start]
+            for missed, end in enumerate(ends_after):
+                if 0 <= self.maxMissed < missed or end - start > self.maxLength:
+                    break
+                if end - start >= self.minLength:
+                    return True
+        return False
@@ -0,0 +1,219 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import mmap
+import os
+import sqlite3
+from collections import OrderedDict
+
+
+# Size of the write buffer used for the fasta files, in bytes
+FASTA_BUFFER = 1 << 22
+
+
+def _iter_entries(data):
+    """ :returns the header and the offsets of the sequence (from its first to its last line) of each entry of
+    a mapped fasta file. """
+    if data[:1] == b'>':
+        start = 0
+    else:
+        start = data.find(b'\n>') + 1
+        if not start:
+            return
+    size = len(data)
+    while start < size:
+        header_end = data.find(b'\n', start)
+        if header_end == -1:
+            header_end = size
+        end = data.find(b'\n>', header_end)
+        if end == -1:
+            end = size
+        yield data[start + 1: header_end].rstrip(), header_end + 1, end
+        start = end + 1
+
+
+def _clean(seq):
+    return seq.replace(b'\n', b'').replace(b'\r', b'').replace(b' ', b'')
+
+
+def iter_fasta(fasta, raw=False):
+    """ Streams the entries of a fasta file as (header, sequence) tuples, without the '>' and the line breaks. The file
+    is memory mapped and split on the headers, so no record objects are built. Anything before the first header is
+    skipped, as SeqIO does. With 'raw', both are returned as bytes instead of str. """
+    if not os.path.getsize(fasta):
+        return
+    with open(fasta, 'rb') as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for header, start, end in _iter_entries(data):
+            seq = _clean(data[start: end])
+            if raw:
+                yield header, seq
+            else:
+                yield header.decode(), seq.decode()
+
+
+def read_fasta(fasta):
+    """ :returns a dictionary with the sequences of a fasta file, keyed by their headers. """
+    return dict(iter_fasta(fasta))
+
+
+def entry_id(header):
+    """ :returns the ID of a fasta header, which is its first word (SeqRecord.id). """
+    return header.split(maxsplit=1)[0] if header.strip() else ''
+
+
+class FastaWriter(object):
+    """ Writes fasta entries through a large buffer, one unwrapped sequence line per entry. Use it as a context
+    manager. """
+    def __init__(self, fasta, mode='w', buffer_size=FASTA_BUFFER):
+        self.fasta = fasta
+        self.mode = mode
+        self.bufferSize = buffer_size
+        self.__handle = None
+
+    def __enter__(self):
+        self.__handle = open(self.fasta, self.mode, buffering=self.bufferSize)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__handle.close()
+
+    def write(self, header, seq):
+        self.__handle.write(f'>{header}\n{seq}\n')
+
+    def write_entries(self, entries):
+        """ Writes an iterable of (header, sequence) tuples. """
+        self.__handle.writelines(f'>{header}\n{seq}\n' for header, seq in entries)
+        return self
+
+
+def write_fasta(fasta, entries, mode='w'):
+    """ Writes an iterable of (header, sequence) tuples to a fasta file. """
+    with FastaWriter(fasta, mode=mode) as writer:
+        writer.write_entries(entries)
+
+
+class FastaIndex(object):
+    """ Offset index of a fasta file, so single entries can be read without loading the file. The byte offset and
+    length of the sequence of each entry are kept in a SQLite database next to the fasta file ('<fasta>.idx'), or in
+    the working directory if that one is not writable. The index is built the first time the fasta file is opened
+    (or after it changes) and reused by later runs and stages. Sequences are looked up by their whole header ('key'
+    is 'header') or by their ID, and the last 'cache_size' ones are kept in memory, so the memory used does not
+    depend on the size of the database. """
+    def __init__(self, fasta, key='id', cache_size=4096, directory=None):
+        self.fasta = fasta
+        if directory is None:
+            directory = os.path.dirname(os.path.abspath(fasta))
+            if not os.access(directory, os.W_OK):
+                directory = '.'
+        self.path = os.path.join(directory, f'{os.path.basename(fasta)}.idx')
+        self.key = 'HEADER' if key == 'header' else 'ID'
+        self.cacheSize = cache_size
+        self.__cache = OrderedDict()
+        if self.__outdated():
+            self.__build()
+        self.__conn = sqlite3.connect(self.path)
+        self.__file = open(self.fasta, 'rb')
+
+    def __source(self):
+        """ :returns what identifies the fasta file the index was built from. The inode tells apart files linked
+        from the database cache. """
+        stat = os.stat(self.fasta)
+        return f'{os.path.abspath(self.fasta)}\t{stat.st_size}\t{stat.st_mtime_ns}\t{stat.st_ino}'
+
+    def __outdated(self):
+        if not os.path.exists(self.path):
+            return True
+        conn = sqlite3.connect(self.path)
+        try:
+            source = conn.execute('SELECT SOURCE FROM META').fetchone()
+        except sqlite3.DatabaseError:
+            return True
+        finally:
+            conn.close()
+        return source is None or source[0] != self.__source()
+
+    def __build(self):
+        """ Indexes the fasta file in a temporary database first, so processes opening the index at the same time
+        never read an incomplete one. """
+        partial = f'{self.path}.{os.getpid()}.partial'
+        if os.path.exists(partial):
+            os.remove(partial)
+        conn = sqlite3.connect(partial)
+        try:
+            with conn:
+                conn.execute('PRAGMA synchronous=OFF')
+                conn.execute('CREATE TABLE META(SOURCE TEXT NOT NULL)')
+                conn.execute('INSERT INTO META(SOURCE) VALUES (?)', (self.__source(),))
+                conn.execute('''CREATE TABLE ENTRIES(HEADER TEXT NOT NULL,
+                                                ID     TEXT NOT NULL,
+                                                OFFSET INT  NOT NULL,
+                                                LENGTH INT  NOT NULL)''')
+                conn.executemany('INSERT INTO ENTRIES(HEADER, ID, OFFSET, LENGTH) VALUES (?, ?, ?, ?)',
+                                 self.__iter_offsets())
+                conn.execute('CREATE INDEX ENTRIES_HEADER ON ENTRIES(HEADER)')
+                conn.execute('CREATE INDEX ENTRIES_ID ON ENTRIES(ID)')
+        finally:
+            conn.close()
+        os.replace(partial, self.path)
+
+    def __iter_offsets(self):
+        if not os.path.getsize(self.fasta):
+            return
+        with open(self.fasta, 'rb') as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for header, start, end in _iter_entries(data):
+                header = header.decode()
+                yield header, entry_id(header), start, end - start
+
+    def close(self):
+        self.__conn.close()
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self.__conn.execute('SELECT COUNT(*) FROM ENTRIES').fetchone()[0]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        seq = self.get(key)
+        if seq is None:
+            raise KeyError(key)
+        return seq
+
+    def get(self, key, default=None):
+        """ :returns the sequence of the first entry with this header or ID, or 'default' if there is none. """
+        if key in self.__cache:
+            self.__cache.move_to_end(key)
+            return self.__cache[key]
+        row = self.__conn.execute(f'SELECT OFFSET, LENGTH FROM ENTRIES WHERE {self.key} = ? ORDER BY ROWID LIMIT 1',
+                                  (key,)).fetchone()
+        if row is None:
+            return default
+        self.__file.seek(row[0])
+        seq = _clean(self.__file.read(row[1])).decode()
+        self.__cache[key] = seq
+        if len(self.__cache) > self.cacheSize:
+            self.__cache.popitem(last=False)
+        return seq
@@ -18,14 +18,63 @@
 
 
 import sys
+from functools import partial
 
-from Bio import SeqIO
 import regex as re
 
-from .conversion.translate import Translator
+from .conversion.translate import Translator, FrameTranslation
 from .conversion import StrandConverter
 from .orflib import ORF, ORFCollection
-from .__helpers import FormatError
+from .scanning import StopCodonScanner
+from .genomestore import GenomeStore
+from .__helpers import FormatError, ScanEngineError
+
+
+# Number of nucleotides of a sequence scanned at a time
+SCAN_WINDOW = 3 << 20
+
+# Number of windows sent to the worker processes at a time, per worker
+WINDOWS_PER_WORKER = 8
+
+
+def _windows(length, window):
+    """ :returns the offsets of the windows a sequence is scanned in. """
+    return range(0, length, window)
+
+
+def _scan_window(scanner, seqtype, window, overlap, task):
+    """ Scans a window of a sequence and returns the starts, ends and proteins (None if seqtype is 'cds') of the ORFs
+    starting in it. The window is read with 'overlap' extra nucleotides, which must be enough to hold the longest ORF,
+    so ORFs starting near its end are found whole, while those starting in the overlap are left to the next window.
+    It is kept at module level so it can be sent to the worker processes of parse_frames, along with views of a
+    GenomeStore, which are only read into memory here. """
+    sequence, offset = task
+    chunk = str(sequence[offset: offset + window + overlap])
+    starts, ends = scanner.scan(chunk)
+    core = starts < window
+    starts, ends = starts[core], ends[core]
+    if len(starts) and (seqtype == "aa" or seqtype == "both"):
+        translation = FrameTranslation(chunk)
+        proteins = [translation.protein(start, end) for start, end in zip(starts.tolist(), ends.tolist())]
+    else:
+        proteins = [None] * len(starts)
+    return (starts + offset).tolist(), (ends + offset).tolist(), proteins
+
+
+def _bounded_map(executor, function, items, chunksize, workers):
+    """ Same as executor.map, but only submits a batch of items at a time, and the next one while the results of the
+    current batch are consumed, so the results waiting to be consumed never exceed two batches. 'workers' is the number
+    of worker processes of the executor. """
+    batch_size = workers * WINDOWS_PER_WORKER * chunksize
+    batches = iter(lambda: [item for _, item in zip(range(batch_size), items)], [])
+    pending = None
+    for batch in batches:
+        submitted = executor.map(function, batch, chunksize=chunksize)
+        if pending is not None:
+            yield from pending
+        pending = submitted
+    if pending is not None:
+        yield from pending
 
 
 class FrameTranslator(object):
@@ -39,48 +88,63 @@ class FrameTranslator(object):
 
     def read_genome(self):
         if self.format == 'fasta':
-            records = SeqIO.parse(self.sequence, 'fasta')
-            entries = []
-            seqs = []
-            for record in records:
-                entries.append(record.id)
-                seqs.append(record.seq)
-            return seqs, entries
+            # views of the memory-mapped sequences, which are only read while they are scanned
+            store = GenomeStore(self.sequence)
+            return [store[contig] for contig in store], list(store.contigs)
         elif self.format == 'list':
             return self.sequence
         else:
             raise FormatError
 
-    def parse_frames(self, starts=['ATG'], stops=['TGA', 'TAA', 'TAG'], seqtype='both', **kwargs):
+    def parse_frames(self, starts=['ATG'], stops=['TGA', 'TAA', 'TAG'], seqtype='both', engine='stops', executor=None,
+                     workers=1, **kwargs):
         """ Specify a list of start and stop codons. By default, only 'ATG' is included as a start. TGA, TAA and TAG
          are the default stop codons.'seqtype' accepts 'aa', 'cds', or 'both'. It changes which type of sequence the
-         function adds to the 'ORF' object. To save memory, you may exclude one of them. """
+         function adds to the 'ORF' object. To save memory, you may exclude one of them. 'engine' selects how the ORFs
+         are found: 'stops' pairs each start codon with the next in-frame stop codon, while 'regex' uses the former
+         overlapped regular expression. Both return the same ORFs. With the 'stops' engine, an 'executor' from
+         concurrent.futures may be given to scan the sequences in parallel, along with its number of 'workers'; ORFs are
+         numbered as in a serial run. 'window' sets how many nucleotides are scanned at a time (see iter_orfs). """
+        self.__add_orfs(self.iter_orfs(starts=starts, stops=stops, seqtype=seqtype, engine=engine, executor=executor,
+                                       workers=workers, **kwargs))
+        # returns a instance of the iterator class 'ORFCollection'
+        return ORFCollection().add_orfs(self.orfs)
+
+    def iter_orfs(self, starts=['ATG'], stops=['TGA', 'TAA', 'TAG'], seqtype='both', engine='stops', executor=None,
+                  workers=1, window=SCAN_WINDOW, **kwargs):
+        """ Yields the same ORFs as parse_frames, one at a time, without keeping them in this instance. Use it to
+        stream the ORFs into a database or fasta file with constant memory. Sequences are scanned in windows of
+        'window' nucleotides, overlapped by the longest ORF allowed, so memory does not depend on the contig size. """
         sequences = self.seqsToTranslate
-        # defines pattern for regex
-        start_pattern = self.__get_pattern(starts, codon_type="start")
-        stop_pattern = self.__get_pattern(stops, codon_type="stop")
+        if engine == 'stops':
+            finder = StopCodonScanner(starts, stops, minsize=self.minSize, maxsize=self.maxsize)
+        elif engine == 'regex':
+            # defines pattern for regex
+            start_pattern = self.__get_pattern(starts, codon_type="start")
+            stop_pattern = self.__get_pattern(stops, codon_type="stop")
+            finder = (start_pattern, stop_pattern)
+        else:
+            raise ScanEngineError
 
         if kwargs.get("entry") == "full" and self.form == "fasta":
             entries = self.entries
         else:
             entries = ["" for i in range(len(sequences))]
 
-
-        # retrieves a list of instances of the ORF class
-        forward_orfs = self.__get_cds(sequences, 'forward', start_pattern, stop_pattern, seqtype, entries)
-        # adds the orfs to the self.orfs attribute
-        self.__add_orfs(forward_orfs)
+        self.__window = window
+        self.__workers = workers
+        # yields instances of the ORF class
+        yield from self.__find_orfs(finder, sequences, 'forward', seqtype, entries, executor)
 
         # does the same for the complementar strand
         if self.frames == 6:
             # generates a complement to the sequence and reverses it
-            reverse_sequences = StrandConverter(sequences)
-            rev = reverse_sequences.complement().reverse()
+            if self.form == 'fasta':
+                rev = [sequence.reverse_complement() for sequence in sequences]
+            else:
+                rev = StrandConverter(sequences).complement().reverse()
 
-            reverse_orfs = self.__get_cds(rev, 'reverse', start_pattern, stop_pattern, seqtype, entries)
-            self.__add_orfs(reverse_orfs)
-        # returns a instance of the iterator class 'ORFCollection'
-        return ORFCollection().add_orfs(self.orfs)
+            yield from self.__find_orfs(finder, rev, 'reverse', seqtype, entries, executor)
 
     def __add_orfs(self, orf_list):
         """ Appends all ORFs in a list to the 'orfs' attribute of this class' instance. """
@@ -105,29 +169,95 @@ class FrameTranslator(object):
                     pattern += f"({codons[i]})"
         return pattern
 
+    def __find_orfs(self, finder, sequences, strand, seqtype, entries, executor=None):
+        """ Dispatches the search to the engine selected in parse_frames. """
+        if isinstance(finder, StopCodonScanner):
+            return self.__scan_cds(sequences, strand, finder, seqtype, entries, executor)
+        start_pattern, stop_pattern = finder
+        return self.__get_cds(sequences, strand, start_pattern, stop_pattern, seqtype, entries)
+
+    def __overlap(self):
+        """ :returns the overlap between windows, which holds the longest ORF allowed and its stop codon. """
+        return int(self.maxsize) + 3
+
+    def __scan_cds(self, sequences, strand, scanner, seqtype, entries, executor=None):
+        """ Yields all possible CDS for the three frames of a nucleotide sequence, using the stop codons of each
+        frame as anchors. The size limits are already applied by the scanner. """
+        orf_number = 0
+        window = self.__window
+        tasks = [(seq, offset) for seq in range(len(sequences)) for offset in _windows(len(sequences[seq]), window)]
+        scan = partial(_scan_window, scanner, seqtype, window, self.__overlap())
+        windows = ((sequences[seq], offset) for seq, offset in tasks)
+        if executor is None:
+            scanned = map(scan, windows)
+        else:
+            workers = max(1, self.__workers)
+            chunksize = max(1, len(tasks) // (workers * 4 * WINDOWS_PER_WORKER))
+            scanned = _bounded_map(executor, scan, windows, chunksize, workers)
+        # results come back in the order of the windows, so the numbering is the same as in a serial run
+        for (seq, _), (starts, ends, proteins) in zip(tasks, scanned):
+            sequence = sequences[seq]
+            seq_len = len(sequence)
+            for start, end, protein in zip(starts, ends, proteins):
+                orf = sequence[start:end]
+                frame = self.__get_frame(start, strand)
+                if strand == "reverse":
+                    start, end = seq_len - start - 1, seq_len - end + 1
+                orf_number += 1
+                orf_i = self.__check_seqtype(seqtype=seqtype, start=start+1, end=end,
+                                             orf_number=f'{entries[seq]}_{orf_number}', strand=strand, cds=orf,
+                                             chromosome=seq+1, protein=protein, frame=frame,
+                                             contig=self.entries[seq])
+                if orf_i is not None:
+                    yield orf_i
+
     def __get_cds(self, sequences, strand, start_pattern, stop_pattern, seqtype, entries):
-        """ Returns all possible CDS for the three frames of a nucleotide sequence. """
-        orfs = []
+        """ Yields all possible CDS for the three frames of a nucleotide sequence. """
         orf_number = 0
+        pattern = re.compile('(%s)(...)+?(%s)' % (start_pattern, stop_pattern))
+        window = self.__window
         for seq in range(len(sequences)):
-            aa = re.finditer('(%s)(...)+?(%s)' % (start_pattern, stop_pattern), "%s" % sequences[seq], overlapped=True)
-            for a in aa:
-                orf = a.group()
-                start = a.start()
-                end = a.end()
-                if strand == "reverse":
-                    start = len(sequences[seq]) - start - 1
-                    end = len(sequences[seq]) - end + 1
-                if self.__within_limits(orf) and "*" not in orf:
+            seq_len = len(sequences[seq])
+            for offset in _windows(seq_len, window):
+                chunk = str(sequences[seq][offset: offset + window + self.__overlap()])
+                translation = self.__translate_frames(chunk, seqtype)
+                for a in pattern.finditer(chunk, overlapped=True):
+                    # the ORFs starting in the overlap are left to the next window
+                    if a.start() >= window:
+                        break
+                    orf = a.group()
+                    if not self.__within_limits(orf) or "*" in orf:
+                        continue
+                    protein = translation.protein(a.start(), a.end()) if translation is not None else None
+                    start = a.start() + offset
+                    end = a.end() + offset
+                    frame = self.__get_frame(start, strand)
+                    if strand == "reverse":
+                        start = seq_len - start - 1
+                        end = seq_len - end + 1
                     orf_number += 1
-                    # orf_i = self.__check_seqtype(seqtype=seqtype, start=start+1, end=end, orf_number=orf_number,
-                    #                              strand=strand, cds=orf, chromosome=seq+1)
-                    orf_i = self.__check_seqtype(seqtype=seqtype, start=start+1, end=end, orf_number=f'{entries[seq]}_{orf_number}',
-                                                 strand=strand, cds=orf, chromosome=seq+1)
+                    orf_i = self.__check_seqtype(seqtype=seqtype, start=start+1, end=end,
+                                                 orf_number=f'{entries[seq]}_{orf_number}', strand=strand, cds=orf,
+                                                 chromosome=seq+1, protein=protein, frame=frame,
+                                                 contig=self.entries[seq])
                     if orf_i is not None:
-                        orfs.append(orf_i)
+                        yield orf_i
 
-        return orfs
+    @staticmethod
+    def __get_frame(start, strand):
+        """ Returns the reading frame of an ORF from its 0-based start in the translated sequence: 1 to 3 on the
+        forward strand and -1 to -3 on the reverse strand. """
+        frame = start % 3 + 1
+        if strand == "reverse":
+            frame = -frame
+        return frame
+
+    @staticmethod
+    def __translate_frames(sequence, seqtype):
+        """ Translates the three frames of a sequence once, if proteins are needed. It is only kept while the ORFs of
+        this sequence are built, so memory does not grow with the number of contigs. """
+        if seqtype == "aa" or seqtype == "both":
+            return FrameTranslation(sequence)
 
     def __check_seqtype(self, seqtype, **kwargs):
         """ Check which type of sequence should be added to the 'ORF' object. """
@@ -153,21 +283,17 @@ class FrameTranslator(object):
         if seqtype == "cds" or seqtype == "both":
             cds = kwargs.get("cds")
         if seqtype == "aa" or seqtype == "both":
-            aa = Translator(orf)
-            protein = aa.translate()
+            protein = kwargs.get("protein")
+            if protein is None:
+                aa = Translator(orf)
+                protein = aa.translate()
         if "*" not in protein:
             orf_i = ORF(name=f'ORF_{orf_number}', start=start, end=end, cds=cds, seq=protein,
-                        strand=strand, chromosome=chromosome, transcript=transcript, origin=origin)
+                        strand=strand, chromosome=chromosome, transcript=transcript, origin=origin,
+                        contig=kwargs.get('contig'), frame=kwargs.get('frame'))
+            orf_i.start_codon = orf[:3]
             return orf_i
 
-    def __adapt_coordinates(self, start, end, strand):
-        """ Fixes start and end region of the ORF in the sequence, related to its current strand. """
-        if strand == "forward":
-            return start, end
-        elif strand == "reverse":
-            pass
-
-
     def __within_limits(self, orf):
         """ Checks if the predicted ORF is within the size constraints specified by 'minsize' and 'maxsize'. """
         if self.minSize <= len(orf) <= self.maxsize:
@@ -200,16 +326,3 @@ class TranscriptomeTranslator(FrameTranslator):
         self.sequence = sequence
         super().__init__(self.sequence, form, self.frames, minsize=minsize, maxsize=maxsize)
         self.seqsToTranslate, self.entries = self.read_genome()
-
-
-
-# seq = ["ATGTGCTGATGCATGATGCTATAAGGCCAT", 'ATGTTTTAGTTT']
-#
-# rna = TranscriptomeTranslator(sequence='mtb_genome.fasta', form='fasta', minsize=30, maxsize=300)
-# orfs = rna.parse_frames(starts=['ATG', 'TGT'], stops=['TGA', 'TAA', 'TAG'], seqtype='aa')
-# #
-# # dna = GenomeTranslator(sequence='mtb_genome.fasta', form='fasta', minsize=30, maxsize=300)
-# # d_orfs = dna.parse_frames(starts=['ATG', 'TGT'], stops=['TGA', 'TAA', 'TAG'], seqtype='aa')
-#
-# for orf in orfs:
-#     print(orf.name, orf.seq, orf.origin, orf.transcript)
\ No newline at end of file
@@ -0,0 +1,220 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import hashlib
+import mmap
+import os
+
+from .__helpers import ContigError
+
+
+_COMPLEMENT = bytes.maketrans(b'ACGTNRYKMSWBDHV', b'TGCANYRMKSWVHDB')
+
+
+class GenomeStore(object):
+    """ Memory-mapped store of the sequences of a multi-contig fasta file. The sequences are kept as raw, uppercase
+    bytes in '<fasta>.<hash>.store', next to an index with the name, offset and length of each contig
+    ('<fasta>.<hash>.store.idx'), where the hash is that of the path of the fasta file. They are kept in the working
+    directory, which is the output directory of every mode, or in another 'directory', never next to the fasta file,
+    which may be read-only or shared. Contigs are named after the first word of their header, which must be unique.
+    Both are built the first time the fasta file is opened (or after it changes) and reused by every later stage, so
+    slicing a contig never reads more than the slice. Instances and their views can be sent to worker processes: each
+    one maps the same file again instead of receiving a copy of the sequences. """
+    def __init__(self, fasta, directory=None):
+        self.fasta = fasta
+        digest = hashlib.sha256(os.path.abspath(fasta).encode()).hexdigest()[:12]
+        self.path = os.path.abspath(os.path.join(directory or '.', f'{os.path.basename(fasta)}.{digest}.store'))
+        self.indexPath = f'{self.path}.idx'
+        if self.__outdated():
+            self.__build()
+        self.__open()
+
+    def __source(self):
+        """ :returns the header of the index, which identifies the fasta file the store was built from. """
+        stat = os.stat(self.fasta)
+        return f'#{os.path.abspath(self.fasta)}\t{stat.st_size}\t{stat.st_mtime_ns}\n'
+
+    def __outdated(self):
+        if not os.path.exists(self.path) or not os.path.exists(self.indexPath):
+            return True
+        with open(self.indexPath) as idx:
+            return idx.readline() != self.__source()
+
+    def __build(self):
+        """ Writes the store and its index from the fasta file, one line at a time. Both are written to temporary
+        files first, so processes opening the store at the same time never read an incomplete one. """
+        index = [self.__source()]
+        names = set()
+        name, offset, length = None, 0, 0
+        partial = f'{self.path}.{os.getpid()}.partial'
+        with open(self.fasta, 'rb') as fasta, open(partial, 'wb') as store:
+            for line in fasta:
+                if line.startswith(b'>'):
+                    if name is not None:
+                        index.append(f'{name}\t{offset}\t{length}\n')
+                    name = line[1:].split()[0].decode() if line[1:].split() else ''
+                    if name in names:
+                        store.close()
+                        os.remove(partial)
+                        raise ContigError(f'{self.fasta} has more than one sequence named "{name}". Please give each '
+                                          f'sequence a unique name.')
+                    names.add(name)
+                    offset += length
+                    length = 0
+                    continue
+                seq = line.strip().upper()
+                store.write(seq)
+                length += len(seq)
+            if name is not None:
+                index.append(f'{name}\t{offset}\t{length}\n')
+        with open(f'{partial}.idx', 'w') as idx:
+            idx.writelines(index)
+        os.replace(partial, self.path)
+        os.replace(f'{partial}.idx', self.indexPath)
+
+    def __open(self):
+        self.contigs = []
+        self.__offsets = {}
+        with open(self.indexPath) as idx:
+            idx.readline()
+            for line in idx:
+                name, offset, length = line.rstrip('\n').split('\t')
+                self.contigs.append(name)
+                self.__offsets[name] = (int(offset), int(length))
+        self.__file = open(self.path, 'rb')
+        # an empty file can't be mapped
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self.path) else b''
+
+    def __getstate__(self):
+        # the store is built by then, so the unpickled instance only has to map it
+        return {'fasta': self.fasta, 'path': self.path, 'indexPath': self.indexPath}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__open()
+
+    def close(self):
+        if isinstance(self.__map, mmap.mmap):
+            self.__map.close()
+        self.__file.close()
+
+    def __len__(self):
+        return len(self.contigs)
+
+    def __iter__(self):
+        return iter(self.contigs)
+
+    def __contains__(self, contig):
+        return contig in self.__offsets
+
+    def __getitem__(self, contig):
+        """ :returns a ContigView of a contig, by name or by its position in the fasta file. """
+        if isinstance(contig, int):
+            contig = self.contigs[contig]
+        return ContigView(self, contig)
+
+    def _locate(self, contig):
+        """ :returns the mapped buffer and the offset and length of a contig in it. """
+        offset, length = self.__offsets[contig]
+        return self.__map, offset, length
+
+    def length(self, contig):
+        return self.__offsets[contig][1]
+
+    def fetch(self, contig, start, end, strand='forward'):
+        """ :returns the sequence between 0-based 'start' and 'end' (exclusive) of the forward strand of a contig, or
+        its reverse complement if 'strand' is 'reverse'. """
+        view = self[contig]
+        if strand == 'reverse':
+            return reverse_complement(view[start:end])
+        return view[start:end]
+
+
+class ContigView(object):
+    """ Read-only view of a contig in a GenomeStore. Slicing it returns a str, as slicing the sequence would. """
+    def __init__(self, store, contig):
+        self.store = store
+        self.contig = contig
+        self.__buffer, self.__offset, self.__length = store._locate(contig)
+
+    def __getstate__(self):
+        return {'store': self.store, 'contig': self.contig}
+
+    def __setstate__(self, state):
+        self.__init__(state['store'], state['contig'])
+
+    def __len__(self):
+        return self.__length
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self.__length)
+            if step != 1:
+                return self[start:stop][::step] if step > 0 else self[stop + 1:start + 1][::-1][::-step]
+            if stop <= start:
+                return ''
+            return self.__buffer[self.__offset + start: self.__offset + stop].decode()
+        if item < 0:
+            item += self.__length
+        if not 0 <= item < self.__length:
+            raise IndexError('contig index out of range')
+        return chr(self.__buffer[self.__offset + item])
+
+    def __str__(self):
+        return self[:]
+
+    def reverse_complement(self):
+        """ :returns a view of the reverse strand, indexed from its own 5' end. """
+        return ReverseComplementView(self)
+
+
+class ReverseComplementView(object):
+    """ Reverse complement of a ContigView, computed only for the slices taken from it. """
+    def __init__(self, forward):
+        self.__forward = forward
+
+    def __getstate__(self):
+        return {'forward': self.__forward}
+
+    def __setstate__(self, state):
+        self.__init__(state['forward'])
+
+    def __len__(self):
+        return len(self.__forward)
+
+    def __getitem__(self, item):
+        length = len(self.__forward)
+        if isinstance(item, slice):
+            start, stop, step = item.indices(length)
+            if step != 1:
+                return self[start:stop][::step] if step > 0 else self[stop + 1:start + 1][::-1][::-step]
+            if stop <= start:
+                return ''
+            return reverse_complement(self.__forward[length - stop: length - start])
+        if item < 0:
+            item += length
+        return reverse_complement(self.__forward[length - item - 1])
+
+    def __str__(self):
+        return self[:]
+
+
+def reverse_complement(seq):
+    """ :returns the reverse complement of a nucleotide sequence, keeping IUPAC ambiguity codes. """
+    return seq.encode().translate(_COMPLEMENT)[::-1].decode()
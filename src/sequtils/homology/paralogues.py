@@ -18,7 +18,8 @@
 
 
 import pandas as pd
-from Bio import SeqIO
+
+from ..fasta import iter_fasta, FastaWriter, FastaIndex
 
 class Paralogues(object):
     def __init__(self, utp_all_df):
@@ -80,13 +81,11 @@ class Paralogues(object):
 
                 if par not in entries:
                     entries.append(par)
-        records = SeqIO.parse(fasta_db, 'fasta')
-        fasta = []
-        for record in records:
-            if record.id in entries:
-                fasta.append(f'>{record.id}\n{record.seq}\n')
-        with open(f'{output}.fasta', 'w') as fa:
-            fa.writelines(fasta)
+        with FastaIndex(fasta_db) as index, FastaWriter(f'{output}.fasta') as fa:
+            for entry in entries:
+                seq = index.get(entry)
+                if seq is not None:
+                    fa.write(entry, seq)
         return self
 
 
@@ -100,14 +99,10 @@ class ParalogousBySubset(object):
         self.__get_records()
 
     def __get_records(self):
-        records = SeqIO.parse(self.tPar, 'fasta')
-        for record in records:
-            if str(record.seq) not in self.paralogous:
-                self.paralogous.append(str(record.seq))
-        records = SeqIO.parse(self.gPar, 'fasta')
-        for record in records:
-            if str(record.seq) not in self.paralogous:
-                self.paralogous.append(str(record.seq))
+        for fasta in [self.tPar, self.gPar]:
+            for _, seq in iter_fasta(fasta):
+                if seq not in self.paralogous:
+                    self.paralogous.append(seq)
 
     def filter_paralogous(self, output):
         df = self.df[self.df["ORF Sequence"].isin(self.paralogous)]
@@ -211,26 +211,56 @@ def findnth(string, substring, n):
 
 class GenomeCoordinates(object):
     """ For genome ORFs """
-    def __init__(self, psm_table, ref_dict=None):
-        """ ref_dict is returned by get_dict() method from RefSeqGFF class. """
+    def __init__(self, psm_table, ref_dict=None, loci=None):
+        """ ref_dict is returned by get_dict() method from RefSeqGFF class. 'loci' is the LocusIndex of the ORF
+        database, where the ORFs and the annotated proteins (by the Name of their GFF feature) are looked up. Without
+        it, or for entries that are not in it, the coordinates are read from the entries. """
         self.psm = pd.read_csv(psm_table, sep='\t')
         self.ids = self.psm["proteinIds"].tolist()
-        self.refSeqDict = ref_dict
+        self.refSeqDict = ref_dict if ref_dict is not None else {}
+        self.loci = loci
         self.coordinates = []
 
+    @staticmethod
+    def __orf_key(entry):
+        """ :returns the name and strand of the ORF of a fasta entry ('gORF_chr_1_1-30_forward'), as in LocusIndex. """
+        name, _, strand = entry[1:].rsplit('_', 2)
+        return name, {'forward': '+', 'reverse': '-'}.get(strand, '.')
+
+    def __find_loci(self):
+        """ :returns the loci of the ORFs of the table, keyed by their name and strand, and those of the annotated
+        proteins, keyed by their entry. Only names matching a single locus are kept. """
+        if self.loci is None:
+            return {}, {}
+        proteins = {protein for ids in self.ids for protein in ids.split(",")}
+        entries = [protein for protein in proteins if 'gORF' in protein and protein.count('_') >= 3]
+        orfs = {}
+        for name, loci in self.loci.find({self.__orf_key(entry)[0] for entry in entries}, source='orf').items():
+            for locus in loci:
+                orfs.setdefault((name, locus.strand), []).append(locus)
+        annotated = self.loci.find({protein[:-len('_ANNO')] for protein in proteins if protein.endswith('_ANNO')},
+                                   source='annotation')
+        return ({key: loci[0] for key, loci in orfs.items() if len(loci) == 1},
+                {f'{name}_ANNO': loci[0] for name, loci in annotated.items() if len(loci) == 1})
+
     def get_coords(self):
+        orfs, annotated = self.__find_loci()
         for i in range(len(self.ids)):
             proteins = self.ids[i].split(",")
             coord_set = ""
             for protein in proteins:
                 if 'gORF' in protein:
-                    # pos1 = protein.find("_") + 1
-                    # print(protein)
-                    pos1 = findnth(protein, '_', 2) + 1
-                    pos2 = protein.rfind("_")
-                    coords = protein[pos1:pos2].split("-")
-                    start_c = coords[0]
-                    end_c = coords[1]
+                    locus = orfs.get(self.__orf_key(protein)) if protein.count('_') >= 3 else None
+                    if locus is not None:
+                        start_c = locus.start
+                        end_c = locus.end
+                    else:
+                        # entries that are not in the ORF database, i.e. decoys
+                        pos1 = findnth(protein, '_', 2) + 1
+                        pos2 = protein.rfind("_")
+                        coords = protein[pos1:pos2].split("-")
+                        start_c = coords[0]
+                        end_c = coords[1]
                     if int(start_c) > int(end_c):
                         start = end_c
                         end = start_c
@@ -243,8 +273,8 @@ class GenomeCoordinates(object):
                     else:
                         coord_set += coords
                 else:
-                    if protein in self.refSeqDict:
-                        orf = self.refSeqDict[protein]
+                    if protein in self.refSeqDict or protein in annotated:
+                        orf = self.refSeqDict.get(protein, annotated.get(protein))
                         start = orf.start
                         end = orf.end
                         coords = f'{start}-{end}'
@@ -0,0 +1,284 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import sqlite3
+from collections import namedtuple
+
+import pandas as pd
+
+
+Locus = namedtuple('Locus', ['name', 'contig', 'strand', 'start', 'end', 'source', 'feature'])
+
+# Strands are stored as '+', '-' or '.', whatever notation the ORFs or the GFF use
+_STRANDS = {'forward': '+', '+': '+', 'reverse': '-', '-': '-'}
+_STRAND_GROUPS = {'+': 0, '-': 1, '.': 2}
+
+# Number of names looked up per query, below the SQLite limit of variables
+QUERY_SIZE = 900
+
+
+class LocusIndex(object):
+    """ Interval index over the genomic coordinates of predicted ORFs and annotated features, kept as an SQLite R-tree
+    inside the ORF database ('name'.db). Each locus is indexed by its position and by a group formed from its contig
+    and strand, so overlap queries only visit the entries of the same contig (and strand, if given). The stages that
+    write the ORFs or read the GFF only defer() their loci, which are indexed by the first query of their source, so
+    runs that never query the index do not pay for it. """
+    def __init__(self, name="genome"):
+        self.name = f'{name}.db'
+        self.__create_tables()
+
+    def __connect(self):
+        conn = sqlite3.connect(self.name)
+        return conn
+
+    def __create_tables(self):
+        conn = self.__connect()
+        try:
+            with conn:
+                conn.execute('''CREATE TABLE IF NOT EXISTS LOCUS_CONTIGS(ID   INTEGER PRIMARY KEY,
+                                                                         NAME TEXT UNIQUE NOT NULL);''')
+                conn.execute('''CREATE TABLE IF NOT EXISTS LOCI(ID      INTEGER PRIMARY KEY,
+                                                                NAME    TEXT    NOT NULL,
+                                                                CONTIG  TEXT    NOT NULL,
+                                                                STRAND  TEXT    NOT NULL,
+                                                                START   INT     NOT NULL,
+                                                                END     INT     NOT NULL,
+                                                                SOURCE  TEXT    NOT NULL,
+                                                                FEATURE TEXT);''')
+                conn.execute('CREATE INDEX IF NOT EXISTS LOCI_NAME ON LOCI(NAME)')
+                conn.execute('''CREATE TABLE IF NOT EXISTS LOCUS_SOURCES(SOURCE  TEXT PRIMARY KEY,
+                                                                         GFF     TEXT,
+                                                                         INDEXED INT  NOT NULL);''')
+                conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS LOCI_RTREE USING rtree_i32(ID, MIN_POS, MAX_POS,
+                                                                                            MIN_GROUP, MAX_GROUP);''')
+        finally:
+            conn.close()
+        return self
+
+    def reset(self, source=None):
+        """ Removes every locus from the index, or only those from 'source' ('orf' or 'annotation'). """
+        conn = self.__connect()
+        try:
+            with conn:
+                if source is None:
+                    conn.execute('DELETE FROM LOCI_RTREE')
+                    conn.execute('DELETE FROM LOCI')
+                else:
+                    conn.execute('DELETE FROM LOCI_RTREE WHERE ID IN (SELECT ID FROM LOCI WHERE SOURCE = ?)',
+                                 (source,))
+                    conn.execute('DELETE FROM LOCI WHERE SOURCE = ?', (source,))
+        finally:
+            conn.close()
+        return self
+
+    def defer(self, source, gff=None):
+        """ Marks the loci from 'source' as outdated, so they are indexed again by the next query instead of now: the
+        ORFs of the ORFOME table for 'orf', or the features of 'gff' for 'annotation'. """
+        conn = self.__connect()
+        try:
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO LOCUS_SOURCES(SOURCE, GFF, INDEXED) VALUES(?, ?, 0)',
+                             (source, os.path.abspath(gff) if gff is not None else None))
+        finally:
+            conn.close()
+        return self
+
+    def __index_deferred(self, source=None):
+        """ Indexes the loci of the sources marked as outdated by defer(), or only those of 'source'. """
+        conn = self.__connect()
+        try:
+            if source is None:
+                deferred = conn.execute('SELECT SOURCE, GFF FROM LOCUS_SOURCES WHERE INDEXED = 0').fetchall()
+            else:
+                deferred = conn.execute('SELECT SOURCE, GFF FROM LOCUS_SOURCES WHERE INDEXED = 0 AND SOURCE = ?',
+                                        (source,)).fetchall()
+        finally:
+            conn.close()
+        for outdated, gff in deferred:
+            self.reset(source=outdated)
+            if outdated == 'orf':
+                self.add_orfome()
+            else:
+                self.add_gff(gff)
+            conn = self.__connect()
+            try:
+                with conn:
+                    conn.execute('UPDATE LOCUS_SOURCES SET INDEXED = 1 WHERE SOURCE = ?', (outdated,))
+            finally:
+                conn.close()
+        return self
+
+    @staticmethod
+    def __strand(strand):
+        return _STRANDS.get(strand, '.')
+
+    def __add_loci(self, rows):
+        """ Inserts (name, contig, strand, start, end, source, feature) rows and indexes them. """
+        conn = self.__connect()
+        try:
+            with conn:
+                conn.execute('CREATE TEMP TABLE NEW_LOCI AS SELECT * FROM LOCI WHERE 0')
+                conn.executemany('INSERT INTO NEW_LOCI(NAME, CONTIG, STRAND, START, END, SOURCE, FEATURE) '
+                                 'VALUES(?, ?, ?, ?, ?, ?, ?)', rows)
+                self.__index_new_loci(conn)
+        finally:
+            conn.close()
+        return self
+
+    @staticmethod
+    def __index_new_loci(conn):
+        """ Moves the entries of the temporary NEW_LOCI table into LOCI and the R-tree. """
+        conn.execute('INSERT OR IGNORE INTO LOCUS_CONTIGS(NAME) SELECT DISTINCT CONTIG FROM NEW_LOCI')
+        first = conn.execute('SELECT COALESCE(MAX(ID), 0) FROM LOCI').fetchone()[0]
+        conn.execute('INSERT INTO LOCI(NAME, CONTIG, STRAND, START, END, SOURCE, FEATURE) '
+                     'SELECT NAME, CONTIG, STRAND, START, END, SOURCE, FEATURE FROM NEW_LOCI ORDER BY ROWID')
+        conn.execute('''INSERT INTO LOCI_RTREE
+                         SELECT LOCI.ID, MIN(START, END), MAX(START, END),
+                                LOCUS_CONTIGS.ID * 4 + CASE STRAND WHEN '+' THEN 0 WHEN '-' THEN 1 ELSE 2 END,
+                                LOCUS_CONTIGS.ID * 4 + CASE STRAND WHEN '+' THEN 0 WHEN '-' THEN 1 ELSE 2 END
+                         FROM LOCI JOIN LOCUS_CONTIGS ON LOCI.CONTIG = LOCUS_CONTIGS.NAME
+                         WHERE LOCI.ID > ?''', (first,))
+        conn.execute('DROP TABLE NEW_LOCI')
+
+    def add_orfs(self, orfs, source='orf'):
+        """ Indexes ORF objects by their 'contig', 'strand', 'start' and 'end' attributes. """
+        rows = ((orf.name, orf.contig, self.__strand(orf.strand), int(orf.start), int(orf.end), source, None)
+                for orf in orfs)
+        return self.__add_loci(rows)
+
+    def add_orfome(self):
+        """ Indexes the ORFs stored in the ORFOME table of the same database by SQLDatabase. """
+        conn = self.__connect()
+        try:
+            with conn:
+                conn.execute('CREATE TEMP TABLE NEW_LOCI AS SELECT * FROM LOCI WHERE 0')
+                conn.execute('''INSERT INTO NEW_LOCI(NAME, CONTIG, STRAND, START, END, SOURCE)
+                                SELECT NAME, COALESCE(CONTIG, ''),
+                                       CASE STRAND WHEN 'forward' THEN '+' WHEN 'reverse' THEN '-' ELSE '.' END,
+                                       START, END, 'orf'
+                                FROM ORFOME ORDER BY ID''')
+                self.__index_new_loci(conn)
+        finally:
+            conn.close()
+        return self
+
+    def add_gff(self, gff, sources=('RefSeq', 'ena'), features=None):
+        """ Indexes the features of a GFF file coming from 'sources', as RefSeqGFF does. 'features' may restrict the
+        feature types, i.e. ('CDS',). Features are named after their Name attribute, or their ID if it is absent. """
+        df = pd.read_csv(gff, sep='\t', comment='#', header=None, dtype={0: str})
+        df = df.iloc[:, :9]
+        df.columns = ['seqname', 'source', 'feature', 'start', 'end', 'score', 'strand', 'frame', 'attributes']
+        df = df[df["source"].isin(sources)]
+        if features is not None:
+            df = df[df["feature"].isin(features)]
+        names = df["attributes"].str.extract(r'(?:^|;)Name=([^;]+)')[0]
+        ids = df["attributes"].str.extract(r'(?:^|;)ID=([^;]+)')[0]
+        names = names.fillna(ids).fillna('')
+        rows = zip(names.tolist(), df["seqname"].tolist(), df["strand"].map(self.__strand).tolist(),
+                   df["start"].astype(int).tolist(), df["end"].astype(int).tolist(), ['annotation'] * len(df),
+                   df["feature"].tolist())
+        return self.__add_loci(rows)
+
+    def __groups(self, conn, contig, strand):
+        """ Returns the (min, max) group of a contig, restricted to a strand if one is given. """
+        contig_id = conn.execute('SELECT ID FROM LOCUS_CONTIGS WHERE NAME = ?', (contig,)).fetchone()
+        if contig_id is None:
+            return None
+        if strand is None:
+            return contig_id[0] * 4, contig_id[0] * 4 + 2
+        group = contig_id[0] * 4 + _STRAND_GROUPS[self.__strand(strand)]
+        return group, group
+
+    @staticmethod
+    def __select(conn, groups, start, end, source):
+        query = '''SELECT NAME, CONTIG, STRAND, START, END, SOURCE, FEATURE
+                   FROM LOCI_RTREE JOIN LOCI ON LOCI_RTREE.ID = LOCI.ID
+                   WHERE MAX_POS >= ? AND MIN_POS <= ? AND MAX_GROUP >= ? AND MIN_GROUP <= ?'''
+        params = [start, end, groups[0], groups[1]]
+        if source is not None:
+            query += ' AND SOURCE = ?'
+            params.append(source)
+        return [Locus(*row) for row in conn.execute(query + ' ORDER BY LOCI.ID', params)]
+
+    def overlaps(self, contig, start, end, strand=None, source=None):
+        """ Returns the loci overlapping the closed interval between 'start' and 'end' (in any order) in a contig.
+        'strand' accepts 'forward'/'+' or 'reverse'/'-'; if None, both strands are searched. 'source' restricts the
+        results to 'orf' or 'annotation' loci. """
+        start, end = min(start, end), max(start, end)
+        self.__index_deferred(source)
+        conn = self.__connect()
+        try:
+            groups = self.__groups(conn, contig, strand)
+            if groups is None:
+                return []
+            return self.__select(conn, groups, start, end, source)
+        finally:
+            conn.close()
+
+    def nearest(self, contig, position, strand=None, source=None):
+        """ Returns the loci closest to 'position' in a contig; several if they are at the same distance. Loci
+        containing the position have distance 0. The search window grows until a locus is found or the whole contig
+        is covered. """
+        self.__index_deferred(source)
+        conn = self.__connect()
+        try:
+            groups = self.__groups(conn, contig, strand)
+            if groups is None:
+                return []
+            extent = conn.execute('SELECT MIN(MIN_POS), MAX(MAX_POS) FROM LOCI_RTREE WHERE MAX_GROUP >= ? AND '
+                                  'MIN_GROUP <= ?', groups).fetchone()
+            if extent[0] is None:
+                return []
+            window = 1000
+            while True:
+                found = self.__select(conn, groups, position - window, position + window, source)
+                if found or (position - window <= extent[0] and position + window >= extent[1]):
+                    break
+                window *= 2
+        finally:
+            conn.close()
+        if not found:
+            return []
+        distances = [max(min(locus.start, locus.end) - position, position - max(locus.start, locus.end), 0)
+                     for locus in found]
+        closest = min(distances)
+        return [locus for locus, distance in zip(found, distances) if distance == closest]
+
+    def find(self, names, source=None):
+        """ Returns the loci with each of 'names', keyed by the name, in the order they were indexed. Names without
+        loci are left out. 'source' restricts the results to 'orf' or 'annotation' loci. """
+        names = list(set(names))
+        self.__index_deferred(source)
+        found = {}
+        conn = self.__connect()
+        try:
+            for i in range(0, len(names), QUERY_SIZE):
+                chunk = names[i: i + QUERY_SIZE]
+                query = f'''SELECT NAME, CONTIG, STRAND, START, END, SOURCE, FEATURE FROM LOCI
+                            WHERE NAME IN ({",".join("?" * len(chunk))})'''
+                params = list(chunk)
+                if source is not None:
+                    query += ' AND SOURCE = ?'
+                    params.append(source)
+                for row in conn.execute(query + ' ORDER BY ID', params):
+                    found.setdefault(row[0], []).append(Locus(*row))
+        finally:
+            conn.close()
+        return found
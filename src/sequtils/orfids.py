@@ -0,0 +1,130 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import re
+import sqlite3
+
+
+# Number of IDs looked up per query, below the SQLite limit of variables
+QUERY_SIZE = 900
+
+
+class ORFIdentifiers(object):
+    """ Short identifiers of the ORFs of a database built with --short_ids. Their fasta entries are the identifier
+    of the subset ('g' or 't') followed by the ID of the ORF in the ORFOME table of '{subset}.db', which holds the rest
+    of the metadata (name, coordinates, strand, contig, origin and start codon) instead of the entry. postms looks
+    them up to restore the full entries ('gORF__12_100-400_forward'). If the database was built without short IDs,
+    'enabled' is False and entries are left as they are. Entries preceded by 'decoy_prefix' are expanded as well. """
+    def __init__(self, subset, decoy_prefix='decoy_'):
+        self.db = f'{subset}.db'
+        self.identifier = None
+        if os.path.exists(self.db):
+            conn = sqlite3.connect(self.db)
+            try:
+                row = conn.execute('SELECT IDENTIFIER FROM ORF_IDENTIFIERS').fetchone()
+            except sqlite3.OperationalError:
+                # database from a version without short IDs
+                row = None
+            finally:
+                conn.close()
+            if row is not None:
+                self.identifier = row[0]
+        self.enabled = self.identifier is not None
+        if self.enabled:
+            # the entry may be preceded by the prefix of the decoys, but never be part of a longer word
+            self.pattern = re.compile(rf'(?<![\w|.-])((?:{re.escape(decoy_prefix)})?){self.identifier}(\d+)(?![\w.-])')
+            # full entries, matched on the name, the coordinates and the strand of the ORF
+            self.entryPattern = re.compile(rf'{re.escape(self.identifier)}(.+)_(\d+)-(\d+)_(\w+)')
+
+    def entries(self, ids):
+        """ :returns the full fasta entry of each ORF ID, keyed by the ID. """
+        ids = list(set(int(i) for i in ids))
+        entries = {}
+        conn = sqlite3.connect(self.db)
+        try:
+            for i in range(0, len(ids), QUERY_SIZE):
+                chunk = ids[i: i + QUERY_SIZE]
+                query = f'SELECT ID, NAME, START, END, STRAND FROM ORFOME WHERE ID IN ({",".join("?" * len(chunk))})'
+                for orf_id, name, start, end, strand in conn.execute(query, chunk):
+                    entries[orf_id] = f'{self.identifier}{name}_{start}-{end}_{strand}'
+        finally:
+            conn.close()
+        return entries
+
+    def expand(self, text, entries=None):
+        """ :returns 'text' with the short identifiers replaced by the full entries. """
+        if not self.enabled:
+            return text
+        if entries is None:
+            entries = self.entries(match[1] for match in self.pattern.findall(text))
+
+        def replace(match):
+            entry = entries.get(int(match.group(2)))
+            return f'{match.group(1)}{entry}' if entry is not None else match.group(0)
+        return self.pattern.sub(replace, text)
+
+    def expand_file(self, path):
+        """ Replaces the short identifiers in a text file by the full entries. Only the ORFs found in the file are
+        looked up. The file is replaced at once, so a file linked from elsewhere is never modified. """
+        if not self.enabled:
+            return self
+        with open(path) as handle:
+            ids = {match[1] for line in handle for match in self.pattern.findall(line)}
+        if not ids:
+            return self
+        entries = self.entries(ids)
+        partial = f'{path}.{os.getpid()}.partial'
+        with open(path) as handle, open(partial, 'w') as out:
+            out.writelines(self.expand(line, entries) for line in handle)
+        os.replace(partial, path)
+        return self
+
+    def short_ids(self, entries):
+        """ :returns the short identifier of each full ORF entry, keyed by the entry. Entries that are not ORFs of
+        this database are mapped to themselves. An ORF is only matched by its name, coordinates and strand together,
+        as ORFs on different strands may share a name. """
+        entries = set(entries)
+        ids = {entry: entry for entry in entries}
+        if not self.enabled:
+            return ids
+        orfs = {}
+        for entry in entries:
+            match = self.entryPattern.fullmatch(entry)
+            if match is not None:
+                name, start, end, strand = match.groups()
+                orfs[(name, int(start), int(end), strand)] = entry
+        names = list({orf[0] for orf in orfs})
+        conn = sqlite3.connect(self.db)
+        try:
+            for i in range(0, len(names), QUERY_SIZE):
+                chunk = names[i: i + QUERY_SIZE]
+                query = f'SELECT ID, NAME, START, END, STRAND FROM ORFOME WHERE NAME IN ({",".join("?" * len(chunk))})'
+                for orf_id, *orf in conn.execute(query, chunk):
+                    entry = orfs.get(tuple(orf))
+                    if entry is not None:
+                        ids[entry] = f'{self.identifier}{orf_id}'
+        finally:
+            conn.close()
+        return ids
+
+    def short_id(self, entry):
+        """ :returns the short identifier of a full ORF entry, or the entry itself if it is not an ORF of this
+        database. To look up many entries, short_ids opens a single connection for all of them. """
+        return self.short_ids([entry])[entry]
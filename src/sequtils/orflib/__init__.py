@@ -1,4 +1,6 @@
 from .orflib import ORF, ORFCollection
+from .orftable import ORFTable, ORFRow
+from .collapse import StopCollapser
 from .alterorf import AltORF, reformat_peptide
 from .altorf import AltCodons
 
@@ -18,18 +18,25 @@
 # uProteInS. If not, see <https://www.gnu.org/licenses/>.
 
 
+import os
+import sqlite3
+
+import numpy as np
 import pandas as pd
-from Bio import SeqIO
 
-from . import ORF, ORFCollection
+from . import ORF, ORFCollection, ORFTable
+from .collapse import StopCollapser
 from ..conversion import Translator
+from ..genomestore import GenomeStore
 from ..locus import StringTieGFF
 from ..transcriptomics import TranscriptExtractor
 
 
 class AltCodons(object):
-    def __init__(self, file, genome, maxsize, subset="Genome", transcriptome_gff=None, assembly=None, testing=False):
-        """ I hate this code """
+    def __init__(self, file, genome, maxsize, subset="Genome", transcriptome_gff=None, assembly=None, testing=False,
+                 alternative_starts=None):
+        """ I hate this code. 'alternative_starts' is the table written by database mode with --longest_orfs; the
+        starts it lists for each ORF in the results are added as alternatives of that ORF's stop codon. """
         self.subset = subset
         self.testing = testing
         self.tORFs = self.__check_transcriptome(transcriptome_gff, assembly)
@@ -45,8 +52,9 @@ class AltCodons(object):
             # print(i)
 
         # print(self.proteinSequences)
-        self.__genome_records = SeqIO.parse(genome, 'fasta')
-        self.genome_seq = [str(record.seq) for record in self.__genome_records]
+        self.genome = GenomeStore(genome)
+        self.contigs = self.__get_contigs()
+        self.collapsedStarts = StopCollapser.read_alternatives(alternative_starts) if alternative_starts else {}
 
         self.alternatives = self.__fetch_orfs()
         self.alternatives = self.__extract_peptides()
@@ -55,6 +63,27 @@ class AltCodons(object):
         #         print(alt.MSPeptides, alt.name)
         #         break
 
+    def __get_contigs(self):
+        """ :returns the contig of each ORF in the results, keyed by its name and strand, from the ORF database
+        (genome.db) written in database mode. Only needed for genomes with more than one contig. """
+        contigs = {}
+        if self.subset != "Genome" or len(self.genome) == 1 or not os.path.exists('genome.db'):
+            return contigs
+        names = {entry[1:].rsplit('_', 2)[0] for entry in self.names}
+        conn = sqlite3.connect('genome.db')
+        try:
+            for name, strand, contig in conn.execute('SELECT NAME, STRAND, CONTIG FROM ORFOME'):
+                if name in names:
+                    contigs[(name, strand)] = contig
+        finally:
+            conn.close()
+        return contigs
+
+    def __get_contig(self, entry):
+        """ :returns the contig of an entry of the results, or the first one if it is unknown. """
+        name, _, strand = entry[1:].rsplit('_', 2)
+        return self.contigs.get((name, strand), self.genome.contigs[0])
+
     def __check_testing(self):
         if self.testing:
             self.df = self.df.head(20)
@@ -120,63 +149,103 @@ class AltCodons(object):
         # print('transcript coordinates', entry, start, end)
         return int(start), int(end)
 
-    def __fetch_orfs(self):
-        """
-        :returns a dictionary containing all ORFs with alternative START codons for a given STOP codon.
-        """
-        alt_check = {}
-        alternatives = {}
-        print('fetching orfs')
+    def __read_results(self):
+        """ :returns the ORFs of the results as an ORFTable, along with the transcript name and the identifier of the
+        STOP codon of each one. """
+        starts, ends, strands, contigs, transcript_names, identifiers = [], [], [], [], [], []
         for i in range(len(self.names)):
             if self.subset == "Genome":
                 name = self.names[i]
                 start, end, strand = self.__split_coords(i)
-                transcript = None
+                contig = self.__get_contig(name)
             elif self.subset == "Transcriptome":
                 name = self.__get_transcript_name(self.names[i])
-
                 start, end = self.__get_transcript_coordinates(self.names[i])
-                # print(name)
-                # print(start, end)
-                # start, end, strand = self.tORFs[name].start, self.tORFs[name].end, 'forward'
                 strand = 'forward'
-                # print(name)
-                # print(self.tORFs)
-                # print(self.tORFs)
-                # print(name)
-                transcript = self.tORFs[name].transcript
-                # print(transcript)
-            if strand == 'forward':
-                if self.subset == "Genome":
-                    seq = self.genome_seq[0][start -1: end]
-                else:
-                    seq = transcript[start -1: end]
-            else:
-                seq = self.genome_seq[0][end-1: start][::-1]
-                to_comp = Translator(seq)
-                seq = to_comp.complement()
+                contig = None
+            starts.append(start)
+            ends.append(end)
+            strands.append(strand)
+            contigs.append(contig)
+            transcript_names.append(name)
+            identifiers.append(self.__define_identifier(end, transcript_name=name, contig=contig))
+        table = ORFTable.from_columns(name=self.names, seq=self.proteinSequences, start=starts, end=ends,
+                                      strand=strands, contig=contigs)
+        return table, transcript_names, identifiers
 
-
-            orf = ORF(name=self.names[i], start=int(start), end=int(end), seq=seq, strand=strand, protein_sequence=self.proteinSequences[i])
+    def __fetch_orfs(self):
+        """
+        :returns a dictionary containing all ORFs with alternative START codons for a given STOP codon.
+        """
+        alt_check = {}
+        alternatives = {}
+        print('fetching orfs')
+        table, transcript_names, identifiers = self.__read_results()
+        # the results list each ORF once per PSM; only the first row of each ORF is fetched from the genome
+        _, stops = np.unique(np.array([str(identifier) for identifier in identifiers]), return_inverse=True)
+        _, entries = np.unique(np.array(self.names, dtype=str), return_inverse=True)
+        for i in table.unique_rows(stops, 'start', entries):
+            row = table[i]
+            name = transcript_names[i]
+            identifier = identifiers[i]
+            transcript = self.tORFs[name].transcript if self.subset == "Transcriptome" else None
+            seq = self.__get_sequence(row.start, row.end, row.strand, transcript, row.contig)
+            orf = ORF(name=row.name, start=row.start, end=row.end, seq=seq, strand=row.strand,
+                      protein_sequence=row.seq, contig=row.contig)
             orf.transcript = transcript
             orf = self.__fetch_codons(orf)
             orf.transcriptName = name
-            identifier = self.__define_identifier(end, transcript_name=orf.transcriptName)
             if identifier not in alt_check:
                 alt_check[identifier] = []
-            # if start not in alt_check[end]:
-            #     alt_check[end].append(start)
             if identifier not in alternatives:
                 alternatives[identifier] = ORFCollection()
-            if start not in alt_check[identifier]:
+            if row.start not in alt_check[identifier]:
                 alternatives[identifier].add_orf(orf)
-                alt_check[identifier].append(start)
+                alt_check[identifier].append(row.start)
+            self.__add_collapsed_starts(orf, alternatives[identifier], alt_check[identifier])
         print('done fetching')
         return alternatives
 
-    def __define_identifier(self, orf_end, transcript_name=None):
+    def __get_sequence(self, start, end, strand, transcript, contig=None):
+        """ :returns the nucleotide sequence of an ORF, without its stop codon. """
+        if strand == 'forward':
+            if self.subset == "Genome":
+                seq = self.__get_genome(contig)[start -1: end]
+            else:
+                seq = transcript[start -1: end]
+        else:
+            seq = self.__get_genome(contig)[end-1: start][::-1]
+            to_comp = Translator(seq)
+            seq = to_comp.complement()
+        return seq
+
+    def __get_genome(self, contig):
+        """ :returns the sequence of a contig of the genome, or of the first one if 'contig' is None. """
+        return self.genome[contig if contig is not None else 0]
+
+    def __add_collapsed_starts(self, orf, collection, checked):
+        """ Adds the starts that were collapsed into this ORF in database mode (--longest_orfs) to the alternatives
+        of its stop codon. The ORF name is the fasta entry without its identifier, coordinates and strand. """
+        name, _, strand = orf.name[1:].rsplit('_', 2)
+        for start, codon in self.collapsedStarts.get((name, strand), []):
+            if start in checked:
+                continue
+            seq = self.__get_sequence(start, orf.end, orf.strand, orf.transcript, orf.contig)
+            alt = ORF(name=f'{orf.name[:5]}_alternative_{start}-{orf.end}_{orf.strand}', start=start, end=orf.end,
+                      seq=seq, strand=orf.strand, protein_sequence=Translator(seq).translate(), contig=orf.contig)
+            alt.transcript = orf.transcript
+            alt.transcriptName = orf.transcriptName
+            alt.start_codon = codon
+            collection.add_orf(alt)
+            checked.append(start)
+
+    def __define_identifier(self, orf_end, transcript_name=None, contig=None):
         if self.subset == "Genome":
-            identifier = orf_end
+            # stops of different contigs may share their coordinate
+            if contig is None or len(self.genome) == 1:
+                identifier = orf_end
+            else:
+                identifier = f'{contig}_{orf_end}'
         else:
             identifier = f'{transcript_name}_{orf_end}'
         return identifier
@@ -283,7 +352,7 @@ class AltCodons(object):
 
     def __check_subset(self, orf):
         if self.subset == "Genome":
-            sequence = self.genome_seq[0]
+            sequence = self.__get_genome(orf.contig)
         else:
             sequence = orf.transcript
         return sequence
@@ -345,12 +414,13 @@ class AltCodons(object):
                     i = 3
                     extend = True
                     transcript = None
+                    genome = self.__get_genome(alt.contig)
                     while extend:
-                        ex_start = self.genome_seq[0][alt.end - 1: alt.start + i][::-1]
+                        ex_start = genome[alt.end - 1: alt.start + i][::-1]
                         ex_seq = self.complement(ex_start)
                         # print('rev_seq')
 
-                        ex_codon = self.genome_seq[0][alt.start + i - 3:alt.start + i][::-1]
+                        ex_codon = genome[alt.start + i - 3:alt.start + i][::-1]
                         ex_codon = self.complement(ex_codon)
                         # print(ex_start)
                         i += 3
@@ -450,11 +520,11 @@ class AltCodons(object):
 
     def __add_extended(self, new_alts, start_pos, alt, s_codon, seq, transcript, transcript_name=None):
         orf = ORF(name=f'{alt.name[:5]}_extended_{start_pos+3}-{alt.end}_{alt.strand}',
-                  strand=alt.strand, start=start_pos+3, end=alt.end, seq=seq, transcript=transcript)
+                  strand=alt.strand, start=start_pos+3, end=alt.end, seq=seq, transcript=transcript, contig=alt.contig)
         orf.start_codon = s_codon
         orf.MSPeptides = alt.MSPeptides
         orf.transcriptName = transcript_name
-        identifier = self.__define_identifier(orf_end=orf.end, transcript_name=transcript_name)
+        identifier = self.__define_identifier(orf_end=orf.end, transcript_name=transcript_name, contig=alt.contig)
         if identifier not in new_alts:
             new_alts[identifier] = [orf]
         else:
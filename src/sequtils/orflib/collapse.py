@@ -0,0 +1,63 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import pandas as pd
+
+
+ALTERNATIVE_COLUMNS = ["Representative", "Contig", "Strand", "Stop", "Start", "Start Codon", "Length"]
+
+
+class StopCollapser(object):
+    """ Keeps a single ORF per stop codon: the longest one, i.e. the one with the most upstream start codon. Every
+    start of a stop, including the one kept, is written to a tab-separated table ('filename') next to the name of the
+    ORF that was kept, so the alternatives can be restored after the peptide search (see AltCodons). """
+    def __init__(self, filename="alternative_starts.tsv"):
+        self.filename = filename
+
+    def collapse(self, orfs):
+        """ Yields the longest ORF of each stop codon of an iterable of ORFs, writing the table while they are
+        consumed. ORFs must come in the order of FrameTranslator.iter_orfs, where those of a sequence and strand are
+        sorted by their distance to the beginning of the strand, so the longest ORF of a stop always comes first. """
+        kept = {}
+        current = None
+        with open(self.filename, 'w') as table:
+            table.write('\t'.join(ALTERNATIVE_COLUMNS) + '\n')
+            for orf in orfs:
+                sequence = (orf.chromosome, orf.transcript, orf.strand)
+                if sequence != current:
+                    # stops never repeat across sequences, so only those of the current one are kept in memory
+                    kept.clear()
+                    current = sequence
+                representative = kept.get(orf.end)
+                if representative is None:
+                    representative = kept[orf.end] = orf.name
+                    yield orf
+                table.write(f'{representative}\t{orf.contig}\t{orf.strand}\t{orf.end}\t{orf.start}\t'
+                            f'{orf.start_codon}\t{len(orf.seq)}\n')
+
+    @staticmethod
+    def read_alternatives(filename):
+        """ Returns a dictionary with the (start, start codon) pairs of each representative ORF in a table written by
+        collapse(), keyed by its name and strand, as ORF numbers restart on the reverse strand. """
+        df = pd.read_csv(filename, sep='\t', dtype=str, keep_default_na=False)
+        alternatives = {}
+        for name, strand, start, codon in zip(df["Representative"].tolist(), df["Strand"].tolist(),
+                                              df["Start"].tolist(), df["Start Codon"].tolist()):
+            alternatives.setdefault((name, strand), []).append((int(start), codon))
+        return alternatives
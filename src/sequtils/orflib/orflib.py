@@ -17,12 +17,13 @@
 # uProteInS. If not, see <https://www.gnu.org/licenses/>.
 
 
-from Bio import SeqIO
+from ..fasta import iter_fasta, entry_id
 
 
 class ORF(object):
     def __init__(self, name=None, seq=None, start=None, end=None, cds=None, strand=None, chromosome=None,
-                 transcript=None, origin=None, appearances=1, experiment=None, protein_sequence=None):
+                 transcript=None, origin=None, appearances=1, experiment=None, protein_sequence=None, contig=None,
+                 frame=None):
         self.name = name
         self.seq = seq
         self.start = start
@@ -32,6 +33,8 @@ class ORF(object):
         self.chromosome = chromosome
         self.transcript = transcript
         self.origin = origin
+        self.contig = contig
+        self.frame = frame
         self.start_codon = None
         self.shineDalgarno = None
         self.freeEnergy = None
@@ -47,7 +50,8 @@ class ORF(object):
 
         # after using msprocess
         self.peptides = {}
-        self.closestToStart = self.find_ms_peptides()
+        # without MS peptides yet, find_ms_peptides() would return the end
+        self.closestToStart = int(end) if end is not None else None
 
     def set_coordinates(self, genome):
         return self
@@ -109,9 +113,8 @@ class ORFCollection(object):
 
     def read_fasta(self, file):
         """ Adds all entries and sequences in a fasta file to this class instance. """
-        records = SeqIO.parse(file, 'fasta')
-        for record in records:
-            self.orfs.append(ORF(name=record.name, seq=record.seq))
+        for header, seq in iter_fasta(file):
+            self.orfs.append(ORF(name=entry_id(header), seq=seq))
         return self
 
     def add_orfs(self, orfs):
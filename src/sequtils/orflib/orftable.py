@@ -0,0 +1,273 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+from array import array
+
+import numpy as np
+
+
+# Columns stored as integer codes into a list of their distinct values
+_CATEGORICAL = ('strand', 'origin', 'contig', 'start_codon')
+
+
+def _take_ragged(buffer, offsets, idx):
+    """ Gathers the entries 'idx' of a buffer split by 'offsets' into a new buffer and offsets. """
+    starts = offsets[idx]
+    lengths = offsets[idx + 1] - starts
+    new_offsets = np.zeros(len(idx) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    positions = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return buffer[positions], new_offsets
+
+
+def _pack(strings):
+    """ Joins strings into a byte buffer split by offsets. """
+    encoded = [string.encode() for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+class ORFRow(object):
+    """ Read-only view of a single ORF in an ORFTable, with the same attribute names as the ORF class. """
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def name(self):
+        return self.table.get_name(self.index)
+
+    @property
+    def seq(self):
+        return self.table.get_seq(self.index)
+
+    @property
+    def start(self):
+        return int(self.table.start[self.index])
+
+    @property
+    def end(self):
+        return int(self.table.end[self.index])
+
+    @property
+    def frame(self):
+        frame = int(self.table.frame[self.index])
+        return frame if frame != 0 else None
+
+    @property
+    def chromosome(self):
+        chromosome = int(self.table.chromosome[self.index])
+        return chromosome if chromosome >= 0 else None
+
+    @property
+    def transcript(self):
+        transcript = int(self.table.transcript[self.index])
+        return transcript if transcript >= 0 else None
+
+    @property
+    def strand(self):
+        return self.table.get_category('strand', self.index)
+
+    @property
+    def origin(self):
+        return self.table.get_category('origin', self.index)
+
+    @property
+    def contig(self):
+        return self.table.get_category('contig', self.index)
+
+    @property
+    def start_codon(self):
+        return self.table.get_category('start_codon', self.index)
+
+    def __len__(self):
+        return int(self.table.length[self.index])
+
+    def __repr__(self):
+        return f'ORFRow({self.name}, {self.start}-{self.end}, {self.strand})'
+
+
+class ORFTable(object):
+    """ Columnar storage for large sets of ORFs. Coordinates, lengths, frames and indexes are NumPy arrays, names and
+    protein sequences are kept in contiguous byte buffers split by offsets, and strand, origin, contig and start codon
+    are stored as codes into their distinct values. Iterating or indexing returns ORFRow views, which can be used
+    where ORF objects are only read. Build it with from_orfs(), i.e. from FrameTranslator.iter_orfs(), or with
+    from_columns() from the columns of a results table. """
+    def __init__(self, names, name_offsets, seqs, seq_offsets, start, end, length, frame, chromosome, transcript,
+                 codes, categories):
+        self.names = names
+        self.nameOffsets = name_offsets
+        self.seqs = seqs
+        self.seqOffsets = seq_offsets
+        self.start = start
+        self.end = end
+        self.length = length
+        self.frame = frame
+        self.chromosome = chromosome
+        self.transcript = transcript
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def from_orfs(cls, orfs):
+        """ Builds a table from an iterable of ORF objects, consuming it one ORF at a time. """
+        names, seqs = bytearray(), bytearray()
+        name_offsets, seq_offsets = array('q', [0]), array('q', [0])
+        start, end, length = array('q'), array('q'), array('l')
+        frame, chromosome, transcript = array('b'), array('l'), array('l')
+        codes = {column: array('l') for column in _CATEGORICAL}
+        categories = {column: {} for column in _CATEGORICAL}
+        for orf in orfs:
+            names += str(orf.name).encode()
+            name_offsets.append(len(names))
+            seq = str(orf.seq) if orf.seq is not None else ''
+            seqs += seq.encode()
+            seq_offsets.append(len(seqs))
+            start.append(int(orf.start))
+            end.append(int(orf.end))
+            length.append(len(seq))
+            frame.append(getattr(orf, 'frame', None) or 0)
+            chromosome.append(orf.chromosome if orf.chromosome is not None else -1)
+            transcript.append(orf.transcript if orf.transcript is not None else -1)
+            for column in _CATEGORICAL:
+                values = categories[column]
+                codes[column].append(values.setdefault(getattr(orf, column, None), len(values)))
+        return cls(
+            names=np.frombuffer(bytes(names), dtype=np.uint8),
+            name_offsets=np.frombuffer(name_offsets, dtype=np.int64),
+            seqs=np.frombuffer(bytes(seqs), dtype=np.uint8),
+            seq_offsets=np.frombuffer(seq_offsets, dtype=np.int64),
+            start=np.frombuffer(start, dtype=np.int64),
+            end=np.frombuffer(end, dtype=np.int64),
+            length=np.array(length, dtype=np.int32),
+            frame=np.frombuffer(frame, dtype=np.int8),
+            chromosome=np.array(chromosome, dtype=np.int32),
+            transcript=np.array(transcript, dtype=np.int32),
+            codes={column: np.array(codes[column], dtype=np.int32) for column in _CATEGORICAL},
+            categories={column: list(categories[column]) for column in _CATEGORICAL},
+        )
+
+    @classmethod
+    def from_columns(cls, name, seq, start, end, strand, contig=None, origin=None, start_codon=None, frame=None):
+        """ Builds a table from a sequence of values per column, i.e. those of a results data frame, without creating
+        ORF objects. Sequences that are not strings (missing values) are stored as empty ones, and columns left as
+        None are stored as missing. """
+        size = len(start)
+        names, name_offsets = _pack([str(value) for value in name])
+        seqs, seq_offsets = _pack([value if isinstance(value, str) else '' for value in seq])
+        columns = {'strand': strand, 'origin': origin, 'contig': contig, 'start_codon': start_codon}
+        codes, categories = {}, {}
+        for column in _CATEGORICAL:
+            values = columns[column] if columns[column] is not None else [None] * size
+            distinct = {}
+            codes[column] = np.fromiter((distinct.setdefault(value, len(distinct)) for value in values),
+                                        dtype=np.int32, count=size)
+            categories[column] = list(distinct)
+        return cls(
+            names=names, name_offsets=name_offsets, seqs=seqs, seq_offsets=seq_offsets,
+            start=np.asarray(start, dtype=np.int64).reshape(size),
+            end=np.asarray(end, dtype=np.int64).reshape(size),
+            length=np.diff(seq_offsets).astype(np.int32),
+            frame=np.asarray(frame, dtype=np.int8) if frame is not None else np.zeros(size, dtype=np.int8),
+            chromosome=np.full(size, -1, dtype=np.int32),
+            transcript=np.full(size, -1, dtype=np.int32),
+            codes=codes, categories=categories,
+        )
+
+    def __len__(self):
+        return len(self.start)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('ORFTable index out of range')
+        return ORFRow(self, index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ORFRow(self, i)
+
+    def get_name(self, index):
+        return self.names[self.nameOffsets[index]:self.nameOffsets[index + 1]].tobytes().decode()
+
+    def get_seq(self, index):
+        return self.seqs[self.seqOffsets[index]:self.seqOffsets[index + 1]].tobytes().decode()
+
+    def get_category(self, column, index):
+        return self.categories[column][self.codes[column][index]]
+
+    def category_mask(self, column, values):
+        """ Returns a boolean mask of the ORFs whose 'column' (strand, origin, contig or start_codon) is in
+        'values'. """
+        values = set(values)
+        wanted = [code for code, value in enumerate(self.categories[column]) if value in values]
+        return np.isin(self.codes[column], wanted)
+
+    def filter(self, mask):
+        """ Returns a new table with the ORFs selected by a boolean mask or an array of indexes. """
+        idx = np.flatnonzero(mask) if np.asarray(mask).dtype == bool else np.asarray(mask, dtype=np.int64)
+        names, name_offsets = _take_ragged(self.names, self.nameOffsets, idx)
+        seqs, seq_offsets = _take_ragged(self.seqs, self.seqOffsets, idx)
+        return ORFTable(
+            names=names, name_offsets=name_offsets, seqs=seqs, seq_offsets=seq_offsets,
+            start=self.start[idx], end=self.end[idx], length=self.length[idx], frame=self.frame[idx],
+            chromosome=self.chromosome[idx], transcript=self.transcript[idx],
+            codes={column: codes[idx] for column, codes in self.codes.items()},
+            categories=self.categories,
+        )
+
+    def unique_rows(self, *keys):
+        """ Returns the indexes of the first ORF of each distinct combination of 'keys', in the order of the table.
+        Keys are the names of integer or categorical columns ('start', 'end', 'strand', ...) or arrays of integers
+        with a value per ORF, i.e. codes from numpy.unique(..., return_inverse=True). """
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+        columns = [np.asarray(self.codes[key] if key in self.codes else getattr(self, key)) if isinstance(key, str)
+                   else np.asarray(key) for key in keys]
+        _, first = np.unique(np.column_stack(columns), axis=0, return_index=True)
+        return np.sort(first)
+
+    def select(self, min_length=None, max_length=None, strand=None, start_codons=None):
+        """ Filters the ORFs by protein length (in amino acids), strand and start codon. Arguments left as None are
+        not used. """
+        mask = np.ones(len(self), dtype=bool)
+        if min_length is not None:
+            mask &= self.length >= min_length
+        if max_length is not None:
+            mask &= self.length <= max_length
+        if strand is not None:
+            mask &= self.category_mask('strand', [strand])
+        if start_codons is not None:
+            mask &= self.category_mask('start_codon', start_codons)
+        return self.filter(mask)
+
+    def nbytes(self):
+        """ Memory used by the columns of this table, in bytes. """
+        arrays = [self.names, self.nameOffsets, self.seqs, self.seqOffsets, self.start, self.end, self.length,
+                  self.frame, self.chromosome, self.transcript, *self.codes.values()]
+        return sum(column.nbytes for column in arrays)
+
+    def to_fasta(self, filename="orfs.fasta", identifier=''):
+        """ Writes the ORFs with the same headers as DatabaseGenerator.to_fasta. """
+        with open(filename, 'w', buffering=1 << 20) as fa:
+            fa.writelines(f">{identifier}{orf.name}_{orf.start}-{orf.end}_{orf.strand}\n{orf.seq}\n" for orf in self)
@@ -18,9 +18,9 @@
 
 
 import pandas as pd
-from Bio import SeqIO
 from ..percolator import PercolatorData
 from ..orflib import AltORF, ORF, reformat_peptide
+from ..fasta import iter_fasta, entry_id, write_fasta
 
 
 class AltStart(PercolatorData):
@@ -45,20 +45,16 @@ class AltStart(PercolatorData):
         return total_orfs
 
     def __get_db_proteins(self):
-        records = SeqIO.parse(self.db, 'fasta')
+        total_orfs = set(self.totalORFs)
         orf_sequences = {}
-        for record in records:
-            if record.id in self.totalORFs:
-                orf_sequences[record.id] = str(record.seq)
+        for header, seq in iter_fasta(self.db):
+            if entry_id(header) in total_orfs:
+                orf_sequences[entry_id(header)] = seq
         self.totalORFs = []
         return orf_sequences
 
     def create_fake_db(self, output):
-        fasta = []
-        for entry in self.ORFSequences:
-            fasta.append(f'>{entry}\n{self.ORFSequences[entry]}\n')
-        with open(f'{output}.fasta', 'w') as fa:
-            fa.writelines(fasta)
+        write_fasta(f'{output}.fasta', self.ORFSequences.items())
 
     def get_alternatives(self):
         for i in range(len(self.coordinates)):
@@ -18,13 +18,16 @@
 
 
 import pandas as pd
-from Bio import SeqIO
 import matplotlib.pyplot as plt
 from matplotlib_venn import venn2
 
+from ..fasta import iter_fasta, FastaWriter, FastaIndex
+
 
 class SequenceFinder(object):
-    def __init__(self, df, fasta_db):
+    def __init__(self, df, fasta_db, identifiers=None, decoy_prefix='decoy_'):
+        """ 'identifiers' is the ORFIdentifiers of a database built with short ORF IDs, and 'decoy_prefix' the prefix
+        of the decoy entries, which have no sequence in the database. """
         self.df = pd.read_csv(df, sep="\t")
         self.df = self.df[self.df["Protein"].str.contains("contaminant", regex=False) == False]
         self.df = self.df[self.df["Protein"].str.contains("lcl|", regex=False) == False]
@@ -32,29 +35,31 @@ class SequenceFinder(object):
         self.df = self.df[self.df["Protein"].str.contains("sp|", regex=False) == False]
         self.proteins = self.df["Protein"].tolist()
         self.fasta = fasta_db
-        self.proteinDict = self.__get_db_proteins()
-
-    def __get_db_proteins(self):
-        protein_dict = {}
-        records = SeqIO.parse(self.fasta, 'fasta')
-        for record in records:
-            if record.description not in protein_dict:
-                protein_dict[record.description.split(" ")[0]] = record.seq
-        return protein_dict
+        # only the proteins with PSMs are read from the database
+        self.proteinIndex = FastaIndex(self.fasta)
+        self.identifiers = identifiers
+        self.decoyPrefix = decoy_prefix
 
     def df_proteins(self):
         protein_list = []
+        short_ids = {}
+        if self.identifiers is not None:
+            # entries of a database with short ORF IDs, all looked up at once
+            short_ids = self.identifiers.short_ids(protein[:protein.rfind("(pre")] for i in self.proteins
+                                                   for protein in i.split(";")
+                                                   if not protein.startswith(self.decoyPrefix))
         for i in self.proteins:
             protein_set = i.split(";")
             seq_set = ""
             for protein in protein_set:
-                if 'decoy' not in protein:
+                if not protein.startswith(self.decoyPrefix):
                     # print(protein)
                     # if ')' not in protein:
                     pos = protein.rfind("(pre")
                     fixed = protein[:pos]
                     # fixed = protein
-                    seq = self.proteinDict[fixed]
+                    fixed = short_ids.get(fixed, fixed)
+                    seq = self.proteinIndex[fixed]
                     # print(seq)
                     if len(seq_set) > 0:
                         seq_set += f",{seq}"
@@ -152,13 +157,13 @@ class FastaSubsetter(object):
             for protein in pro_set:
                 if protein not in proteins:
                     proteins.append(protein)
-                    to_write.append(f'>{protein}\n{self.seqs[i]}\n')
+                    to_write.append((protein, self.seqs[i]))
         return to_write
 
     def create_fasta(self, output):
         fasta = self.__get_seqs()
-        with open(f'{output}.fasta', 'w') as fa:
-            fa.writelines(fasta)
+        with FastaWriter(f'{output}.fasta') as fa:
+            fa.write_entries(fasta)
         return self
 
     def filter_smorfs(self, output):
@@ -236,15 +241,15 @@ class CollectionSubsets(object):
 
     @staticmethod
     def __get_records(db):
-        records = SeqIO.parse(db, 'fasta')
+        records = iter_fasta(db)
         return records
 
     @staticmethod
     def __get_seqs(db):
         seqs = []
-        for record in db:
-            if str(record.seq) not in seqs:
-                seqs.append(str(record.seq))
+        for _, seq in db:
+            if seq not in seqs:
+                seqs.append(seq)
         return seqs
 
     def unique_sequences(self):
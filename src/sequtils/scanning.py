@@ -0,0 +1,68 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+
+class StopCodonScanner(object):
+    """ Finds ORFs by indexing the stop codons of each reading frame instead of matching a regular expression against
+    the whole sequence. Every start codon is paired with the next in-frame stop codon, which gives the same ORFs as the
+    overlapped '(start)(...)+?(?=stop)' pattern used by FrameTranslator, in the same order. 'minsize' and 'maxsize'
+    refer to the ORF length in nucleotides, without the stop codon. """
+    def __init__(self, starts, stops, minsize=0, maxsize=0):
+        self.startCodes = self.__encode_codons(starts)
+        self.stopCodes = self.__encode_codons(stops)
+        self.minSize = minsize
+        self.maxSize = maxsize
+
+    @staticmethod
+    def __encode_codons(codons):
+        """ Packs each codon into a single integer, so a sequence can be compared against all of them at once. """
+        codes = [(ord(codon[0]) << 16) | (ord(codon[1]) << 8) | ord(codon[2]) for codon in codons]
+        return np.array(codes, dtype=np.uint32)
+
+    @staticmethod
+    def __codon_codes(sequence):
+        """ Returns the packed code of the codon starting at every position of the sequence. """
+        nucs = np.frombuffer(str(sequence).encode('ascii'), dtype=np.uint8).astype(np.uint32)
+        return (nucs[:-2] << 16) | (nucs[1:-1] << 8) | nucs[2:]
+
+    def scan(self, sequence):
+        """ Returns two arrays with the 0-based start of each ORF and the 0-based position of its stop codon, sorted by
+        start. The ORF nucleotide sequence is sequence[start:end]. ORFs outside the size limits are not reported. """
+        if len(sequence) < 9:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        codes = self.__codon_codes(sequence)
+        starts = np.flatnonzero(np.isin(codes, self.startCodes))
+        stops = np.flatnonzero(np.isin(codes, self.stopCodes))
+
+        # offsets every position by its frame, so stops from a single sorted array are only found within their frame
+        span = len(sequence) + 6
+        stop_keys = np.sort(stops % 3 * span + stops)
+        start_frames = starts % 3
+        # the start codon must be followed by at least one codon before the stop
+        idx = np.searchsorted(stop_keys, start_frames * span + starts + 6)
+        found = idx < len(stop_keys)
+        starts, start_frames, idx = starts[found], start_frames[found], idx[found]
+        ends = stop_keys[idx] - start_frames * span
+        in_frame = ends < span
+
+        lengths = ends - starts
+        within = in_frame & (lengths >= self.minSize) & (lengths <= self.maxSize)
+        return starts[within], ends[within]
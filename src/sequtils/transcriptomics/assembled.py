@@ -17,17 +17,18 @@
 # uProteInS. If not, see <https://www.gnu.org/licenses/>.
 
 
-from Bio import SeqIO
+from ..genomestore import GenomeStore
 
 
 class TranscriptExtractor(object):
     def __init__(self, assembly):
-        self.assembly = SeqIO.parse(assembly, 'fasta')
+        self.assembly = GenomeStore(assembly)
 
     def get_transcripts(self):
+        """ :returns views of the memory-mapped transcript sequences, keyed by gene. """
         rnas = {}
-        for record in self.assembly:
-            gene = str(record.id)
+        for contig in self.assembly:
+            gene = contig
             # if '0001' in gene:
             #     print('WORKING', gene)
             if 'gene' in gene:
@@ -38,5 +39,5 @@ class TranscriptExtractor(object):
             elif 'rna' in gene:
                 gene = gene[4:]
             if gene not in rnas:
-                rnas[gene] = str(record.seq)
+                rnas[gene] = self.assembly[contig]
         return rnas
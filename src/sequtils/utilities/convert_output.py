@@ -18,7 +18,8 @@
 
 
 import pandas as pd
-from Bio import SeqIO
+
+from ..fasta import iter_fasta, entry_id, write_fasta
 
 
 class FastaConverter(object):
@@ -56,19 +57,18 @@ class FastaConverter(object):
                 gene = gene_name[1][12:]
                 id_dict[ids[i]] = gene
         fasta_file = []
-        records = SeqIO.parse(self.fasta, 'fasta')
-        for record in records:
-            if "|" in record.id:
-                name = record.id.split("|")[2]
+        for header, seq in iter_fasta(self.fasta):
+            entry = entry_id(header)
+            if "|" in entry:
+                name = entry.split("|")[2]
                 if name in id_dict:
                     converted = id_dict[name]
                 else:
                     converted = name
             else:
-                converted = record.id
-            fasta_file.append(f'>{converted}\n{record.seq}\n')
-        with open('converted_genome_database.fasta', 'w') as fa:
-            fa.writelines(fasta_file)
+                converted = entry
+            fasta_file.append((converted, seq))
+        write_fasta('converted_genome_database.fasta', fasta_file)
 
 
 
@@ -271,7 +271,7 @@ class MSTesting(PipelineTesting):
             genome = ps.PeptideSearch("Genome", self.args.Mass_spec, "genome_database.fasta", self.args)
             genome.peptide_identification()
             genome_decoy = Decoy(db="genome_database.fasta", db_type="Genome")
-            genome_decoy.reverse_sequences().to_fasta()
+            genome_decoy.to_fasta()
             genome_decoy_search = ps.PeptideSearch("Genome", self.args.Mass_spec, "Genome/Percolator/Genome_decoy.fasta",
                                                    self.args, decoy=True)
             genome_decoy_search.peptide_identification()
@@ -279,7 +279,7 @@ class MSTesting(PipelineTesting):
                 transcriptome = ps.PeptideSearch("Transcriptome", self.args.Mass_spec, "transcriptome_database.fasta", self.args)
                 transcriptome.peptide_identification()
                 transcriptome_decoy = Decoy(db="transcriptome_database.fasta", db_type="Transcriptome")
-                transcriptome_decoy.reverse_sequences().to_fasta()
+                transcriptome_decoy.to_fasta()
                 transcriptome_decoy_search = ps.PeptideSearch("Transcriptome", self.args.Mass_spec,
                                                               "Transcriptome/Percolator/Transcriptome_decoy.fasta", self.args,
                                                               decoy=True)
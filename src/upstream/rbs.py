@@ -22,12 +22,13 @@ import sys
 import os
 import subprocess
 
-from Bio import SeqIO
 import pandas as pd
 
 from ..sequtils.orflib import ORF, ORFCollection
 from ..sequtils.locus import StringTieGFF
 from ..sequtils.transcriptomics import TranscriptExtractor
+from ..sequtils.genomestore import GenomeStore
+from ..sequtils.fasta import iter_fasta
 
 
 class SDInspection(object):
@@ -50,7 +51,7 @@ class SDInspection(object):
         # self.results = pd.read_csv(f'{folder}/post_perc/{filetype}_results_02.txt', sep='\t')
         # self.coordinates = self.results["Genome Coordinates"].tolist()
         # self.entries = self.results["Protein"].tolist()
-        self.genome = self.__get_sequences(args.genome)
+        self.genome = GenomeStore(args.genome)
         # self.upstreamSequences = self.__extract_upstream()
         self.pyPath = sys.path[0]
         self.freeAlignPath = f'{self.pyPath}/dependencies/free2bind/free_align.pl'
@@ -92,8 +93,7 @@ class SDInspection(object):
 
     @staticmethod
     def __get_sequences(fasta):
-        records = SeqIO.parse(fasta, 'fasta')
-        seqs = [str(record.seq) for record in records][0]
+        _, seqs = next(iter_fasta(fasta))
         return seqs
 
     def __extract_upstream_old(self):
@@ -131,7 +131,7 @@ class SDInspection(object):
                     # print(alt.name, alt.strand, alt.start)
                 if alt.strand == 'forward':
                     if self.subset == "Genome":
-                        upstream = self.genome[alt.start-22: alt.start]
+                        upstream = self.__get_genome(alt.contig)[alt.start-22: alt.start]
                     else:
                         if alt.start-22 > 0:
                             upstream = alt.transcript[alt.start-22: alt.start]
@@ -139,15 +139,16 @@ class SDInspection(object):
                             upstream = ''
                     alt.upstream = upstream
                 elif alt.strand == 'reverse':
-                    upstream = self.__complement(self.genome[alt.start: alt.start+22][::-1])
+                    upstream = self.__complement(self.__get_genome(alt.contig)[alt.start: alt.start+22][::-1])
                     alt.upstream = upstream
                 if self.subset == 'Genome':
-                    if str(alt.end) not in upstream_seqs:
-                        upstream_seqs[str(alt.end)] = ORFCollection()
-                        upstream_seqs[str(alt.end)].add_orf(alt)
-                    elif str(alt.end) in upstream_seqs:
+                    identifier = str(self.__define_identifier(alt.end, contig=alt.contig))
+                    if identifier not in upstream_seqs:
+                        upstream_seqs[identifier] = ORFCollection()
+                        upstream_seqs[identifier].add_orf(alt)
+                    elif identifier in upstream_seqs:
                         # print(upstream_seqs[alt.end])
-                        upstream_seqs[str(alt.end)].add_orf(alt)
+                        upstream_seqs[identifier].add_orf(alt)
                 elif self.subset == "Transcriptome":
                     identifier = f'{alt.transcriptName}_{alt.end}'
                     if identifier not in upstream_seqs:
@@ -168,9 +169,17 @@ class SDInspection(object):
 
         return upstream_seqs
 
-    def __define_identifier(self, orf_end, transcript_name=None):
+    def __get_genome(self, contig):
+        """ :returns the sequence of a contig of the genome, or of the first one if 'contig' is None. """
+        return self.genome[contig if contig is not None else 0]
+
+    def __define_identifier(self, orf_end, transcript_name=None, contig=None):
         if self.subset == "Genome":
-            identifier = orf_end
+            # stops of different contigs may share their coordinate
+            if contig is None or len(self.genome) == 1:
+                identifier = orf_end
+            else:
+                identifier = f'{contig}_{orf_end}'
         else:
             identifier = f'{transcript_name}_{orf_end}'
         return identifier
@@ -211,7 +220,8 @@ class SDInspection(object):
                 else:
                     alt.freeEnergy = 0
                     alt.shineDalgarno = self.__check_rbs(0)
-                identifier = self.__define_identifier(alt.end, transcript_name=alt.transcriptName)
+                identifier = self.__define_identifier(alt.end, transcript_name=alt.transcriptName,
+                                                      contig=getattr(alt, 'contig', None))
                 if identifier not in alts:
                     alts[identifier] = ORFCollection()
                     alts[identifier].add_orf(alt)
@@ -18,9 +18,67 @@
 # uProteInS. If not, see <https://www.gnu.org/licenses/>.
 
 
+import os
+import pathlib
+import pickle
+import random
+import sqlite3
+import tracemalloc
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from src import uproteins, cli, assembly  # noqa: F401
+from src.sequtils import (
+    GenomeTranslator, TranscriptomeTranslator, DatabaseGenerator, ORF,
+    LocusIndex, ORFTable, StopCollapser, Digester, GenomeStore, iter_fasta,
+    write_fasta, FastaIndex, ORFIdentifiers, GenomeCoordinates
+)
+from src.sequtils.orflib import AltCodons
+from src.sequtils.conversion import (
+    FrameTranslation, Translator, StrandConverter
+)
+from src.database import (
+    database_generator, DatabaseCache, BatchDatabase, build_database
+)
+from src.postprocess.percolator import Decoy
+from src.sequtils.__helpers import ContigError
+
+
+class RandomGenome:
+    """Writes fasta files of random nucleotide sequences to a directory.
+    Sequences come from a single seeded generator, so every call returns
+    new ones, and every run the same ones.
+    """
+    def __init__(self, directory: pathlib.Path, seed: int = 0) -> None:
+        self.directory = directory
+        self.rng = random.Random(seed)
+
+    def sequence(self, size: int, alphabet: str = 'ACGT') -> str:
+        return ''.join(self.rng.choice(alphabet) for _ in range(size))
+
+    def fasta(self, name: str = 'genome',
+              contigs: t.Optional[dict] = None, prefix: str = '',
+              alphabets: t.Optional[dict] = None) -> pathlib.Path:
+        """Write '<name>.fasta' with a random contig for each name and size
+        in 'contigs' (a 3 kb 'chr' by default), each one after 'prefix'.
+        'alphabets' may give the nucleotides of some contigs.
+        """
+        contigs = contigs or {'chr': 3000}
+        alphabets = alphabets or {}
+        fasta = self.directory / f'{name}.fasta'
+        fasta.write_text(''.join(
+            f'>{contig}\n{prefix}'
+            f'{self.sequence(size, alphabets.get(contig, "ACGT"))}\n'
+            for contig, size in contigs.items()
+        ))
+        return fasta
+
+
+@pytest.fixture
+def random_genome(tmp_path) -> RandomGenome:
+    return RandomGenome(tmp_path)
 
 
 @pytest.mark.database
@@ -29,3 +87,640 @@ def test_database_parser(database_args, tmp_file):
     parser, subparsers = cli.get_parsers()
     args = parser.parse_args(database_args)
     cli.validate_database(args, subparsers['database'])
+
+
+@pytest.mark.database
+@pytest.mark.parametrize('translator',
+                         [GenomeTranslator, TranscriptomeTranslator])
+def test_scanning_engines_match(translator, random_genome, tmp_path,
+                                monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fasta = random_genome.fasta(
+        'sequences', contigs={f'seq{i}': 2000 for i in range(3)}
+    )
+    starts = ['TTG', 'CTG', 'ATT', 'ATC', 'ATA', 'ATG', 'GTG']
+    stops = ['TAA', 'TAG', 'TGA']
+
+    found = {}
+    for engine in ('stops', 'regex'):
+        orfs = translator(sequence=str(fasta), minsize=30, maxsize=300) \
+            .parse_frames(starts=starts, stops=stops, seqtype='both',
+                          engine=engine, entry='full')
+        found[engine] = [
+            (orf.name, orf.start, orf.end, orf.strand, orf.seq, orf.cds)
+            for orf in orfs
+        ]
+
+    assert found['stops']
+    assert found['stops'] == found['regex']
+
+
+@pytest.mark.database
+@pytest.mark.parametrize('engine', ['stops', 'regex'])
+def test_windowed_scanning(engine, random_genome, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fasta = random_genome.fasta(
+        'contigs', contigs={'contig0': 5000, 'contig1': 1200, 'contig2': 301},
+        alphabets={'contig1': 'ACGTN'}
+    )
+    starts = ['ATG', 'GTG', 'TTG']
+    stops = ['TAA', 'TAG', 'TGA']
+
+    found = {}
+    for window in (10 ** 6, 500, 31):
+        with ThreadPoolExecutor(2) as executor:
+            orfs = GenomeTranslator(sequence=str(fasta), minsize=30,
+                                    maxsize=300) \
+                .iter_orfs(starts=starts, stops=stops, seqtype='both',
+                           engine=engine, workers=2, window=window,
+                           executor=executor if engine == 'stops' else None)
+            found[window] = [
+                (orf.name, orf.start, orf.end, orf.strand, orf.seq, orf.cds)
+                for orf in orfs
+            ]
+
+    assert found[10 ** 6]
+    assert found[10 ** 6] == found[500] == found[31]
+
+
+@pytest.mark.database
+def test_complement_ambiguous_bases():
+    sequence = 'ATGCNRYKMSWBDHVatgcn'
+    assert Translator(sequence).complement() == 'TACGNYRMKSWVHDBtacgn'
+    assert StrandConverter([sequence]).complement().reverse() == \
+        ['ngcatBDHVWSKMRYNGCAT']
+
+
+@pytest.mark.database
+def test_frame_translation_slices():
+    rng = random.Random(7)
+    sequence = ''.join(rng.choice('ACGT') for _ in range(600))
+    translation = FrameTranslation(sequence)
+
+    for _ in range(200):
+        start = rng.randrange(0, 590)
+        end = start + 3 * rng.randint(2, (600 - start) // 3)
+        expected = Translator(sequence[start:end]).translate()
+        assert translation.protein(start, end) == expected
+
+
+@pytest.mark.database
+def test_streamed_fasta_matches_database(tmp_path, monkeypatch,
+                                         random_genome):
+    fasta = random_genome.fasta()
+    monkeypatch.chdir(tmp_path)
+    starts = ['ATG', 'GTG', 'TTG']
+    stops = ['TAA', 'TAG', 'TGA']
+
+    collected = GenomeTranslator(sequence=str(fasta)) \
+        .parse_frames(starts=starts, stops=stops, seqtype='aa')
+    stored = DatabaseGenerator(name='stored', db_type='sql')
+    stored.add_orfs(collected)
+    stored.to_fasta(filename='stored.fasta')
+
+    streamed = GenomeTranslator(sequence=str(fasta)) \
+        .iter_orfs(starts=starts, stops=stops, seqtype='aa')
+    DatabaseGenerator(name='streamed', db_type='sql') \
+        .write_orfs(streamed, filename='streamed.fasta')
+
+    assert (tmp_path / 'stored.fasta').read_text()
+    assert (tmp_path / 'stored.fasta').read_text() == \
+        (tmp_path / 'streamed.fasta').read_text()
+
+
+@pytest.mark.database
+def test_sql_database_rerun(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    orfs = [
+        ORF(name=f"ORF_it's_{i}", seq='MKV', start=i, end=i + 8,
+            strand='forward', origin='Genome', contig='chr', frame=1)
+        for i in range(1, 6)
+    ]
+
+    for _ in range(2):
+        db = DatabaseGenerator(name='genome', db_type='sql')
+        db.add_orfs(orfs)
+
+    rows = db.retrieve()
+    assert len(rows) == len(orfs)
+    assert rows[0][:8] == (1, "ORF_it's_1", 'MKV', 3, 1, 9, 'forward', 'chr')
+
+
+@pytest.mark.database
+def test_locus_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    orfs = [
+        ORF(name='ORF_1', seq='MKV', start=100, end=200, strand='forward',
+            origin='Genome', contig='chr', frame=1),
+        ORF(name='ORF_2', seq='MKV', start=450, end=300, strand='reverse',
+            origin='Genome', contig='chr', frame=-1),
+        ORF(name='ORF_3', seq='MKV', start=100, end=200, strand='forward',
+            origin='Genome', contig='plasmid', frame=1),
+    ]
+    DatabaseGenerator(name='genome', db_type='sql').add_orfs(orfs)
+    gff = tmp_path / 'annotation.gff'
+    gff.write_text(
+        '##gff-version 3\n'
+        'chr\tRefSeq\tCDS\t150\t350\t.\t+\t0\tID=cds-A;Name=geneA\n'
+        'chr\tRefSeq\tCDS\t5000\t5300\t.\t-\t0\tID=cds-B\n'
+        'chr\tother\tCDS\t1\t9000\t.\t+\t0\tID=cds-C\n'
+    )
+    index = LocusIndex('genome').defer('annotation', gff=str(gff))
+    # nothing is indexed until the first query
+    conn = sqlite3.connect('genome.db')
+    assert conn.execute('SELECT COUNT(*) FROM LOCI').fetchone()[0] == 0
+    conn.close()
+
+    def names(loci):
+        return sorted(locus.name for locus in loci)
+
+    assert names(index.overlaps('chr', 180, 320)) == \
+        ['ORF_1', 'ORF_2', 'geneA']
+    assert names(index.overlaps('chr', 180, 320, strand='reverse')) == \
+        ['ORF_2']
+    assert names(index.overlaps('chr', 180, 320, source='annotation')) == \
+        ['geneA']
+    assert names(index.overlaps('plasmid', 1, 150)) == ['ORF_3']
+    assert index.overlaps('missing', 1, 150) == []
+    assert names(index.nearest('chr', 4000)) == ['cds-B']
+    assert names(index.nearest('chr', 20, strand='+')) == ['ORF_1']
+
+
+@pytest.mark.database
+def test_genome_coordinates(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    orfs = [
+        ORF(name='ORF__1', seq='MKV', start=100, end=200, strand='forward',
+            origin='Genome', contig='chr', frame=1),
+        ORF(name='ORF__1', seq='MKV', start=450, end=300, strand='reverse',
+            origin='Genome', contig='chr', frame=-1),
+    ]
+    DatabaseGenerator(name='genome', db_type='sql').add_orfs(orfs)
+    gff = tmp_path / 'annotation.gff'
+    gff.write_text(
+        '##gff-version 3\n'
+        'chr\tRefSeq\tCDS\t150\t350\t.\t+\t0\tID=cds-A;Name=WP_1\n'
+    )
+    LocusIndex('genome').defer('annotation', gff=str(gff))
+    psm = tmp_path / 'psm.txt'
+    psm.write_text(
+        'PSMId\tproteinIds\n'
+        # coordinates are only read from the entries missing from the index
+        'a\tgORF__1_1-9_forward,gORF__1_9-1_reverse\n'
+        'b\tWP_1_ANNO,gORF__2_7-70_forward,sp|X\n'
+    )
+
+    coordinates = GenomeCoordinates(
+        str(psm), loci=LocusIndex('genome')).get_coords()
+    assert coordinates.coordinates == [
+        '100-200,300-450', '150-350,7-70,not found']
+    conn = sqlite3.connect('genome.db')
+    assert conn.execute(
+        'SELECT SOURCE FROM LOCUS_SOURCES WHERE INDEXED = 1 ORDER BY SOURCE'
+    ).fetchall() == [('annotation',), ('orf',)]
+    conn.close()
+    assert GenomeCoordinates(str(psm)).get_coords().coordinates == [
+        '1-9,1-9', 'not found,7-70,not found']
+
+
+def retained(build):
+    """Returns what 'build' returns and the memory it keeps allocated."""
+    tracemalloc.start()
+    try:
+        built = build()
+        return built, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.database
+def test_orf_table(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = random.Random(11)
+    fasta = tmp_path / 'genome.fasta'
+    fasta.write_text(
+        f'>chr\n{"".join(rng.choice("ACGT") for _ in range(30000))}\n')
+    starts = ['ATG', 'GTG', 'TTG']
+    stops = ['TAA', 'TAG', 'TGA']
+    translator = GenomeTranslator(sequence=str(fasta))
+
+    orfs, orf_memory = retained(lambda: list(
+        translator.iter_orfs(starts=starts, stops=stops, seqtype='aa')))
+    table, table_memory = retained(lambda: ORFTable.from_orfs(
+        translator.iter_orfs(starts=starts, stops=stops, seqtype='aa')))
+
+    assert len(table) == len(orfs)
+    assert table_memory * 4 < orf_memory
+    attributes = ['name', 'seq', 'start', 'end', 'strand', 'chromosome',
+                  'origin', 'contig', 'frame', 'start_codon']
+    for orf, row in zip(orfs, table):
+        for attribute in attributes:
+            assert getattr(row, attribute) == getattr(orf, attribute)
+        assert len(row) == len(orf)
+
+    selected = table.select(min_length=15, strand='reverse',
+                            start_codons=['ATG'])
+    expected = [
+        orf for orf in orfs
+        if len(orf) >= 15 and orf.strand == 'reverse'
+        and orf.start_codon == 'ATG'
+    ]
+    assert [row.name for row in selected] == [orf.name for orf in expected]
+    assert [row.seq for row in selected] == [orf.seq for orf in expected]
+    first = {}
+    for i, orf in enumerate(orfs):
+        first.setdefault((orf.end, orf.strand), i)
+    assert list(table.unique_rows('end', 'strand')) == list(first.values())
+
+
+@pytest.mark.database
+def test_alt_codons(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    genome = tmp_path / 'genome.fasta'
+    genome.write_text('>chr\nATGGTGAAATAACCCCCC\n')
+    results = tmp_path / 'results.txt'
+    results.write_text(
+        'Protein\tGenome Coordinates\tORF Sequence\tPeptide\n'
+        # one row per PSM, and two starts sharing a stop codon
+        'gORF__1_1-9_forward\t1-9\tMVK\tMVK\n'
+        'gORF__1_1-9_forward\t1-9\tMVK\tVK\n'
+        'gORF__2_4-9_forward\t4-9\tVK\tVK\n'
+    )
+
+    alternatives = AltCodons(str(results), str(genome), 1000).alternatives
+    assert list(alternatives) == ['9']
+    assert [
+        (orf.name, orf.start, str(orf.seq), orf.start_codon, orf.MSPeptides)
+        for orf in alternatives['9']
+    ] == [
+        ('gORF__1_1-9_forward', 1, 'ATGGTGAAA', 'ATG', ['MVK', 'VK']),
+        ('gORF__2_4-9_forward', 4, 'GTGAAA', 'GTG', ['VK']),
+    ]
+
+
+@pytest.mark.database
+def test_stop_collapser(tmp_path, monkeypatch, random_genome):
+    monkeypatch.chdir(tmp_path)
+    fasta = random_genome.fasta()
+    starts = ['TTG', 'CTG', 'ATT', 'ATC', 'ATA', 'ATG', 'GTG']
+    stops = ['TAA', 'TAG', 'TGA']
+
+    orfs = list(GenomeTranslator(sequence=str(fasta))
+                .iter_orfs(starts=starts, stops=stops, seqtype='aa'))
+    table = tmp_path / 'alternative_starts.tsv'
+    kept = list(StopCollapser(str(table)).collapse(orfs))
+
+    stops_of = {}
+    for orf in orfs:
+        stops_of.setdefault((orf.strand, orf.end), []).append(orf)
+    assert len(kept) == len(stops_of) < len(orfs)
+    for orf in kept:
+        longest = max(stops_of[(orf.strand, orf.end)],
+                      key=lambda alt: len(alt.seq))
+        assert orf is longest
+
+    alternatives = StopCollapser.read_alternatives(str(table))
+    assert sum(len(alts) for alts in alternatives.values()) == len(orfs)
+    for orf in kept:
+        expected = [(alt.start, alt.start_codon)
+                    for alt in stops_of[(orf.strand, orf.end)]]
+        assert alternatives[(orf.name, orf.strand)] == expected
+
+
+@pytest.mark.database
+def test_deduplicate(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'orfs.fasta').write_text(
+        '>gORF_chr_1_1-30_forward\nMKVLA\n'
+        '>gORF_chr_2_100-130_forward\nMKVLA\n'
+        '>gORF_chr_3_300-270_reverse\nMPEPT\n'
+        '>gORF_chr_4_400-430_forward\nMSTOP\n'
+    )
+    (tmp_path / 'proteome.fasta').write_text(
+        '>WP_1 protein one\nMPEPT\n'
+        '>WP_2 protein two\nMPEPT\n'
+        '>WP_3 protein three\nMAAAA\n'
+    )
+    db = database_generator.Database('orfs.fasta', 'proteome.fasta', 'genome')
+    db.mark_annotated()
+    db.deduplicate()
+
+    entries = (tmp_path / 'genome_database.fasta').read_text() \
+        .split('\n')[::2][:-1]
+    assert [entry.split()[0] for entry in entries] == [
+        '>gORF_chr_1_1-30_forward', '>gORF_chr_4_400-430_forward',
+        '>WP_1_ANNO', '>WP_3_ANNO'
+    ]
+    # the original header is kept, as Biopython wrote it
+    assert entries[2] == '>WP_1_ANNO WP_1 protein one'
+    assert (tmp_path / 'genome_duplicates.tsv').read_text() == (
+        'Representative\tEntry\n'
+        'gORF_chr_1_1-30_forward\tgORF_chr_2_100-130_forward\n'
+        'WP_1_ANNO\tgORF_chr_3_300-270_reverse\n'
+        'WP_1_ANNO\tWP_2_ANNO\n'
+    )
+
+    db.unify()
+    assert not (tmp_path / 'genome_duplicates.tsv').exists()
+
+
+@pytest.mark.database
+def test_filter_annotated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'orfs.fasta').write_text(
+        '>gORF_chr_1_1-30_forward\nMKVLAPEPTIDE\n'
+        '>gORF_chr_2_100-130_forward\nVKVLAPEPTIDE\n'
+        '>gORF_chr_3_300-270_reverse\nLAPEPTIDE\n'
+        '>gORF_chr_4_400-430_forward\nMSTOPEPTIDE\n'
+        '>gORF_chr_5_500-530_forward\nMAKVLAPEPTIDE\n'
+    )
+    (tmp_path / 'proteome.fasta').write_text(
+        '>WP_1 protein one\nMKVLAPEPTIDE*\n'
+    )
+    db = database_generator.Database('orfs.fasta', 'proteome.fasta', 'genome')
+    db.filter_annotated()
+
+    assert db.orf_to_blast == 'genome_ORFs_no_anno.fasta'
+    assert (tmp_path / 'genome_annotated_orfs.txt').read_text() == (
+        'gORF_chr_1_1-30_forward\n'
+        'gORF_chr_2_100-130_forward\n'
+        'gORF_chr_3_300-270_reverse\n'
+    )
+    kept = (tmp_path / 'genome_ORFs_no_anno.fasta').read_text() \
+        .split('\n')[::2][:-1]
+    assert kept == ['>gORF_chr_4_400-430_forward',
+                    '>gORF_chr_5_500-530_forward']
+
+
+@pytest.mark.database
+def test_digester():
+    trypsin = Digester()
+    assert trypsin.searchable('MPEPTIDEK')
+    assert not trypsin.searchable('MPEPT')
+    no_missed = Digester(max_missed_cleavages=0)
+    # every tryptic peptide is shorter than 6 residues
+    assert not no_missed.searchable('AKPEKTIRGGGKAAR')
+    assert trypsin.searchable('AKPEKTIRGGGKAAR')
+    assert Digester(max_missed_cleavages=1).searchable('AKPEKTIRGGGKAAR')
+    # 'MAGGGGK' is too long once its methionine is cleaved
+    assert Digester(max_length=6).searchable('MAGGGGKAR')
+    assert not trypsin.searchable(f'{"A" * 41}K')
+    assert Digester(ntt=1).searchable(f'{"A" * 41}K')
+    assert Digester(enzyme=0).searchable('AKPEKTIRGGGKAAR')
+
+
+@pytest.mark.database
+def test_database_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = DatabaseCache(directory=str(tmp_path / 'cache'), max_size=100)
+    genome = tmp_path / 'genome.fasta'
+    genome.write_text('>chr\nATGAAATAA\n')
+    key = cache.key([str(genome)], minsize=30)
+    assert key == cache.key([str(genome)], minsize=30)
+    assert key != cache.key([str(genome)], minsize=60)
+
+    orfs = tmp_path / 'out' / 'genome_ORFs.fasta'
+    assert not cache.fetch(key, [str(orfs)])
+    orfs.parent.mkdir()
+    orfs.write_text('>gORF_chr_1_1-6_forward\nMK\n')
+    cache.store(key, [str(orfs)])
+
+    # outputs are cleared before being written again, which leaves the
+    # cached copy intact
+    DatabaseCache.clear([str(orfs)])
+    orfs.write_text('changed')
+    assert cache.fetch(key, [str(orfs)])
+    assert orfs.read_text() == '>gORF_chr_1_1-6_forward\nMK\n'
+
+    genome.write_text('>chr\nATGAAATAG\n')
+    assert not cache.fetch(cache.key([str(genome)], minsize=30), [str(orfs)])
+
+    # entries above the maximum size are evicted, from the least recently
+    # used one
+    big = tmp_path / 'big.fasta'
+    big.write_text('A' * 90)
+    cache.store('big', [str(big)])
+    assert not cache.fetch(key, [str(orfs)])
+    assert cache.fetch('big', [str(big)])
+
+
+@pytest.mark.database
+def test_genome_store(tmp_path, monkeypatch):
+    (tmp_path / 'out').mkdir()
+    monkeypatch.chdir(tmp_path / 'out')
+    genome = tmp_path / 'genome.fasta'
+    genome.write_text('>chr1 description\nATGAAA\nTAGc\n>plasmid\nGGGNRT\n')
+    store = GenomeStore(str(genome))
+    # the store is kept in the output directory, not next to the genome
+    assert sorted(os.listdir(tmp_path)) == ['genome.fasta', 'out']
+    assert len(os.listdir(tmp_path / 'out')) == 2
+    assert store.contigs == ['chr1', 'plasmid']
+    assert len(store['chr1']) == 10 and store.length('plasmid') == 6
+    assert str(store[0]) == 'ATGAAATAGC'
+    assert store['chr1'][3:9] == 'AAATAG'
+    assert store['chr1'][::-1] == 'CGATAAAGTA'
+    assert store['plasmid'][-1] == 'T'
+    assert str(store['plasmid'].reverse_complement()) == 'AYNCCC'
+    assert store.fetch('chr1', 0, 3, strand='reverse') == 'CAT'
+
+    # views are mapped again in worker processes instead of copying the
+    # sequence
+    view = pickle.loads(pickle.dumps(store['chr1'].reverse_complement()))
+    assert view[:4] == 'GCTA'
+
+    # the store is rebuilt once the fasta file changes
+    store.close()
+    genome.write_text('>chr1\nCCCC\n')
+    assert str(GenomeStore(str(genome))['chr1']) == 'CCCC'
+
+    genome.write_text('>chr1\nCCCC\n>chr1 copy\nGGGG\n')
+    with pytest.raises(ContigError, match='chr1'):
+        GenomeStore(str(genome))
+
+
+@pytest.mark.database
+def test_fasta_io(tmp_path):
+    fasta = tmp_path / 'proteins.fasta'
+    fasta.write_bytes(b'comment\n>sp|P1|A first protein\r\nMKT\r\nAAG*\r\n'
+                      b'>empty\n>gORF__1_1-9_forward\nMK')
+    entries = list(iter_fasta(str(fasta)))
+    assert entries == [('sp|P1|A first protein', 'MKTAAG*'), ('empty', ''),
+                       ('gORF__1_1-9_forward', 'MK')]
+    assert next(iter_fasta(str(fasta), raw=True)) == \
+        (b'sp|P1|A first protein', b'MKTAAG*')
+
+    out = tmp_path / 'out.fasta'
+    write_fasta(str(out), entries)
+    assert list(iter_fasta(str(out))) == entries
+    write_fasta(str(out), [])
+    assert list(iter_fasta(str(out))) == []
+
+
+@pytest.mark.database
+def test_fasta_index(tmp_path):
+    fasta = tmp_path / 'genome_database.fasta'
+    write_fasta(str(fasta), [('gORF__1_1-9_forward', 'MKT'),
+                             ('sp|P1|A_ANNO first protein', 'MKTAAG'),
+                             ('gORF__1_1-9_forward', 'MAA')])
+    with FastaIndex(str(fasta), cache_size=1) as index:
+        assert len(index) == 3
+        assert index['gORF__1_1-9_forward'] == 'MKT'
+        assert index['sp|P1|A_ANNO'] == 'MKTAAG'
+        assert index['gORF__1_1-9_forward'] == 'MKT'
+        assert 'missing' not in index
+    with FastaIndex(str(fasta), key='header') as index:
+        assert index.get('sp|P1|A_ANNO first protein') == 'MKTAAG'
+        assert index.get('sp|P1|A_ANNO') is None
+
+    # the index is rebuilt once the fasta file changes
+    write_fasta(str(fasta), [('gORF__2_1-9_forward', 'MRR\nKK')])
+    with FastaIndex(str(fasta)) as index:
+        assert index['gORF__2_1-9_forward'] == 'MRRKK' and len(index) == 1
+
+
+@pytest.mark.database
+def test_decoy(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_fasta('genome_database.fasta', [('gORF__1_1-12_forward', 'MKTA*'),
+                                          ('sp|P1|A_ANNO', 'MRRKKL')])
+    write_fasta('contaminants.txt', [('sp|ZB1|TRYP_PIG trypsin', 'ABXZC')])
+    decoy = Decoy('genome_database.fasta', 'Genome')
+    decoy.contaminants = str(tmp_path / 'contaminants.txt')
+    decoy.to_fasta(target='target.fasta')
+    assert list(iter_fasta(decoy.fasta)) == [
+        ('decoy_gORF__1_1-12_forward', 'ATKM'),
+        ('decoy_sp|P1|A_ANNO', 'KKRRM'), ('sp|1|TRYP_PIG', 'AC')
+    ]
+    assert list(iter_fasta('target.fasta')) == \
+        list(iter_fasta('genome_database.fasta'))
+    assert decoy.is_current(decoy.checksum())
+
+    shuffled = Decoy('genome_database.fasta', 'Genome', method='shuffle',
+                     seed=1)
+    shuffled.contaminants = decoy.contaminants
+    assert not shuffled.is_current(shuffled.checksum())
+    shuffled.to_fasta()
+    entries = list(iter_fasta(shuffled.fasta))
+    assert sorted(entries[1][1]) == sorted('MRRKK')
+    assert entries == list(iter_fasta(shuffled.to_fasta().fasta))
+
+    concatenated = Decoy('genome_database.fasta', 'Genome',
+                         prefix='rev_decoy_', concatenated=True)
+    concatenated.contaminants = decoy.contaminants
+    assert not concatenated.is_current(concatenated.checksum())
+    concatenated.to_fasta(checksum=concatenated.checksum())
+    assert list(iter_fasta(concatenated.concatenated)) == [
+        ('gORF__1_1-12_forward', 'MKTA*'),
+        ('rev_decoy_gORF__1_1-12_forward', 'ATKM'),
+        ('sp|P1|A_ANNO', 'MRRKKL'), ('rev_decoy_sp|P1|A_ANNO', 'KKRRM'),
+        ('sp|1|TRYP_PIG', 'AC')
+    ]
+    assert [header for header, _ in iter_fasta(concatenated.fasta)] == [
+        'rev_decoy_gORF__1_1-12_forward', 'rev_decoy_sp|P1|A_ANNO',
+        'sp|1|TRYP_PIG'
+    ]
+    assert concatenated.is_current(concatenated.checksum())
+    (tmp_path / concatenated.concatenated).unlink()
+    assert not concatenated.is_current(concatenated.checksum())
+
+
+@pytest.mark.database
+def test_orf_identifiers(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    orfs = [ORF(name=f'ORF__{i}', seq='MKV', start=i, end=i + 8,
+                strand='forward', contig='chr')
+            for i in range(1, 4)]
+    DatabaseGenerator(name='genome', db_type='sql') \
+        .write_orfs(orfs, filename='genome_ORFs.fasta', short_ids=True)
+    assert [header for header, _ in iter_fasta('genome_ORFs.fasta')] == \
+        ['g1', 'g2', 'g3']
+
+    identifiers = ORFIdentifiers('genome')
+    assert identifiers.enabled
+    assert identifiers.expand('g2(pre=K,post=-),decoy_g3,sp|g1_ANNO\t0.01') \
+        == 'gORF__2_2-10_forward(pre=K,post=-),' \
+           'decoy_gORF__3_3-11_forward,sp|g1_ANNO\t0.01'
+    assert identifiers.short_id('gORF__2_2-10_forward') == 'g2'
+    assert identifiers.short_id('sp|P1|A_ANNO') == 'sp|P1|A_ANNO'
+
+    psm = tmp_path / 'genome_results_psm.txt'
+    psm.write_text('PSMId\tproteinIds\nscan1\tg1,g3\n')
+    identifiers.expand_file(str(psm))
+    assert psm.read_text() == 'PSMId\tproteinIds\n' \
+        'scan1\tgORF__1_1-9_forward,gORF__3_3-11_forward\n'
+
+    # a database written again with full entries is not expanded
+    DatabaseGenerator(name='genome', db_type='sql') \
+        .write_orfs(orfs, filename='genome_ORFs.fasta')
+    assert not ORFIdentifiers('genome').enabled
+
+
+@pytest.mark.database
+def test_orf_identifiers_strands(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    orfs = [ORF(name='ORF__1', seq='MKV', start=1, end=9, strand=strand,
+                contig='chr')
+            for strand in ('forward', 'reverse')]
+    DatabaseGenerator(name='genome', db_type='sql') \
+        .write_orfs(orfs, filename='genome_ORFs.fasta', short_ids=True)
+
+    identifiers = ORFIdentifiers('genome', decoy_prefix='rev_')
+    entries = ['gORF__1_1-9_forward', 'gORF__1_1-9_reverse',
+               'gORF__1_1-12_forward']
+    assert identifiers.short_ids(entries) == {
+        'gORF__1_1-9_forward': 'g1', 'gORF__1_1-9_reverse': 'g2',
+        'gORF__1_1-12_forward': 'gORF__1_1-12_forward'
+    }
+    assert identifiers.short_id('gORF__1_1-9_reverse') == 'g2'
+    assert identifiers.expand('rev_g2,decoy_g1') == \
+        'rev_gORF__1_1-9_reverse,decoy_g1'
+
+    # short IDs are not recorded for a database that was not fully written
+    failed = orfs + [ORF(name=None, seq='MKV', start=1, end=9,
+                         strand='forward', contig='chr')]
+    DatabaseGenerator(name='genome', db_type='sql') \
+        .write_orfs(failed, filename='genome_ORFs.fasta', short_ids=True)
+    assert not ORFIdentifiers('genome').enabled
+
+
+@pytest.mark.database
+def test_batch_database(tmp_path, monkeypatch, random_genome):
+    shared = random_genome.sequence(1500)
+    for name in ('a', 'b'):
+        random_genome.fasta(name, contigs={'chr': 1500}, prefix=shared)
+    (tmp_path / 'proteome.fasta').write_text('>sp|P1|A\nMKVLAAGIRR\n')
+    (tmp_path / 'panel.tsv').write_text(
+        '# strains\nname\tgenome\na\ta.fasta\nb\tb.fasta\n'
+    )
+    parser, subparsers = cli.get_parsers()
+    database = ['database', '-o', str(tmp_path / 'out'),
+                '-p', str(tmp_path / 'proteome.fasta'),
+                '--minsize', '30', '--maxsize', '300', '--no-cache']
+    args = parser.parse_args(database + [
+        '--batch', str(tmp_path / 'panel.tsv'), '--threads', '2',
+        '--pan_database', 'YES'
+    ])
+    cli.validate_database(args, subparsers['database'])
+
+    (tmp_path / 'out').mkdir()
+    monkeypatch.chdir(tmp_path / 'out')
+    BatchDatabase(args).build()
+
+    single = parser.parse_args(database + ['-g', str(tmp_path / 'a.fasta')])
+    (tmp_path / 'single').mkdir()
+    monkeypatch.chdir(tmp_path / 'single')
+    single.outdir = str(tmp_path / 'single')
+    build_database(single)
+    batch = tmp_path / 'out' / 'a' / 'genome_database.fasta'
+    assert list(iter_fasta(batch)) == list(iter_fasta('genome_database.fasta'))
+
+    pan = list(iter_fasta(tmp_path / 'out' / 'pan_database.fasta'))
+    assert len({seq for _, seq in pan}) == len(pan)
+    assert {header.split('|', 1)[0] for header, _ in pan} == {'a', 'b', 'sp'}
+    # the ORFs of the shared sequence are kept once
+    duplicates = (tmp_path / 'out' / 'pan_duplicates.tsv').read_text()
+    assert duplicates.count('\n') > 1
+
+    with pytest.raises(SystemExit):
+        cli.validate_database(parser.parse_args(database),
+                              subparsers['database'])
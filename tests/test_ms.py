@@ -0,0 +1,440 @@
+# Copyright © 2025 Eduardo Vieira de Souza
+# Copyright © 2025 Adriana Canedo
+# Copyright © 2025 Cristiano Valim Bizarro
+# Copyright © 2025 Bruno Maestri A Becker
+#
+# This file is part of uProteInS.
+#
+# uProteInS is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# uProteInS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# uProteInS. If not, see <https://www.gnu.org/licenses/>.
+
+
+import os
+import pathlib
+import sys
+import typing as t
+from argparse import Namespace
+from xml.etree import ElementTree
+
+import pytest
+
+from src import peptide_search as ps
+from src.postprocess.percolator import PercolatorProcessing
+from src.search import SearchJob, SearchScheduler, IndexCache, split_fasta
+from src.sequtils.fasta import iter_fasta, write_fasta
+from src.sequtils.__helpers import SearchError, DecoySearchError
+
+
+@pytest.fixture
+def python_job(tmp_path, monkeypatch) -> t.Callable[..., SearchJob]:
+    """Return a factory of search jobs that run Python code in tmp_path,
+    with their logs in tmp_path/logs.
+    """
+    monkeypatch.chdir(tmp_path)
+
+    def job(name: str, code: str, **kwargs) -> SearchJob:
+        log = str(tmp_path / 'logs' / f'{name}.log')
+        return SearchJob(name, [sys.executable, '-c', code], log=log,
+                         **kwargs)
+    return job
+
+
+@pytest.fixture
+def events(tmp_path) -> pathlib.Path:
+    """Return the path of a file where jobs record when they start and end,
+    so the jobs running at the same time can be told apart.
+    """
+    return tmp_path / 'events.txt'
+
+
+@pytest.fixture
+def mzml(tmp_path, monkeypatch) -> pathlib.Path:
+    """Return an empty spectrum directory in tmp_path, the working
+    directory of the test.
+    """
+    monkeypatch.chdir(tmp_path)
+    spectra = tmp_path / 'mzml'
+    spectra.mkdir()
+    return spectra
+
+
+def timed(events: pathlib.Path, name: str, exit_status: int = 0) -> str:
+    return (f'import time; open("{events}", "a").write("start {name}\\n"); '
+            f'time.sleep(0.6); open("{events}", "a").write("end {name}\\n"); '
+            f'exit({exit_status})')
+
+
+@pytest.mark.ms
+def test_search_scheduler(tmp_path, python_job, events):
+    scheduler = SearchScheduler(jobs=2, max_memory=10)
+    for name, size, memory, group in [('small', 1, 4, 'db1'),
+                                      ('large', 3, 4, 'db1'),
+                                      ('medium', 2, 4, 'db2'),
+                                      ('huge', 0, 12, 'db3')]:
+        scheduler.add(python_job(name, timed(events, name), size=size,
+                                 memory=memory, group=group))
+    jobs = scheduler.run()
+
+    assert [job.returncode for job in jobs] == [0] * 4
+    lines = events.read_text().split('\n')
+    # largest first; 'small' waits for the first search of db1, and 'huge'
+    # exceeds the budget, so it runs alone
+    assert sorted(lines[:2]) == ['start large', 'start medium']
+    assert lines.index('start small') > lines.index('end large')
+    assert lines.index('start huge') > \
+        max(lines.index('end small'), lines.index('end medium'))
+    assert (tmp_path / 'search_jobs.tsv').read_text().count('\n') == 5
+
+
+@pytest.mark.ms
+def test_search_scheduler_failed_index(python_job, events):
+    # the first search of db1 fails while indexing it, so the next ones still
+    # run one at a time until one of them succeeds
+    scheduler = SearchScheduler(jobs=3)
+    for name, size, exit_status in [('first', 3, 1), ('second', 2, 0),
+                                    ('third', 1, 0)]:
+        scheduler.add(python_job(name, timed(events, name, exit_status),
+                                 size=size, group='db1'))
+    with pytest.raises(SearchError, match='1 of 3'):
+        scheduler.run()
+
+    lines = events.read_text().split('\n')
+    assert lines.index('start second') > lines.index('end first')
+    assert lines.index('start third') > lines.index('end second')
+
+
+@pytest.mark.ms
+def test_search_scheduler_failures(tmp_path, python_job):
+    scheduler = SearchScheduler(jobs=2)
+    scheduler.add(python_job('ok', 'print("done")'))
+    scheduler.add(python_job('broken', 'raise SystemExit(3)'))
+    with pytest.raises(SearchError, match='1 of 2'):
+        scheduler.run()
+    assert 'broken\t3\t' in (tmp_path / 'search_jobs.tsv').read_text()
+    assert (tmp_path / 'logs' / 'ok.log').read_text() == 'done\n'
+
+
+@pytest.mark.ms
+def test_msgf_job(tmp_path, mzml):
+    (mzml / 'run1.mzML').write_text('spectra')
+    args = Namespace(mass_spec=str(mzml), outdir=str(tmp_path),
+                     transcriptome=False, mode='ms', t='10ppm', thread=None,
+                     jobs=4, max_memory=None, job_memory=8,
+                     decoy_method='reverse', decoy_seed=0, no_cache=True,
+                     cache_dir=None, cache_size=20)
+    target = ps.PeptideSearch('Genome', args.mass_spec,
+                              'genome_database.fasta', args) \
+        .msgf_job('run1.mzML')
+    decoy = ps.PeptideSearch('Genome', args.mass_spec,
+                             'Genome/Percolator/Genome_decoy.fasta', args,
+                             decoy=True).msgf_job('run1.mzML')
+
+    staging = tmp_path / 'Genome' / 'staging'
+    assert target.cmd[target.cmd.index('-o') + 1] == \
+        str(staging / 'run1' / 'run1.mzid')
+    assert decoy.cmd[decoy.cmd.index('-o') + 1] == \
+        str(staging / 'run1.mzML_decoy' / 'run1.mzML_decoy.mzid')
+    assert target.cmd[1] == '-Xmx8G'
+    assert target.memory == 8 and target.size == 7
+    assert target.cmd[-4:-2] == ['-t', '10ppm']
+    assert target.cmd[-2] == '-thread'
+    assert target.group != decoy.group
+
+
+@pytest.mark.ms
+def test_batched_search(tmp_path, mzml):
+    for name, size in [('a', 50), ('b', 40), ('c', 30), ('d', 20)]:
+        (mzml / f'{name}.mzML').write_text('x' * size)
+    args = Namespace(mass_spec=str(mzml), transcriptome=False, thread=None,
+                     jobs=2, max_memory=None, job_memory=4,
+                     batched_search=True, no_cache=True)
+    (tmp_path / 'Genome' / 'Percolator').mkdir(parents=True)
+    (tmp_path / 'Genome' / 'Percolator' / 'Genome_decoy.fasta') \
+        .write_text('>decoy_gORF__1_1-12_forward\nLVKM\n')
+    search = ps.PeptideSearch('Genome', args.mass_spec,
+                              'Genome/Percolator/Genome_decoy.fasta', args,
+                              decoy=True)
+    scheduler = search.loop_search(SearchScheduler(jobs=2, report=None))
+
+    index, *batches = scheduler.queue
+    assert 'edu.ucsd.msjava.msdbsearch.BuildSA' in index.cmd
+    assert sorted(sorted(os.listdir(os.path.join(job.cwd, 'spectra')))
+                  for job in batches) == \
+        [['a.mzML', 'd.mzML'], ['b.mzML', 'c.mzML']]
+    assert all('-o' not in job.cmd and job.group == index.group
+               for job in batches)
+
+    # stands in for MSGF+, which writes <file>.mzid for each file of the
+    # spectrum directory
+    write = 'import os; [open(f"{f[:-5]}.mzid", "w").close() ' \
+            'for f in os.listdir("spectra")]'
+    index.cmd = [sys.executable, '-c', 'pass']
+    for job in batches:
+        job.cmd = [sys.executable, '-c', write]
+    scheduler.run()
+    assert sorted(os.listdir(tmp_path / 'Genome')) == [
+        'Percolator', 'a.mzML_decoy.mzid', 'b.mzML_decoy.mzid',
+        'c.mzML_decoy.mzid', 'd.mzML_decoy.mzid', 'logs'
+    ]
+    assert not search.loop_search(SearchScheduler(report=None)).queue
+    # the searches are run again for decoys generated otherwise
+    args.decoy_method = 'shuffle'
+    assert len(search.loop_search(SearchScheduler(report=None)).queue) == 3
+
+    # a run that does not write the mzid files fails
+    args.no_resume = True
+    scheduler = search.loop_search(SearchScheduler(jobs=2, report=None))
+    for job in scheduler.queue:
+        job.cmd = [sys.executable, '-c', 'pass']
+    with pytest.raises(SearchError, match='2 of 3'):
+        scheduler.run()
+
+
+@pytest.mark.ms
+def test_index_cache(tmp_path, mzml):
+    (mzml / 'run1.mzML').write_text('spectra')
+    fasta = tmp_path / 'genome_database.fasta'
+    fasta.write_text('>gORF__1_1-12_forward\nMKVL\n')
+    args = Namespace(mass_spec=str(mzml), transcriptome=False, thread=None,
+                     jobs=1, job_memory=4, no_cache=False,
+                     cache_dir=str(tmp_path / 'cache'), index_cache_size=1)
+    search = ps.PeptideSearch('Genome', args.mass_spec,
+                              'genome_database.fasta', args)
+    scheduler = SearchScheduler(report=None)
+    search.peptide_identification(scheduler)
+
+    database = search.search_database()
+    job = scheduler.queue[0]
+    assert job.cmd[job.cmd.index('-d') + 1] == database
+    assert os.path.dirname(os.path.dirname(database)) == \
+        str(tmp_path / 'cache' / 'msgf')
+    # the database is linked next to the results and into the cache, not
+    # copied
+    for link in (database, tmp_path / 'Genome' / 'genome_database.fasta'):
+        assert os.path.samefile(link, fasta)
+    assert not (mzml / 'genome_database.fasta').exists()
+
+    # the index MSGF+ builds next to the cached database is found by later
+    # runs with the same database
+    open(database.replace('.fasta', '.csarr'), 'w').close()
+    again = ps.PeptideSearch('Genome', args.mass_spec, str(fasta), args)
+    assert again.search_database() == database
+    assert os.path.exists(database.replace('.fasta', '.csarr'))
+
+    # the searches of a database that is already indexed do not wait for
+    # each other
+    for suffix in ('.canno', '.cnlcp', '.cseq'):
+        open(database.replace('.fasta', suffix), 'w').close()
+    assert IndexCache.is_indexed(database)
+    queue = again.loop_search(SearchScheduler(report=None)).queue
+    assert queue[0].group is None
+
+    # adding an entry does not evict the ones of the queued searches
+    fasta.unlink()
+    fasta.write_text('>gORF__1_1-12_forward\nMKVLA\n')
+    args.index_cache_size = 1e-9
+    changed = ps.PeptideSearch('Genome', args.mass_spec,
+                               'genome_database.fasta', args) \
+        .search_database()
+    assert changed != database and os.path.exists(database)
+
+    cache = IndexCache.from_args(args)
+    cache.maxSize = os.path.getsize(changed)
+    cache.evict()
+    assert not os.path.exists(database) and os.path.exists(changed)
+
+
+@pytest.mark.ms
+def test_concatenated_percolator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'Genome').mkdir()
+    (tmp_path / 'Genome' / 'run1.mzid').write_text('psms')
+    commands = []
+    monkeypatch.setattr(os, 'system', commands.append)
+    perc = PercolatorProcessing('Genome', 'genome', prefix='rev_decoy_',
+                                decoy_search='concatenated')
+    perc.create_metafiles().convert_to_pin().percolate()
+    assert ' Genome/Genome_target_metafile.txt -P rev_decoy_ -o ' \
+        in commands[-2]
+    assert '-P rev_decoy_ ' in commands[-1]
+    assert '--search-input concatenated' in commands[-1]
+
+    # the mzid files must match the search mode
+    with pytest.raises(DecoySearchError):
+        PercolatorProcessing('Genome', 'genome').create_metafiles()
+    (tmp_path / 'Genome' / 'run1.mzML_decoy.mzid').write_text('psms')
+    with pytest.raises(DecoySearchError):
+        PercolatorProcessing('Genome', 'genome',
+                             decoy_search='concatenated').create_metafiles()
+    commands.clear()
+    perc = PercolatorProcessing('Genome', 'genome').create_metafiles() \
+        .convert_to_pin().percolate()
+    assert not perc.concatenated
+    assert ' Genome/Genome_target_metafile.txt ' \
+        'Genome/Genome_decoy_metafile.txt -o ' in commands[-2]
+    assert '-P decoy_ ' in commands[-1]
+    assert '--search-input separate' in commands[-1]
+
+
+@pytest.mark.ms
+def test_resumed_search(tmp_path, mzml):
+    for name in ('a', 'b'):
+        (mzml / f'{name}.mzML').write_text(f'spectra {name}')
+    (tmp_path / 'genome_database.fasta') \
+        .write_text('>gORF__1_1-12_forward\nMKVL\n')
+    args = Namespace(mass_spec=str(mzml), transcriptome=False, thread=None,
+                     jobs=1, max_memory=None, job_memory=4, no_cache=True,
+                     t='10ppm')
+
+    def search(crash=()):
+        """Return the names of the searches run, of which those in 'crash'
+        exit after a truncated output.
+        """
+        scheduler = ps.PeptideSearch(
+            'Genome', args.mass_spec, 'genome_database.fasta', args
+        ).loop_search(SearchScheduler(report=None))
+        names = sorted(job.name for job in scheduler.queue)
+        for job in scheduler.queue:
+            output = job.cmd[job.cmd.index('-o') + 1]
+            code = f'open({output!r}, "w").write("psms"); ' \
+                   f'exit({int(job.name in crash)})'
+            job.cmd = [sys.executable, '-c', code]
+        if crash:
+            with pytest.raises(SearchError):
+                scheduler.run()
+        else:
+            scheduler.run()
+        return names
+
+    assert search(crash=('Genome b',)) == ['Genome a', 'Genome b']
+    assert os.path.exists('Genome/a.mzid')
+    assert not os.path.exists('Genome/b.mzid')
+    assert search() == ['Genome b']
+    assert search() == []
+
+    (mzml / 'a.mzML').write_text('new spectra')
+    assert search() == ['Genome a']
+    (tmp_path / 'Genome' / 'b.mzid').write_text('edited')
+    assert search() == ['Genome b']
+    args.t = '20ppm'
+    assert search() == ['Genome a', 'Genome b']
+    args.thread = 4
+    assert search() == []
+    args.no_resume = True
+    assert search() == ['Genome a', 'Genome b']
+    assert sorted(os.listdir('Genome')) == ['a.mzid', 'b.mzid', 'logs']
+
+
+def shard_mzid(psms, ratio):
+    """Return an mzid file of MSGF+ with a match for each (spectrum,
+    peptide, protein, SpecEValue) in 'psms'.
+    """
+    sequences, results = [], []
+    for n, (spectrum, peptide, protein, spec_evalue) in enumerate(psms, 1):
+        sequences.append(
+            f'<DBSequence id="DBSeq{n}" accession="{protein}" '
+            f'searchDatabase_ref="SearchDB_1"/>'
+            f'<Peptide id="Pep{n}"><PeptideSequence>{peptide}'
+            f'</PeptideSequence></Peptide>'
+            f'<PeptideEvidence id="PepEv_{n}" dBSequence_ref="DBSeq{n}" '
+            f'peptide_ref="Pep{n}"/>'
+        )
+        results.append(
+            f'<SpectrumIdentificationResult id="SIR_{n}" '
+            f'spectrumID="index={spectrum}" spectraData_ref="SID_1">'
+            f'<SpectrumIdentificationItem id="SII_{n}_1" rank="1" '
+            f'chargeState="2" peptide_ref="Pep{n}">'
+            f'<PeptideEvidenceRef peptideEvidence_ref="PepEv_{n}"/>'
+            f'<cvParam accession="MS:1002052" value="{spec_evalue}"/>'
+            f'<cvParam accession="MS:1002053" '
+            f'value="{spec_evalue * ratio}"/>'
+            f'</SpectrumIdentificationItem></SpectrumIdentificationResult>'
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<MzIdentML xmlns="http://psidev.info/psi/pi/mzIdentML/1.1">'
+        f'<SequenceCollection>{"".join(sequences)}</SequenceCollection>'
+        '<DataCollection><Inputs><SearchDatabase id="SearchDB_1" '
+        'location="shard.fasta" numDatabaseSequences="2"/></Inputs>'
+        '<AnalysisData><SpectrumIdentificationList id="SIL_1" '
+        f'numSequencesSearched="10">{"".join(results)}'
+        '</SpectrumIdentificationList></AnalysisData></DataCollection>'
+        '</MzIdentML>'
+    )
+
+
+@pytest.mark.ms
+def test_sharded_search(tmp_path, mzml):
+    (mzml / 'run1.mzML').write_text('spectra')
+    write_fasta('genome_database.fasta',
+                [('P1', 'M' * 50), ('P2', 'K' * 30), ('P3', 'V' * 25),
+                 ('P4', 'L' * 10)])
+    paths = split_fasta('genome_database.fasta', 3, 'split')
+    assert [[header for header, _ in iter_fasta(path)] for path in paths] \
+        == [['P1'], ['P2'], ['P3', 'P4']]
+    # the fifth shard would be empty
+    assert split_fasta('genome_database.fasta', 5, 'split') == \
+        [f'split/genome_database_{i}.fasta' for i in range(1, 5)]
+
+    args = Namespace(mass_spec=str(mzml), transcriptome=False, thread=None,
+                     jobs=2, max_memory=None, job_memory=None, no_cache=True,
+                     shards=2)
+    search = ps.PeptideSearch('Genome', args.mass_spec,
+                              'genome_database.fasta', args)
+    scheduler = search.loop_search(SearchScheduler(jobs=2, report=None))
+    assert [job.name for job in scheduler.queue] == \
+        ['Genome run1 shard 1', 'Genome run1 shard 2']
+    assert all(job.cmd[1] == '-Xmx24G' and job.memory == 24
+               for job in scheduler.queue)
+    assert [job.group for job in scheduler.queue] == \
+        [str(tmp_path / 'Genome' / 'shards' / f'genome_database_{i}.fasta')
+         for i in (1, 2)]
+
+    # the best match of spectrum 0 is in the first shard, LLK is in
+    # proteins of both and spectrum 2 only in the second
+    (tmp_path / 'shard_1.mzid').write_text(shard_mzid(
+        [(0, 'MKV', 'P1', 1e-10), (1, 'LLK', 'P2', 1e-6)], 1e5))
+    (tmp_path / 'shard_2.mzid').write_text(shard_mzid(
+        [(0, 'AAK', 'P3', 1e-8), (1, 'LLK', 'P4', 1e-6),
+         (2, 'GGR', 'P3', 1e-9)], 3e5))
+    for number, job in enumerate(scheduler.queue, start=1):
+        output = job.cmd[job.cmd.index('-o') + 1]
+        job.cmd = [sys.executable, '-c',
+                   f'import shutil; '
+                   f'shutil.copy("shard_{number}.mzid", {output!r})']
+    scheduler.run()
+
+    ns = {'m': 'http://psidev.info/psi/pi/mzIdentML/1.1'}
+    root = ElementTree.parse(tmp_path / 'Genome' / 'run1.mzid').getroot()
+    evidences = {evidence.get('id'): evidence.get('dBSequence_ref')
+                 for evidence in root.iterfind('.//m:PeptideEvidence', ns)}
+    proteins = {db.get('id'): db.get('accession')
+                for db in root.iterfind('.//m:DBSequence', ns)}
+    psms = {}
+    for result in root.iterfind('.//m:SpectrumIdentificationResult', ns):
+        for item in result.iterfind('m:SpectrumIdentificationItem', ns):
+            refs = item.iterfind('m:PeptideEvidenceRef', ns)
+            score = item.find('m:cvParam[@accession="MS:1002053"]', ns)
+            psms.setdefault(result.get('spectrumID'), []).append(
+                (sorted(proteins[evidences[ref.get('peptideEvidence_ref')]]
+                        for ref in refs),
+                 float(score.get('value'))))
+    assert psms.keys() == {'index=0', 'index=1', 'index=2'}
+    assert psms['index=0'] == [(['P1'], pytest.approx(4e-5))]
+    assert psms['index=1'] == [(['P2', 'P4'], pytest.approx(0.4))]
+    assert psms['index=2'] == [(['P3'], pytest.approx(4e-4))]
+    assert root.find('.//m:SearchDatabase', ns).get('location') == \
+        str(tmp_path / 'genome_database.fasta')
+    assert root.find('.//m:SpectrumIdentificationList', ns) \
+        .get('numSequencesSearched') == '20'
+    assert sorted(os.listdir(tmp_path / 'Genome')) == \
+        ['logs', 'run1.mzid', 'shards']
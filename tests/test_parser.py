@@ -96,6 +96,7 @@ def bad_validate_database(request, database_args, tmp_file):
     [],
     ['--external_gtf', 'tmp_file', '--external_transcriptome', 'tmp_file'],
     ['--starts', 'ATC,ATA', '--stops', 'ATG,CTC'],
+    ['--threads', '4'],
 ])
 def good_validate_database(request, database_args, tmp_file):
     args = database_args